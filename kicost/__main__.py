@@ -41,6 +41,12 @@ except ImportError:
          # the user just want the KiCost CLI.
 from .distributors import distributor_dict
 from .eda_tools import eda_tool_dict
+from .distributors.web_cache import default_cache_dir, CACHE_TTL, CACHE_SIZE
+from .distributors.scrape_cache import QUOTE_FIELDS, QUOTE_TTL, MISS_TTL
+from .kicost import MAX_PER_HOST, SCRAPE_ENGINES
+from .distributors.web_fetch import PAGE_MEMO_SIZE, PROCESS_PAGE_MEMO_SIZE
+from .distributors.checkpoint import CHECKPOINT_EXT
+from .distributors.circuit_breaker import MAX_FAILURES
 from . import __version__ # Version control by @xesscorp.
 
 NUM_PROCESSES = 30  # Maximum number of parallel web-scraping processes.
@@ -100,6 +106,20 @@ def main():
                         metavar='NUM_PROCESSES',
                         help='''Set the number of parallel 
                             processes used for web scraping part data.''')
+    parser.add_argument('--scrape_engine',
+                        choices=SCRAPE_ENGINES,
+                        default='process',
+                        help='''Choose how the parallel web scraping is done: a pool of
+                            NUM_PROCESSES processes or a pool of NUM_PROCESSES threads
+                            (asyncio is the same as thread). Default: process.''')
+    parser.add_argument('--max_per_host',
+                        nargs='?', type=int, default=MAX_PER_HOST,
+                        metavar='NUM',
+                        help='Maximum simultaneous accesses to each distributor website with the thread engine. Default: {}.'.format(MAX_PER_HOST))
+    parser.add_argument('--page_memo',
+                        nargs='?', type=int, default=None,
+                        metavar='NUM',
+                        help='Pages read kept in memory (by each scraping process) for the other parts that use them, 0 to only share the pages being read. Default: {} ({} with the process engine).'.format(PAGE_MEMO_SIZE, PROCESS_PAGE_MEMO_SIZE))
     parser.add_argument('-ign', '--ignore_fields',
                         nargs='+',
                         default=[],
@@ -152,11 +172,73 @@ def main():
                         nargs='?', type=float, default=0.0,
                         metavar='DELAY',
                         help="Specify minimum delay (in seconds) between successive accesses to a distributor's website.")
+    parser.add_argument('--max_failures',
+                        nargs='?', type=int, default=MAX_FAILURES,
+                        metavar='NUM',
+                        help='Stop scraping a distributor after NUM consecutive pages could not be read from it (0 to never stop). Default: {}.'.format(MAX_FAILURES))
+    parser.add_argument('--adaptive_throttling',
+                        action='store_true',
+                        help='Tune the delay between accesses to each distributor website by its answers (slowing down on errors, captchas or slow answers), starting with the delays learned in the previous runs. The --throttling_delay is the minimum delay.')
+    parser.add_argument('--throttling_burst',
+                        nargs='?', type=int, default=1,
+                        metavar='NUM',
+                        help="Specify the number of successive accesses to a distributor's website allowed without the throttling delay after an idle period.")
     parser.add_argument('--currency', '--locale',
                         nargs='?',
                         type=str,
                         default='USD',
                         help='Define the priority locale/country and currency on the scrape. Use the ISO4217 for currency and ISO3166:2 for country. Input e.g.: `US`, `USD`, `US-USD` or `EUR-US`. Currency is priritized over the locale/country. If give country with more than one currency, it will be chosen, in the sequence, `USD`, `EUR` or alphabetical order. Default: `USD`.')
+    parser.add_argument('--cache_dir',
+                        nargs='?', type=str, default=None,
+                        const=default_cache_dir(),
+                        metavar='DIR',
+                        help='Keep the distributor web pages in a local cache at DIR (default: {}) to be reused by the next runs.'.format(default_cache_dir()))
+    parser.add_argument('--cache_ttl',
+                        nargs='?', type=float, default=CACHE_TTL,
+                        metavar='HOURS',
+                        help='Specify the time (in hours) that a cached web page is used before reading it again. Default: {}.'.format(CACHE_TTL))
+    parser.add_argument('--cache_size',
+                        nargs='?', type=float, default=CACHE_SIZE,
+                        metavar='MB',
+                        help='Specify the maximum size (in MB) of the web page cache, the least recently used pages are removed. Default: {}.'.format(CACHE_SIZE))
+    parser.add_argument('--offline',
+                        action='store_true',
+                        help='Use only the cached web pages (see "--cache_dir"), never accessing the distributor websites.')
+    parser.add_argument('--quote_ttl',
+                        nargs='+', type=str, default=[],
+                        metavar='FIELD=HOURS',
+                        help='Specify the time (in hours) that each field of the cached part data is used before scraping it again, e.g. `qty_avail=0.5 price_tiers=12`. Defaults: {}.'.format(
+                            ', '.join('{}={}'.format(f, QUOTE_TTL[f]) for f in QUOTE_FIELDS)))
+    parser.add_argument('--miss_ttl',
+                        nargs='?', type=float, default=MISS_TTL,
+                        metavar='HOURS',
+                        help='Specify the time (in hours) that a part not found at a distributor is not searched there again (when using the cache). Default: {}.'.format(MISS_TTL))
+    parser.add_argument('--record',
+                        nargs='?', type=str, default=None,
+                        metavar='DIR',
+                        help='Record the answers of the distributor websites in DIR (to use with "--replay"). The web page cache is not used while recording.')
+    parser.add_argument('--replay',
+                        nargs='?', type=str, default=None,
+                        metavar='DIR',
+                        help='Replay the answers recorded in DIR instead of accessing the distributor websites.')
+    parser.add_argument('--replay_latency',
+                        nargs='?', type=float, default=0.0,
+                        metavar='SECONDS',
+                        help='Delay each answer replayed to emulate the network latency. Default: 0.')
+    parser.add_argument('--resume',
+                        action='store_true',
+                        help='Resume an interrupted run: the parts already scraped (kept in a "{}" file beside the spreadsheet) are not scraped again.'.format(CHECKPOINT_EXT))
+    parser.add_argument('--profile',
+                        nargs='?', const=True, default=False,
+                        metavar='FILE.JSON',
+                        help='Print the time spent in each phase of the run (reading the BOM, grouping, fetching and parsing the pages of each distributor...) and, if FILE.JSON is given, write it there.')
+    parser.add_argument('--metrics',
+                        nargs='?', type=str, default=None,
+                        metavar='FILE',
+                        help='Write the counters (requests, retries, HTTP status, bytes, cache hits, parts found...) and latency histograms of the web accesses to each distributor to FILE.')
+    parser.add_argument('--metrics_format',
+                        choices=['json', 'prometheus'], default='json',
+                        help='Format of the --metrics file: JSON or Prometheus text format. Default: json.')
     parser.add_argument('--user',
                         action='store_true',
                         help='Start the user guide to run KiCost passing the file parameter give by "--input", all others parameters are ignored.')
@@ -257,6 +339,19 @@ def main():
         for d in args.exclude:
             dist_list.remove(d)
 
+    # Time-to-live of each field of the cached part data.
+    quote_ttl = {}
+    for field_ttl in args.quote_ttl:
+        try:
+            field, hours = field_ttl.split('=')
+            if field not in QUOTE_FIELDS:
+                raise ValueError
+            quote_ttl[field] = float(hours)
+        except ValueError:
+            logger.critical('Invalid --quote_ttl value "{}", use FIELD=HOURS with FIELD in {}.'.format(
+                            field_ttl, ', '.join(QUOTE_FIELDS)))
+            sys.exit(1)
+
     logger.log(DEBUG_OBSESSIVE, 'Started KiCost v.{} on {}({}) Python {}.{}.{}'.format(
                                               __version__,
                                               platform.platform(),
@@ -271,8 +366,17 @@ def main():
         user_fields=args.fields, ignore_fields=args.ignore_fields,
         group_fields=args.group_fields, variant=args.variant,
         dist_list=dist_list, num_processes=num_processes,
+        scrape_engine=args.scrape_engine, max_per_host=args.max_per_host, page_memo_size=args.page_memo,
         scrape_retries=args.retries, throttling_delay=args.throttling_delay,
-        local_currency=args.currency)
+        throttling_burst=args.throttling_burst, max_failures=args.max_failures,
+        adaptive_throttling=args.adaptive_throttling,
+        local_currency=args.currency,
+        cache_dir=args.cache_dir, cache_ttl=args.cache_ttl,
+        cache_size=args.cache_size, offline=args.offline,
+        quote_ttl=quote_ttl, miss_ttl=args.miss_ttl, resume=args.resume,
+        record_dir=args.record, replay_dir=args.replay, replay_latency=args.replay_latency,
+        profile=args.profile is not False, profile_file=None if args.profile in (True, False) else args.profile,
+        metrics_file=args.metrics, metrics_format=args.metrics_format)
     #except Exception as e:
     #    sys.exit(e)
 
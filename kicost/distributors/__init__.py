@@ -8,14 +8,14 @@ from random import choice
 import http.client # For web scraping exceptions.
 try:
     # This is for Python 3
-    from urllib.parse import urlencode, quote_plus as urlquote, urlsplit, urlunsplit
+    from urllib.parse import urlencode, quote_plus as urlquote, urlsplit, urlunsplit, unquote
     from urllib.request import urlopen, Request
     import urllib.error
     WEB_SCRAPE_EXCEPTIONS = (urllib.error.URLError, http.client.HTTPException)
 except ImportError:
     # This is for Python 2
     from urlparse import urlsplit, urlunsplit
-    from urllib import urlencode, quote_plus as urlquote
+    from urllib import urlencode, quote_plus as urlquote, unquote
     from urllib2 import urlopen, Request
     import urllib2
     WEB_SCRAPE_EXCEPTIONS = (urllib2.URLError, http.client.HTTPException)
@@ -125,7 +125,6 @@ def FakeBrowser(url):
     req = Request(url)
     req.add_header('Accept-Language', 'en-US')
     req.add_header('Accept', 'text/html')
-    req.add_header('Cookie', 'foo=bar')
     req.add_header('User-agent', get_user_agent())
     return req
 
@@ -0,0 +1,172 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import copy
+import threading
+
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE # Debug configurations.
+from .web_fetch import fetch_config, fetch_local
+from .web_routines import get_dist_module, part_search_number, extract_part_data
+
+__all__ = ['BatchLookups', 'BATCH_SIZE']
+
+# Parts in each batch of the distributor modules that don't define their `BATCH_SIZE`.
+BATCH_SIZE = 20
+
+
+class BatchLookups(object):
+    '''@brief Parts looked up in batches, at the distributors whose module has
+    a `get_parts_batch(dist, pns, scrape_retries)` function, whose `pns` is a
+    `list()` of (part number, manufacturer) to search, that returns a `dict()`
+    of (part number, manufacturer): (HTML tree, url) with the parts found.
+
+    Each distributor has a thread that looks up its batches, in the order of
+    the parts, while the other distributors are scraped. `get()` waits for
+    the batch of a part. The parts not found in their batch (or not batched
+    at all) are looked up one by one, as usual.'''
+
+    def __init__(self, parts, distributor_dict, scrape_retries=2):
+        '''@param parts `list()` of part groups to scrape.
+        @param distributor_dict `dict()` with the distributors definitions.
+        @param scrape_retries `int()` web retries of each request.'''
+        self.scrape_retries = scrape_retries
+        self.batches = {} # Distributor: `list()` of batches of (part number, manufacturer).
+        self.modules = {}
+        quote_cache = fetch_config['quote_cache']
+        miss_cache = fetch_config['miss_cache']
+        for dist in distributor_dict:
+            module = get_dist_module(dist, distributor_dict)
+            if distributor_dict[dist]['scrape'] != 'web' or not hasattr(module, 'get_parts_batch'):
+                continue
+            pns = []
+            seen = set()
+            for part in parts:
+                pn = part_search_number(part, dist)
+                manf = part.fields.get('manf', '')
+                if not pn or (pn, manf) in seen:
+                    continue
+                seen.add((pn, manf))
+                # The cached quotes and the recent misses don't need any request.
+                if quote_cache is not None and quote_cache.get(dist, pn)[1] is None:
+                    continue
+                if miss_cache is not None and miss_cache.is_miss(dist, pn, manf):
+                    continue
+                pns.append((pn, manf))
+            if pns:
+                size = getattr(module, 'BATCH_SIZE', BATCH_SIZE)
+                self.modules[dist] = module
+                self.batches[dist] = [pns[i:i+size] for i in range(0, len(pns), size)]
+                logger.log(DEBUG_OVERVIEW, 'Looking up {} parts at {} in {} batches.'.format(
+                           len(pns), dist, len(self.batches[dist])))
+        self._reset()
+        self.pending = set((d,) + key for d, batches in self.batches.items() for b in batches for key in b)
+
+    def _reset(self):
+        self.condition = threading.Condition()
+        self.threads = []
+        self.pending = set() # (distributor, part number, manufacturer) of the batches not looked up yet.
+        self.data = {} # (distributor, part number, manufacturer): part data, as returned by `lookup_dist()`.
+        self.failed = set() # (distributor, part number, manufacturer) found in a batch with some page not read.
+
+    def __getstate__(self):
+        # The scraping processes only get the data of the batches already looked up.
+        with self.condition:
+            return {'scrape_retries': self.scrape_retries, 'data': dict(self.data), 'failed': set(self.failed)}
+
+    def __setstate__(self, state):
+        self._reset()
+        self.scrape_retries = state['scrape_retries']
+        self.batches = {}
+        self.modules = {}
+        self.data = state['data']
+        self.failed = state['failed']
+
+    def start(self):
+        '''@brief Start the threads that look up the batches.'''
+        for dist in self.batches:
+            thread = threading.Thread(target=self.run, args=(dist,))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def wait(self):
+        '''@brief Wait until all the batches were looked up.'''
+        for thread in self.threads:
+            thread.join()
+
+    def run(self, dist):
+        '''@brief Look up the batches of a distributor.'''
+        module = self.modules[dist]
+        for pns in self.batches[dist]:
+            data = {}
+            fetch_local.failed = False
+            try:
+                breaker = fetch_config['breaker']
+                if breaker is None or not breaker.is_open(dist):
+                    trees = module.get_parts_batch(dist, pns, scrape_retries=self.scrape_retries)
+                    for key, (html_tree, url) in trees.items():
+                        data[key] = (url,) + extract_part_data(module, html_tree)
+            except Exception as e:
+                # Its parts will be looked up one by one.
+                logger.log(DEBUG_DETAILED, 'Batch lookup at {} failed: {}'.format(dist, e))
+            finally:
+                with self.condition:
+                    for key in pns:
+                        self.pending.discard((dist,) + key)
+                        if key in data:
+                            self.data[(dist,) + key] = data[key]
+                            if fetch_local.failed:
+                                self.failed.add((dist,) + key)
+                    self.condition.notify_all()
+            logger.log(DEBUG_OBSESSIVE, 'Found {} of {} parts in a batch at {}.'.format(len(data), len(pns), dist))
+
+    def get(self, dist, pn, manf=''):
+        '''@brief Get the data of a part, waiting for its batch.
+        @param dist `str()` distributor name.
+        @param pn `str()` part number.
+        @param manf `str()` manufacturer of the part.
+        @return (url, `str` distributor stock part number, `dict` price tiers, `int` qty avail,
+        `dict` extrainfo dist) or `None` if the part must be looked up alone.'''
+        with self.condition:
+            while (dist, pn, manf) in self.pending:
+                self.condition.wait()
+            data = self.data.get((dist, pn, manf))
+        return copy.deepcopy(data)
+
+    def read_failed(self, dist, pn, manf=''):
+        '''@brief Tell if some page of the batch of a part could not be read,
+        so its data may be incomplete (e.g. without prices) and must not be cached.
+        @param dist `str()` distributor name.
+        @param pn `str()` part number.
+        @param manf `str()` manufacturer of the part.
+        @return `bool()`.'''
+        with self.condition:
+            return (dist, pn, manf) in self.failed
@@ -0,0 +1,117 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import os
+import io
+import json
+
+from .web_routines import part_search_number
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['ScrapeCheckpoint', 'CHECKPOINT_EXT']
+
+CHECKPOINT_EXT = '.scrape.jsonl' # Extension of the checkpoint file, created beside the spreadsheet.
+
+
+class ScrapeCheckpoint(object):
+    '''@brief Append-only file with the data of each part as soon as it is scraped.
+
+    Each line has the codes searched for a part at each distributor and the
+    data found. If the run is interrupted, the next run can load the parts
+    already scraped (matched by their codes, so the BOM may be changed) and
+    scrape only the others.'''
+
+    def __init__(self, path):
+        '''@param path `str()` file name.'''
+        self.path = path
+        self.file = None
+
+    def load(self, parts, dists):
+        '''@brief Get the data of the parts in the checkpoint file.
+        @param parts `list()` of part groups.
+        @param dists `list()` of distributor names.
+        @return `dict()` part index: `scrape_part()` like result, for the parts
+        found for all the distributors.'''
+        data = {}
+        try:
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # Line cut by the interruption.
+                    manf = entry['manf']
+                    for d, (pn, dist_data) in entry['dists'].items():
+                        url, part_num, price_tiers, qty_avail, info_dist = dist_data
+                        # JSON only has string keys, the price breaks are integers.
+                        price_tiers = {int(q): p for q, p in price_tiers.items()}
+                        data[(d, pn, manf)] = (url, part_num, price_tiers, qty_avail, info_dist)
+        except (IOError, OSError):
+            return {}
+
+        results = {}
+        for i, part in enumerate(parts):
+            keys = [(d, part_search_number(part, d), part.fields.get('manf', '')) for d in dists]
+            if all(k in data for k in keys):
+                url, part_num, price_tiers, qty_avail, info_dist = {}, {}, {}, {}, {}
+                for k in keys:
+                    d = k[0]
+                    url[d], part_num[d], price_tiers[d], qty_avail[d], info_dist[d] = data[k]
+                results[i] = (i, url, part_num, price_tiers, qty_avail, info_dist)
+        logger.log(DEBUG_OVERVIEW, 'Loaded {} parts from the checkpoint {}.'.format(len(results), self.path))
+        return results
+
+    def write(self, part, result):
+        '''@brief Append the data scraped for a part.
+        @param part Part group.
+        @param result `scrape_part()` like result of the part.'''
+        _, url, part_num, price_tiers, qty_avail, info_dist = result
+        entry = {'manf': part.fields.get('manf', ''), 'dists': {}}
+        for d in url:
+            entry['dists'][d] = [part_search_number(part, d),
+                                 [url[d], part_num[d], price_tiers[d], qty_avail[d], info_dist[d]]]
+        if self.file is None:
+            self.file = io.open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps(entry, default=str) + '\n')
+        self.file.flush() # Keep it even if the program is killed.
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        '''@brief Remove the checkpoint file, when not needed anymore.'''
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
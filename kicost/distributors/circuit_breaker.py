@@ -0,0 +1,104 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import threading
+import multiprocessing
+
+__all__ = ['CircuitBreaker', 'MAX_FAILURES']
+
+MAX_FAILURES = 5 # Default consecutive page read failures that stop the accesses to a distributor.
+
+
+class CircuitBreaker(object):
+    '''@brief Stop accessing a distributor website that keeps failing.
+
+    After `max_failures` consecutive pages of a distributor could not be read
+    (each one after all its retries) the distributor is not accessed again
+    for the rest of the run. With `shared=True` the state is kept in shared
+    memory and the object must be passed to the scraping processes at their
+    creation (`Pool` initializer), like `Throttle`.'''
+
+    def __init__(self, dists, max_failures=MAX_FAILURES, shared=False):
+        '''@param dists `list()` of distributor names.
+        @param max_failures `int()` consecutive failures to stop, 0 to never stop.
+        @param shared `bool()` share the state among processes.'''
+        self.index = {d: i for i, d in enumerate(dists)}
+        self.max_failures = max_failures
+        n = len(self.index)
+        if shared:
+            self.lock = multiprocessing.Lock()
+            self.failures = multiprocessing.RawArray('i', n) # Consecutive failures (-1 when open).
+            self.skipped = multiprocessing.RawArray('i', n) # Pages not read while open.
+        else:
+            self.lock = threading.Lock()
+            self.failures = [0] * n
+            self.skipped = [0] * n
+
+    def is_open(self, dist):
+        '''@brief Check if a distributor must not be accessed anymore.
+        @param dist `str()` distributor name.'''
+        i = self.index.get(dist)
+        return i is not None and self.failures[i] < 0
+
+    def skip(self, dist):
+        '''@brief Count a page not read because the distributor is not accessed anymore.'''
+        i = self.index.get(dist)
+        if i is not None:
+            with self.lock:
+                self.skipped[i] += 1
+
+    def success(self, dist):
+        '''@brief Register a page read from a distributor.'''
+        i = self.index.get(dist)
+        if i is not None and self.failures[i] > 0:
+            with self.lock:
+                if self.failures[i] > 0:
+                    self.failures[i] = 0
+
+    def failure(self, dist):
+        '''@brief Register a page that could not be read from a distributor.
+        @return `bool()` True if the distributor must not be accessed anymore (just now).'''
+        i = self.index.get(dist)
+        if i is None or self.max_failures <= 0:
+            return False
+        with self.lock:
+            if self.failures[i] < 0:
+                return False
+            self.failures[i] += 1
+            if self.failures[i] >= self.max_failures:
+                self.failures[i] = -1
+                return True
+        return False
+
+    def summary(self):
+        '''@brief Distributors not accessed anymore.
+        @return `dict()` distributor name: pages not read.'''
+        return {d: self.skipped[i] for d, i in self.index.items() if self.failures[i] < 0}
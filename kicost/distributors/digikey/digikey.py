@@ -43,8 +43,28 @@ from ...globals import PartHtmlError
 from ...globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
 
 from .. import distributor_dict
+from ..web_fetch import fetch_page, fetch_in_background
+from ..html_strainer import PageStrainer, pn_in_page
+from ..page_extractor import PageExtractor, Field, Table
 import pycountry
 
+# Elements of the product and search pages used to scrape the part data.
+PAGE_STRAINER = PageStrainer(
+    keep=['table#product-dollars', 'td#reportPartNumber', 'td#quantityAvailable', 'table#prod-att-table',
+          'a[target=_blank]', 'img[itemprop=image]', 'div#additionalPackaging', 'table#productTable'],
+    mark=['div.product-top-section', 'table#product-details-reel-pricing', 'form#keywordSearchForm'])
+
+# Part data in the product page.
+EXTRACTOR = PageExtractor(
+    part_num=Field('td#reportPartNumber', 'nospace'),
+    qty_avail=Field('td#quantityAvailable span#dkQty', 'leading_int'),
+    qty_input=Field('td#quantityAvailable span#dkQty input[type=text]', 'int', attr='value'),
+    price_tiers=Table('td:nth-of-type(1)', 'td:nth-of-type(2)', rows='table#product-dollars tr',
+                      key_clean='int', value_clean='price'),
+    attributes=Table('th', 'td', rows='table#prod-att-table tr:not([id])'), # The header row has an id.
+    datasheet=Field('a[target=_blank][href]', attr='href'),
+    image=Field('img[itemprop=image]', attr='src'))
+
 def define_locale_currency(locale_iso=None, currency_iso=None):
     '''@brief Configure the distributor for the country and currency intended.
     
@@ -56,15 +76,8 @@ def define_locale_currency(locale_iso=None, currency_iso=None):
     @param locale_iso `str` Country in ISO3166 alpha 2 standard.
     @param currency_iso `str` Currency in ISO4217 alpha 3 standard.'''
     url = 'https://www.digikey.com/en/resources/international'
-    req = FakeBrowser(url)
-    for _ in range(4):
-        try:
-            response = urlopen(req)
-            html = response.read()
-            break
-        except WEB_SCRAPE_EXCEPTIONS:
-            logger.log(DEBUG_DETAILED,'Exception while web-scraping DigiKey conofiguration')
-    else: # Couldn't get a good read from the website.
+    html = fetch_page('digikey', FakeBrowser(url), scrape_retries=4)
+    if html is None: # Couldn't get a good read from the website.
         logger.log(DEBUG_OBSESSIVE,'No HTML page for DigiKey configuration')
         raise PartHtmlError
     html = BeautifulSoup(html, 'lxml')
@@ -96,34 +109,18 @@ def get_extra_info(html_tree):
        @return `dict()` keys as characteristics names.
     '''
     info = {}
-    try:
-        table =  html_tree.find('table', id='prod-att-table')
-        for row in table.find_all('tr', id=None): # `None`to ignore the header row.
-            try:
-                k = row.find('th').text.strip().lower()
-                v = row.find('td').text.strip()
-                k = extra_info_dist_name_translations.get(k, k)
-                if k in EXTRA_INFO_DIST:
-                    info[k] = v
-            except:
-                continue
-        if 'datasheet' in EXTRA_INFO_DIST:
-            try:
-                info['datasheet'] = html_tree.find('a', href=True, target='_blank').get('href')
-                if info['datasheet'][0:2]=='//':
-                    info['datasheet'] = 'https:' + info['datasheet'] # Digikey missing definitions.
-            except:
-                pass
-        if 'image' in EXTRA_INFO_DIST:
-            try:
-                info['image'] = html_tree.find('img', itemprop="image").get('src')
-                if info['image'][0:2]=='//':
-                    info['image'] = 'https:' + info['image'] # Digikey missing definitions.
-            except:
-                pass
-    except AttributeError:
-        # This happens when no pricing info is found in the tree.
-        logger.log(DEBUG_OBSESSIVE, 'No Digikey pricing information found!')
+    for k, v in EXTRACTOR.get('attributes', html_tree):
+        k = k.lower()
+        k = extra_info_dist_name_translations.get(k, k)
+        if k in EXTRA_INFO_DIST:
+            info[k] = v
+    for k in ('datasheet', 'image'):
+        if k in EXTRA_INFO_DIST:
+            link = EXTRACTOR.get(k, html_tree)
+            if link:
+                if link[0:2] == '//':
+                    link = 'https:' + link # Digikey missing definitions.
+                info[k] = link
     return info
 
 
@@ -132,18 +129,8 @@ def get_price_tiers(html_tree):
        @param html_tree `str()` html of the distributor part page.
        @return `dict()` price breaks, the keys are the quantities breaks.
     '''
-    price_tiers = {}
-    try:
-        for tr in html_tree.find('table', id='product-dollars').find_all('tr'):
-            try:
-                td = tr.find_all('td')
-                qty = int(re.sub('[^0-9]', '', td[0].text))
-                price_tiers[qty] = float(re.sub('[^0-9\.]', '', td[1].text))
-            except (TypeError, AttributeError, ValueError,
-                    IndexError):  # Happens when there's no <td> in table row.
-                continue
-    except AttributeError:
-        # This happens when no pricing info is found in the tree.
+    price_tiers = dict(EXTRACTOR.get('price_tiers', html_tree))
+    if not price_tiers:
         logger.log(DEBUG_OBSESSIVE, 'No Digikey pricing information found!')
     return price_tiers
 
@@ -167,12 +154,11 @@ def get_part_num(html_tree):
        @param html_tree `str()` html of the distributor part page.
        @return `list()`of the parts that match.
     '''
-    try:
-        return re.sub('\s', '', html_tree.find('td',
-                                               id='reportPartNumber').text)
-    except AttributeError:
+    part_num = EXTRACTOR.get('part_num', html_tree)
+    if part_num is None:
         logger.log(DEBUG_OBSESSIVE, 'No Digikey part number found!')
         return ''
+    return part_num
 
 
 def get_qty_avail(html_tree):
@@ -181,26 +167,16 @@ def get_qty_avail(html_tree):
        @return `int` avaliable quantity.
     '''
     try:
-        qty_tree = html_tree.find('td', id='quantityAvailable').find('span', id='dkQty')
-        qty_str = qty_tree.text
-    except AttributeError:
-        # No quantity found (not even 0) so this is probably a non-stocked part.
-        # Return None so the part won't show in the spreadsheet for this dist.
-        return None
-    try:
-        qty_str = re.search('([0-9,]*)', qty_str, re.IGNORECASE).group(1)
-        return int(re.sub('[^0-9]', '', qty_str))
-    except (AttributeError, ValueError):
+        # `None` if no quantity found (not even 0), so this is probably a non-stocked
+        # part and it won't show in the spreadsheet for this dist.
+        return EXTRACTOR.extract('qty_avail', html_tree)
+    except ValueError:
         # Didn't find the usual quantity text field. This might be one of those
         # input fields for requesting a quantity, so get the value from the
-        # input field.
-        try:
-            logger.log(DEBUG_OBSESSIVE, 'No Digikey part quantity found!')
-            return int(qty_tree.find('input', type='text').get('value'))
-        except (AttributeError, ValueError):
-            # Well, there's a quantityAvailable section in the website, but
-            # it doesn't contain anything decipherable. Let's just assume it's 0.
-            return 0
+        # input field. If there's a quantityAvailable section in the website,
+        # but it doesn't contain anything decipherable, let's just assume it's 0.
+        logger.log(DEBUG_OBSESSIVE, 'No Digikey part quantity found!')
+        return EXTRACTOR.get('qty_input', html_tree, default=0)
 
 
 def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, local_part_html=None, scrape_retries=2):
@@ -252,22 +228,14 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
         url = distributor_dict['digikey']['site']['url'] + url
 
     # Open the URL, read the HTML from it, and parse it into a tree structure.
-    req = FakeBrowser(url)
-    for _ in range(scrape_retries):
-        try:
-            response = urlopen(req)
-            html = response.read()
-            break
-        except WEB_SCRAPE_EXCEPTIONS:
-            logger.log(DEBUG_DETAILED,'Exception while web-scraping {} from {}'.format(pn, dist))
-
-    else: # Couldn't get a good read from the website.
+    html = fetch_page(dist, FakeBrowser(url), scrape_retries=scrape_retries)
+    if html is None: # Couldn't get a good read from the website.
         logger.log(DEBUG_OBSESSIVE,'No HTML page for {} from {}'.format(pn, dist))
         raise PartHtmlError
 
     # Abort if the part number isn't in the HTML somewhere.
     # (Only use the numbers and letters to compare PN to HTML.)
-    if re.sub('[\W_]','',str.lower(pn)) not in re.sub('[\W_]','',str.lower(str(html))):
+    if not pn_in_page(pn, html):
         logger.log(DEBUG_OBSESSIVE,'No part number {} in HTML page from {}'.format(pn, dist))
         raise PartHtmlError
 
@@ -282,7 +250,7 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
     # print('Exception reading with Ghost: {}'.format(e))
 
     try:
-        tree = BeautifulSoup(html, 'lxml')
+        tree = PAGE_STRAINER.parse(html)
     except Exception:
         logger.log(DEBUG_OBSESSIVE,'No HTML tree for {} from {}'.format(pn, dist))
         raise PartHtmlError
@@ -303,19 +271,26 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
                             'ul', class_='more-expander-item')
                 ]
                 logger.log(DEBUG_OBSESSIVE,'Found {} alternate packagings for {} from {}'.format(len(ap_urls), pn, dist))
-                ap_trees_and_urls = []  # Initialize as empty in case no alternate packagings are found.
-                try:
-                    ap_trees_and_urls = [get_part_html_tree(dist, pn, 
-                                     extra_search_terms, ap_url, descend=0, scrape_retries=scrape_retries)
-                                     for ap_url in ap_urls]
-                except Exception:
-                    logger.log(DEBUG_OBSESSIVE,'Failed to find alternate packagings for {} from {}'.format(pn, dist))
+
+                # Read the alternate-packaging pages at the same time (each read
+                # still waits for its Digi-Key throttling slot, and only a few
+                # run in background threads) while the main page is examined.
+                ap_fetches = [fetch_in_background(dist, get_part_html_tree, dist, pn, extra_search_terms, ap_url,
+                                                  descend=0, scrape_retries=scrape_retries)
+                              for ap_url in ap_urls]
+                main_is_reeled = part_is_reeled(tree)
+                ap_trees_and_urls = []
+                for ap_fetch in ap_fetches:
+                    try:
+                        ap_trees_and_urls.append(ap_fetch.result())
+                    except Exception:
+                        logger.log(DEBUG_OBSESSIVE,'Failed to find alternate packagings for {} from {}'.format(pn, dist))
 
                 # Put the main tree on the list as well and then look through
                 # the entire list for one that's non-reeled. Use this as the
                 # main page for the part.
                 ap_trees_and_urls.append((tree, url))
-                if part_is_reeled(tree):
+                if main_is_reeled:
                     for ap_tree, ap_url in ap_trees_and_urls:
                         if not part_is_reeled(ap_tree):
                             # Found a non-reeled part, so use it as the main page.
@@ -12,18 +12,35 @@ standard_library.install_aliases()
 
 import future
 
-import re
 import difflib
-from bs4 import BeautifulSoup
 import http.client # For web scraping exceptions.
 from .. import urlquote, urlsplit, urlunsplit, urlopen, Request
 from .. import WEB_SCRAPE_EXCEPTIONS
 from .. import FakeBrowser
+from ..web_fetch import fetch_page
+from ..html_strainer import PageStrainer, pn_in_page
+from ..page_extractor import PageExtractor, Field, Table
 from ...globals import PartHtmlError
 from ...globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
 from currency_converter import CurrencyConverter
 currency = CurrencyConverter()
 
+# Elements of the product and search pages used to scrape the part data.
+PAGE_STRAINER = PageStrainer(
+    keep=['table.tableProductDetailPrice', 'table.pricing', 'div.productDescription',
+          'p.availabilityHeading', 'table.productLister#sProdList'],
+    mark=['div.productDisplay#page'])
+
+# Part data in the product page. The catalog number is in a description
+# list, paired with its term (both without spaces).
+EXTRACTOR = PageExtractor(
+    descriptions=Table('div.productDescription dl dt', 'div.productDescription dl dd',
+                       key_clean='nospace', value_clean='nospace'),
+    qty_avail=Field('p.availabilityHeading', 'int'),
+    price_tiers=Table('table.tableProductDetailPrice td.qty, table.pricing td.qty',
+                      'table.tableProductDetailPrice td.threeColTd, table.pricing td.threeColTd',
+                      key_clean='first_int', value_clean='price_comma'))
+
 __author__='Giacinto Luigi Cerone'
 
 
@@ -32,75 +49,36 @@ def get_price_tiers(html_tree):
        @param html_tree `str()` html of the distributor part page.
        @return `dict()` price breaks, the keys are the quantities breaks.
     '''
-    price_tiers = {}
-    try:
-        qty_strs = []
-        for qty in html_tree.find(
-            'table',
-            class_=('tableProductDetailPrice', 'pricing')).find_all(
-                'td',
-                class_='qty'):
-            qty_strs.append(qty.text)
-        price_strs = []
-        for price in html_tree.find(
-            'table',
-            class_=('tableProductDetailPrice', 'pricing')).find_all(
-                'td',
-                class_='threeColTd'):
-            price_strs.append(price.text)
-        qtys_prices = list(zip(qty_strs, price_strs))
-        for qty_str, price_str in qtys_prices:
-            try:
-                qty = re.search('(\s*)([0-9,]+)', qty_str).group(2)
-                qty = int(re.sub('[^0-9]', '', qty))
-                price_str=price_str.replace(',','.')
-                price_tiers[qty] = float(re.sub('[^0-9\.]', '', price_str))
-                price_tiers[qty] = currency.convert(price_tiers[qty], 'EUR', 'USD')
-            except (TypeError, AttributeError, ValueError):
-                continue
-    except AttributeError:
-        # This happens when no pricing info is found in the tree.
-        return price_tiers  # Return empty price tiers.
+    price_tiers = {qty: currency.convert(price, 'EUR', 'USD')
+                   for qty, price in EXTRACTOR.get('price_tiers', html_tree)}
+    if not price_tiers:
+        logger.log(DEBUG_OBSESSIVE, 'No Farnell pricing information found!')
     return price_tiers
-    
+
+
 def get_part_num(html_tree):
     '''@brief Get the part number from the farnell product page.
        @param html_tree `str()` html of the distributor part page.
        @return `list()`of the parts that match.
     '''
-    try:
-        # farnell catalog number is stored in a description list, so get
-        # all the list terms and descriptions, strip all the spaces from those,
-        # and pair them up.
-        div = html_tree.find('div', class_='productDescription').find('dl')
-        dt = [re.sub('\s','',d.text) for d in div.find_all('dt')]
-        dd = [re.sub('\s','',d.text) for d in div.find_all('dd')]
-        dtdd = {k:v for k,v in zip(dt,dd)}  # Pair terms with descriptions.
-#        return dtdd.get('farnellPartNo.:', '')
-        return dtdd.get('CodiceProdotto', '')
-    except KeyError:
-        return '' # No catalog number found in page.
-    except AttributeError:
-        return '' # No ProductDescription found in page.
+    part_num = dict(EXTRACTOR.get('descriptions', html_tree)).get('CodiceProdotto', '')
+    if not part_num:
+        logger.log(DEBUG_OBSESSIVE, 'No Farnell catalog number found!')
+    return part_num
+
 
 def get_qty_avail(html_tree):
     '''@brief Get the available quantity of the part from the farnell product page.
        @param html_tree `str()` html of the distributor part page.
        @return `int` avaliable quantity.
     '''
-    try:
-        qty_str = html_tree.find('p', class_='availabilityHeading').text
-    except (AttributeError, ValueError):
+    qty = EXTRACTOR.get('qty_avail', html_tree)
+    if qty is None:
         # No quantity found (not even 0) so this is probably a non-stocked part.
         # Return None so the part won't show in the spreadsheet for this dist.
-        return None
-    try:
-        qty = re.sub('[^0-9]','',qty_str)  # Strip all non-number chars.
-        return int(re.sub('[^0-9]', '', qty_str))  # Return integer for quantity.
-    except ValueError:
-        # No quantity found (not even 0) so this is probably a non-stocked part.
-        # Return None so the part won't show in the spreadsheet for this dist.
-        return None
+        logger.log(DEBUG_OBSESSIVE, 'No Farnell part quantity found!')
+    return qty
+
 
 def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, local_part_html=None, scrape_retries=2):
     '''@brief Find the farnell HTML page for a part number and return the URL and parse tree.
@@ -129,27 +107,19 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
         url = 'http://www.farnell.com/Search/' + url
 
     # Open the URL, read the HTML from it, and parse it into a tree structure.
-    for _ in range(scrape_retries):
-        try:
-            req = FakeBrowser(url)
-            response = urlopen(req)
-            html = response.read()
-            break
-        except WEB_SCRAPE_EXCEPTIONS:
-            logger.log(DEBUG_DETAILED,'Exception while web-scraping {} from {}'.format(pn, dist))
-            pass
-    else: # Couldn't get a good read from the website.
+    html = fetch_page(dist, FakeBrowser(url), scrape_retries=scrape_retries)
+    if html is None: # Couldn't get a good read from the website.
         logger.log(DEBUG_OBSESSIVE,'No HTML page for {} from {}'.format(pn, dist))
         raise PartHtmlError
 
     # Abort if the part number isn't in the HTML somewhere.
     # (Only use the numbers and letters to compare PN to HTML.)
-    if re.sub('[\W_]','',str.lower(pn)) not in re.sub('[\W_]','',str.lower(str(html))):
+    if not pn_in_page(pn, html):
         logger.log(DEBUG_OBSESSIVE,'No part number {} in HTML page from {}'.format(pn, dist))
         raise PartHtmlError
 
     try:
-        tree = BeautifulSoup(html, 'lxml')
+        tree = PAGE_STRAINER.parse(html)
     except Exception:
         logger.log(DEBUG_OBSESSIVE,'No HTML tree for {} from {}'.format(pn, dist))
         raise PartHtmlError
@@ -0,0 +1,249 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import io
+import json
+import threading
+import multiprocessing
+
+__all__ = ['FetchStats', 'FETCH_STATS', 'FETCH_HISTOGRAMS', 'LATENCY_BUCKETS']
+
+# Counters kept about the accesses to each distributor web site.
+FETCH_STATS = [
+    ('requests', 'HTTP requests sent (including redirections and retries).'),
+    ('connections', 'New connections (TCP/TLS handshakes) opened.'),
+    ('retries', 'Page reads retried after a failure.'),
+    ('errors', 'Page reads failed without an HTTP answer (network errors, timeouts).'),
+    ('status_2xx', 'Pages answered with success.'),
+    ('status_3xx', 'Pages answered with an unfollowed redirection.'),
+    ('status_4xx', 'Pages answered with a client error (e.g. not found, too many requests).'),
+    ('status_5xx', 'Pages answered with a server error.'),
+    ('cache_hits', 'Pages read from the page cache.'),
+    ('cache_misses', 'Pages not found in the page cache.'),
+    ('quote_hits', 'Parts with all their data fresh in the quote cache.'),
+    ('quote_misses', 'Parts scraped because their cached data was missing or stale.'),
+    ('miss_hits', 'Searches skipped because the part was recently not found.'),
+    ('batch_hits', 'Parts found by a batch lookup with other parts.'),
+    ('url_hits', 'Searches skipped by reading the product page found by a previous search.'),
+    ('found', 'Parts found at the distributor.'),
+    ('not_found', 'Parts not found at the distributor.'),
+    ('bytes_wire', 'Bytes of the pages received (compressed).'),
+    ('bytes_body', 'Bytes of the pages after decompressing them.'),
+]
+
+# Time distributions kept for each distributor.
+FETCH_HISTOGRAMS = [
+    ('fetch_seconds', 'Seconds to read a page from the web site (each try).'),
+    ('parse_seconds', 'Seconds to parse the pages and extract the data of a part.'),
+]
+
+# Upper bounds (seconds) of the histogram buckets, the last bucket has no limit.
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+PROMETHEUS_PREFIX = 'kicost_'
+
+
+class FetchStats(object):
+    '''@brief Counters and latency histograms of the web accesses of all the
+    scraping processes/threads, for each distributor.
+
+    With `shared=True` the values are kept in shared memory and the object
+    must be passed to the scraping processes at their creation (`Pool`
+    initializer), like `Throttle`.'''
+
+    def __init__(self, dists=(), shared=False):
+        '''@param dists `list()` of the distributor names (the accesses of other
+        names are counted without distributor).
+        @param shared `bool()` share the counters among processes.'''
+        self.dists = list(dists)
+        self.rows = {d: i + 1 for i, d in enumerate(self.dists)} # Row 0: no distributor.
+        self.index = {k: i for i, (k, _) in enumerate(FETCH_STATS)}
+        # Each histogram has the counts of its buckets (and beyond the last) and the sum.
+        self.hist_index = {}
+        width = len(FETCH_STATS)
+        for k, _ in FETCH_HISTOGRAMS:
+            self.hist_index[k] = width
+            width += len(LATENCY_BUCKETS) + 2
+        self.width = width
+        size = width * (len(self.dists) + 1)
+        if shared:
+            self.lock = multiprocessing.Lock()
+            self.counts = multiprocessing.RawArray('d', size)
+        else:
+            self.lock = threading.Lock()
+            self.counts = [0.0] * size
+
+    def offset(self, dist):
+        return self.rows.get(dist, 0) * self.width
+
+    def add(self, key, n=1, dist=None):
+        '''@brief Increment a counter.
+        @param key `str()` one of `FETCH_STATS`.
+        @param n Value to add.
+        @param dist `str()` distributor name.'''
+        with self.lock:
+            self.counts[self.offset(dist) + self.index[key]] += n
+
+    def observe(self, key, seconds, dist=None):
+        '''@brief Add a time to a histogram.
+        @param key `str()` one of `FETCH_HISTOGRAMS`.
+        @param seconds `float()` time measured.
+        @param dist `str()` distributor name.'''
+        bucket = len(LATENCY_BUCKETS)
+        for i, limit in enumerate(LATENCY_BUCKETS):
+            if seconds <= limit:
+                bucket = i
+                break
+        i = self.offset(dist) + self.hist_index[key]
+        with self.lock:
+            self.counts[i + bucket] += 1
+            self.counts[i + len(LATENCY_BUCKETS) + 1] += seconds
+
+    def for_dist(self, dist):
+        '''@brief View of the counters that counts the accesses of a distributor.
+        @return Object with the `add()` and `observe()` methods of `FetchStats`.'''
+        return DistStats(self, dist)
+
+    def get(self, key, dist=None):
+        '''@brief Value of a counter.
+        @param dist `str()` distributor name or `None` for all of them.'''
+        rows = [self.offset(dist)] if dist is not None else range(0, len(self.counts), self.width)
+        return int(sum(self.counts[r + self.index[key]] for r in rows))
+
+    def histogram(self, key, dist):
+        '''@brief Values of a histogram.
+        @return (`list()` with the count of each bucket (and beyond the last), `float()` sum).'''
+        i = self.offset(dist) + self.hist_index[key]
+        n = len(LATENCY_BUCKETS) + 1
+        return [int(c) for c in self.counts[i:i + n]], self.counts[i + n]
+
+    def percentile(self, key, dist, q):
+        '''@brief Estimate a percentile of a histogram (interpolating inside its bucket).
+        @param q `float()` percentile (0 to 100).
+        @return `float()` seconds or `None` without values.'''
+        counts, _ = self.histogram(key, dist)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q / 100.0 * total
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                low = LATENCY_BUCKETS[i - 1] if i else 0.0
+                if i == len(LATENCY_BUCKETS):
+                    return low # Beyond the last limit, can't tell more.
+                return low + (LATENCY_BUCKETS[i] - low) * (rank - seen) / c
+            seen += c
+        return LATENCY_BUCKETS[-1]
+
+    def as_dict(self):
+        '''@brief All the counters (of all the distributors) as a `dict()`.'''
+        return {k: self.get(k) for k, _ in FETCH_STATS}
+
+    def labels(self):
+        '''@brief Distributors with some access counted ('' for the accesses without distributor).'''
+        names = []
+        for d in [None] + sorted(self.dists):
+            i = self.offset(d)
+            if any(self.counts[i:i + self.width]):
+                names.append(d or '')
+        return names
+
+    def metrics(self):
+        '''@brief Counters and latency percentiles of each distributor (JSON-ready).
+        @return `dict()` with the totals and a `dict()` for each distributor.'''
+        result = {'total': self.as_dict(), 'distributors': {}}
+        for d in self.labels():
+            m = {k: self.get(k, d or None) for k, _ in FETCH_STATS}
+            for k, _ in FETCH_HISTOGRAMS:
+                counts, total = self.histogram(k, d or None)
+                m[k] = {'count': sum(counts), 'sum': total,
+                        'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], counts))}
+                for q in (50, 90, 99):
+                    m[k]['p{}'.format(q)] = self.percentile(k, d or None, q)
+            result['distributors'][d] = m
+        return result
+
+    def prometheus(self):
+        '''@brief Counters and histograms in the Prometheus text exposition format.
+        @return `str()`.'''
+        labels = self.labels()
+        lines = []
+        statuses = [k for k, _ in FETCH_STATS if k.startswith('status_')]
+        name = PROMETHEUS_PREFIX + 'http_responses_total'
+        lines += ['# HELP {} Pages answered by the distributor web sites, by HTTP status class.'.format(name),
+                  '# TYPE {} counter'.format(name)]
+        for d in labels:
+            for k in statuses:
+                lines.append('{}{{distributor="{}",status="{}"}} {}'.format(name, d, k[7:], self.get(k, d or None)))
+        for k, help in FETCH_STATS:
+            if k in statuses:
+                continue
+            name = PROMETHEUS_PREFIX + k + '_total'
+            lines += ['# HELP {} {}'.format(name, help), '# TYPE {} counter'.format(name)]
+            for d in labels:
+                lines.append('{}{{distributor="{}"}} {}'.format(name, d, self.get(k, d or None)))
+        for k, help in FETCH_HISTOGRAMS:
+            name = PROMETHEUS_PREFIX + k
+            lines += ['# HELP {} {}'.format(name, help), '# TYPE {} histogram'.format(name)]
+            for d in labels:
+                counts, total = self.histogram(k, d or None)
+                cumulative = 0
+                for limit, c in zip([repr(b) for b in LATENCY_BUCKETS] + ['+Inf'], counts):
+                    cumulative += c
+                    lines.append('{}_bucket{{distributor="{}",le="{}"}} {}'.format(name, d, limit, cumulative))
+                lines.append('{}_sum{{distributor="{}"}} {}'.format(name, d, repr(total)))
+                lines.append('{}_count{{distributor="{}"}} {}'.format(name, d, cumulative))
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path, fmt='json'):
+        '''@brief Write the metrics to a file.
+        @param path `str()` file name.
+        @param fmt `str()` 'json' or 'prometheus' (text format).'''
+        with io.open(path, 'w', encoding='utf-8') as f:
+            if fmt == 'prometheus':
+                f.write(self.prometheus())
+            else:
+                f.write(json.dumps(self.metrics(), indent=2, sort_keys=True))
+
+
+class DistStats(object):
+    '''@brief Counters of `FetchStats` for the accesses of one distributor.'''
+
+    def __init__(self, stats, dist):
+        self.stats = stats
+        self.dist = dist
+
+    def add(self, key, n=1):
+        self.stats.add(key, n, self.dist)
+
+    def observe(self, key, seconds):
+        self.stats.observe(key, seconds, self.dist)
@@ -0,0 +1,195 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import re
+from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+__all__ = ['PageStrainer', 'css_to_xpath', 'parse_css', 'pn_in_page']
+
+# Attributes that BeautifulSoup splits in a list of values.
+MULTI_VALUED_ATTRS = ('class', 'rel', 'rev', 'accept-charset', 'headers', 'accesskey', 'dropzone')
+
+SELECTOR_RE = re.compile(r'([#.])([\w-]+)|\[([\w-]+)(?:=([^\]]*))?\]|:nth-of-type\((\d+)\)|:not\(\[([\w-]+)\]\)')
+
+
+def parse_css(selector):
+    '''@brief Parse a simple CSS selector.
+
+    Each element is selected by its tag name followed by any number of `#id`,
+    `.class`, `[attribute]`, `[attribute=value]`, `:not([attribute])` and
+    `:nth-of-type(n)`. Only
+    the descendant combinator (a space) and lists of selectors (separated by
+    commas) are supported, and the attribute values can't have spaces.
+    @param selector `str()` e.g. 'table#product-dollars tr' or 'a[target=_blank]'.
+    @return `list()` of the alternative selectors, each a `list()` of
+    (tag or `None`, `list()` of tests) from the outer to the inner element.
+    The tests are ('id'/'class'/'attr', name, value or `None`), ('noattr', name, `None`)
+    and ('nth', n, `None`).'''
+    alternatives = []
+    for alternative in selector.split(','):
+        elements = []
+        for compound in alternative.split():
+            tag = re.match(r'[\w*]*', compound).group(0)
+            tests = []
+            pos = len(tag)
+            for m in SELECTOR_RE.finditer(compound, pos):
+                if m.start() != pos:
+                    break
+                pos = m.end()
+                if m.group(1) == '#':
+                    tests.append(('id', m.group(2), None))
+                elif m.group(1) == '.':
+                    tests.append(('class', m.group(2), None))
+                elif m.group(5) is not None:
+                    if tag in ('', '*'):
+                        raise ValueError('":nth-of-type()" needs a tag in CSS selector "{}"'.format(selector))
+                    tests.append(('nth', int(m.group(5)), None))
+                elif m.group(6) is not None:
+                    tests.append(('noattr', m.group(6), None))
+                else:
+                    value = None if m.group(4) is None else m.group(4).strip('"\'')
+                    tests.append(('attr', m.group(3), value))
+            if pos != len(compound) or not (tag or tests):
+                raise ValueError('Unsupported CSS selector "{}"'.format(selector))
+            elements.append((None if tag in ('', '*') else tag, tests))
+        if not elements:
+            raise ValueError('Unsupported CSS selector "{}"'.format(selector))
+        alternatives.append(elements)
+    return alternatives
+
+
+def css_to_xpath(selector):
+    '''@brief Translate a simple CSS selector (see `parse_css()`) to XPath.
+    @param selector `str()` e.g. 'table#product-dollars tr' or 'a[target=_blank]'.
+    @return `str()` XPath that finds these elements anywhere in the document.'''
+    xpaths = []
+    for elements in parse_css(selector):
+        steps = []
+        for tag, tests in elements:
+            # The position goes first, to count all the siblings with the tag.
+            predicates = [str(n) for kind, n, _ in tests if kind == 'nth']
+            for kind, name, value in tests:
+                if kind == 'id':
+                    predicates.append('@id="{}"'.format(name))
+                elif kind == 'class':
+                    predicates.append('contains(concat(" ", normalize-space(@class), " "), " {} ")'.format(name))
+                elif kind == 'attr':
+                    predicates.append('@{}'.format(name) if value is None else '@{}="{}"'.format(name, value))
+                elif kind == 'noattr':
+                    predicates.append('not(@{})'.format(name))
+            steps.append((tag or '*') + ''.join('[{}]'.format(p) for p in predicates))
+        xpaths.append('//' + '//'.join(steps))
+    return ' | '.join(xpaths)
+
+
+def pn_in_page(pn, html):
+    '''@brief Check if a part number is in a page, comparing only its letters
+    and numbers (case insensitive) and ignoring the other characters of the
+    page between them. The page is searched as is, without copies.
+    @param pn `str()` part number.
+    @param html `bytes` with the page.
+    @return `bool()`.'''
+    chars = [c for c in pn if c.isalnum()]
+    if not chars:
+        return True
+    pattern = b'[\\W_]*'.join(re.escape(c.encode('utf-8')) for c in chars)
+    return re.search(pattern, html, re.IGNORECASE) is not None
+
+
+class PageStrainer(object):
+    '''@brief Parse only the parts of a distributor page used by its module.
+
+    The page is parsed by lxml (fast, in C) and only the elements selected
+    are copied to the `BeautifulSoup` tree given to the module functions: the
+    `keep` elements with all their content, the `mark` elements empty (just
+    to tell the kind of page). They keep the order they have in the page, so
+    `find()` gets the same element it would get in the whole page. The lxml
+    tree is freed as soon as the selected elements are copied.
+    The selectors are compiled when the distributor module is imported.'''
+
+    def __init__(self, keep, mark=()):
+        '''@param keep `list()` of CSS selectors (see `css_to_xpath()`) of the elements used.
+        @param mark `list()` of CSS selectors of the elements only checked for existence.'''
+        self.keep = etree.XPath(' | '.join(css_to_xpath(s) for s in keep))
+        self.nodes = etree.XPath(' | '.join(css_to_xpath(s) for s in list(keep) + list(mark)))
+
+    def parse(self, html):
+        '''@brief Parse a page.
+        @param html `bytes` or `str()` with the page.
+        @return `BeautifulSoup` tree with the elements selected.'''
+        root = self.parse_lxml(html)
+        kept = set(self.keep(root))
+        copied = set()
+        soup = BeautifulSoup('', 'lxml')
+        body = soup.new_tag('body')
+        soup.append(body)
+        for node in self.nodes(root): # In document order.
+            if any(a in copied for a in node.iterancestors()):
+                continue # Already copied with its ancestor.
+            if node in kept:
+                copied.add(node)
+                body.append(self.copy(soup, node))
+            else:
+                body.append(soup.new_tag(node.tag, attrs=self.attrs(node)))
+        return soup
+
+    @staticmethod
+    def parse_lxml(html):
+        '''@brief Parse a page with lxml, as UTF-8 if possible (otherwise with
+        the encoding declared in the page).'''
+        if isinstance(html, bytes):
+            try:
+                return lxml.html.document_fromstring(html.decode('utf-8'))
+            except (UnicodeDecodeError, ValueError):
+                pass # Other encoding or an XML declaration in the page.
+        return lxml.html.document_fromstring(html)
+
+    @staticmethod
+    def attrs(node):
+        attrs = dict(node.attrib)
+        for a in MULTI_VALUED_ATTRS:
+            if a in attrs:
+                attrs[a] = attrs[a].split()
+        return attrs
+
+    def copy(self, soup, node):
+        '''@brief Copy an lxml element and its content to a `BeautifulSoup` tag.'''
+        tag = soup.new_tag(node.tag, attrs=self.attrs(node))
+        if node.text:
+            tag.append(node.text)
+        for child in node:
+            if isinstance(child.tag, str):
+                tag.append(self.copy(soup, child))
+            if child.tail: # Also of the comments.
+                tag.append(child.tail)
+        return tag
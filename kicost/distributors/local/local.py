@@ -32,7 +32,6 @@ standard_library.install_aliases()
 import future
 
 import re, difflib
-from bs4 import BeautifulSoup
 import http.client # For web scraping exceptions.
 from yattag import Doc, indent # For generating HTML page for local parts.
 import copy # To be possible create more than one local distributor.
@@ -43,66 +42,76 @@ from ...globals import PartHtmlError
 from ...globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
 from ...globals import SEPRTR
 
+NON_PRICING_RE = re.compile('[^0-9.;:]')
 
-def create_part_html(parts, distributors):
-    '''@brief Create HTML page containing info for local (non-webscraped) parts.
+
+class LocalPart(dict):
+    '''@brief Data of a local part ('cat#', 'pricing' and 'link'), given to the
+    functions that extract the part data in place of the HTML tree of the web
+    distributors.'''
+
+
+def create_part_index(parts, distributors):
+    '''@brief Create the index of the local (non-webscraped) parts info.
     @param parts `list()` of parts.
     @parm `list()`of the distributors to check each one is local.
-    @return `str()` of the HTML page to be read by `get_part_html_tree()`
+    @return `dict()` of `LocalPart` by 'dist:cat#', to be read by `get_part_html_tree()`.
     '''
-    
-    logger.log(DEBUG_OVERVIEW, 'Create HTML page for parts with custom pricing...')
-    
-    doc, tag, text = Doc().tagtext()
-    with tag('html'):
-        with tag('body'):
-            for p in parts:
-                # Find the manufacturer's part number if it exists.
-                pn = p.fields.get('manf#') # Returns None if no manf# field.
-
-                # Find the various distributors for this part by
-                # looking for leading fields terminated by SEPRTR.
-                for key in p.fields:
-                    try:
-                        dist = key[:key.index(SEPRTR)]
-                    except ValueError:
-                        continue
-
-                    # If the distributor is not in the list of web-scrapable distributors,
-                    # then it's a local distributor. Copy the local distributor template
-                    # and add it to the table of distributors.
-                    if dist not in distributors:
-                        distributors[dist] = copy.copy(distributors['local_template'])
-                        distributors[dist]['label'] = dist  # Set dist name for spreadsheet header.
-
-                # Now look for catalog number, price list and webpage link for this part.
-                for dist in distributors:
-                    cat_num = p.fields.get(dist+':cat#')
-                    pricing = p.fields.get(dist+':pricing')
-                    link = p.fields.get(dist+':link')
-                    if cat_num is None and pricing is None and link is None:
-                        continue
-
-                    def make_random_catalog_number(p):
-                        hash_fields = {k: p.fields[k] for k in p.fields}
-                        hash_fields['dist'] = dist
-                        return '#{0:08X}'.format(abs(hash(tuple(sorted(hash_fields.items())))))
-
-                    cat_num = cat_num or pn or make_random_catalog_number(p)
-                    p.fields[dist+':cat#'] = cat_num # Store generated cat#.
-                    with tag('div', klass=dist+SEPRTR+cat_num):
-                        with tag('div', klass='cat#'):
-                            text(cat_num)
-                        if pricing is not None:
-                            with tag('div', klass='pricing'):
-                                text(pricing)
-                        if link is not None:
-                            url_parts = list(urlsplit(link))
-                            if url_parts[0] == '':
-                                url_parts[0] = u'http'
-                            link = urlunsplit(url_parts)
-                            with tag('div', klass='link'):
-                                text(link)
+
+    logger.log(DEBUG_OVERVIEW, 'Create index of parts with custom pricing...')
+
+    index = {}
+    for p in parts:
+        # Find the manufacturer's part number if it exists.
+        pn = p.fields.get('manf#') # Returns None if no manf# field.
+
+        # Find the various distributors for this part by
+        # looking for leading fields terminated by SEPRTR.
+        for key in p.fields:
+            try:
+                dist = key[:key.index(SEPRTR)]
+            except ValueError:
+                continue
+
+            # If the distributor is not in the list of web-scrapable distributors,
+            # then it's a local distributor. Copy the local distributor template
+            # and add it to the table of distributors.
+            if dist not in distributors:
+                distributors[dist] = copy.copy(distributors['local_template'])
+                distributors[dist]['label'] = dist  # Set dist name for spreadsheet header.
+
+        # Now look for catalog number, price list and webpage link for this part.
+        for dist in distributors:
+            cat_num = p.fields.get(dist+':cat#')
+            pricing = p.fields.get(dist+':pricing')
+            link = p.fields.get(dist+':link')
+            if cat_num is None and pricing is None and link is None:
+                continue
+
+            def make_random_catalog_number(p):
+                hash_fields = {k: p.fields[k] for k in p.fields}
+                hash_fields['dist'] = dist
+                return '#{0:08X}'.format(abs(hash(tuple(sorted(hash_fields.items())))))
+
+            cat_num = cat_num or pn or make_random_catalog_number(p)
+            p.fields[dist+':cat#'] = cat_num # Store generated cat#.
+            part = LocalPart({'cat#': cat_num})
+            if pricing is not None:
+                part['pricing'] = pricing
+            if link is not None:
+                url_parts = list(urlsplit(link))
+                if url_parts[0] == '':
+                    url_parts[0] = u'http'
+                part['link'] = urlunsplit(url_parts).strip()
+            # Keep the first part with this catalog number, as the search
+            # in the HTML page of the local parts did.
+            key = dist+SEPRTR+cat_num
+            if key in index:
+                if index[key] != part:
+                    logger.warning('Ignoring the {} data of {}, it differs from the data of a previous part.'.format(
+                                   key, ', '.join(p.refs)))
+                continue
+            index[key] = part
 
     # Remove the local distributor template so it won't be processed later on.
     # It has served its purpose.
@@ -111,92 +120,109 @@ def create_part_html(parts, distributors):
     except:
         pass
 
-    html = doc.getvalue()
     if logger.isEnabledFor(DEBUG_OBSESSIVE):
-        print(indent(html))
-    return html
+        print(indent(index_to_html(index)))
+    return index
+
+
+def part_index(index, part):
+    '''@brief Get the entries of the local parts index used by a part, to pass
+    only them to the scraping processes.
+    @param index `dict()` made by `create_part_index()`.
+    @param part Part group.
+    @return `dict()` with the entries of `index` for the part.
+    '''
+    entries = {}
+    for key, value in part.fields.items():
+        if key.endswith(SEPRTR+'cat#'):
+            key = key[:-len('cat#')] + value
+            if key in index:
+                entries[key] = index[key]
+    return entries
+
+
+def index_to_html(index):
+    '''@brief Render the local parts index as an HTML page, as it was given to
+    the scraping before the index (e.g. to show it in the debug output).
+    @param index `dict()` made by `create_part_index()`.
+    @return `str()` of the HTML page.
+    '''
+    doc, tag, text = Doc().tagtext()
+    with tag('html'):
+        with tag('body'):
+            for key, part in index.items():
+                with tag('div', klass=key):
+                    for field in ('cat#', 'pricing', 'link'):
+                        if field in part:
+                            with tag('div', klass=field):
+                                text(part[field])
+    return doc.getvalue()
+
+
+def create_part_html(parts, distributors):
+    '''@brief Create HTML page containing info for local (non-webscraped) parts.
+    @param parts `list()` of parts.
+    @parm `list()`of the distributors to check each one is local.
+    @return `str()` of the HTML page.
+    '''
+    return index_to_html(create_part_index(parts, distributors))
 
 
 def get_price_tiers(html_tree):
-    '''@brief Get the pricing tiers from the parsed tree of the local product page.
-       @param html_tree `str()` html of the distributor part page.
+    '''@brief Get the pricing tiers of the local part.
+       @param html_tree `LocalPart` data of the part.
        @return `dict()` price breaks, the keys are the quantities breaks.
     '''
     price_tiers = {}
-    try:
-        pricing = html_tree.find('div', class_='pricing').text
-        pricing = re.sub('[^0-9.;:]', '', pricing) # Keep only digits, decimals, delimiters.
-        for qty_price in pricing.split(';'):
-            qty, price = qty_price.split(SEPRTR)
-            price_tiers[int(qty)] = float(price)
-    except AttributeError:
-        # This happens when no pricing info is found in the tree.
+    pricing = html_tree.get('pricing') if isinstance(html_tree, LocalPart) else None
+    if pricing is None:
+        # This happens when no pricing info is found for the part.
         logger.log(DEBUG_OBSESSIVE, 'No local pricing information found!')
         return price_tiers  # Return empty price tiers.
+    pricing = NON_PRICING_RE.sub('', pricing) # Keep only digits, decimals, delimiters.
+    for qty_price in pricing.split(';'):
+        try:
+            qty, price = qty_price.split(SEPRTR)
+            price_tiers[int(qty)] = float(price)
+        except ValueError:
+            logger.log(DEBUG_OBSESSIVE, 'Bad local price break "{}"!'.format(qty_price))
     return price_tiers
 
 
 def get_part_num(html_tree):
-    '''@brief Get the part number from the local product page.
-       @param html_tree `str()` html of the distributor part page.
+    '''@brief Get the part number of the local part.
+       @param html_tree `LocalPart` data of the part.
        @return `list()`of the parts that match.
     '''
-    try:
-        part_num_str = html_tree.find('div', class_='cat#').text
-        return part_num_str
-    except AttributeError:
-        return ''
+    if isinstance(html_tree, LocalPart):
+        return html_tree['cat#']
+    return ''
 
 
 def get_qty_avail(html_tree):
-    '''@brief Get the available quantity of the part from the local product page.
-       @param html_tree `str()` html of the distributor part page.
+    '''@brief Get the available quantity of the local part.
+       @param html_tree `LocalPart` data of the part.
        @return `int` avaliable quantity.
     '''
-    try:
-        qty_str = html_tree.find('div', class_='quantity').text
-    except (AttributeError, ValueError):
-        # Return 0 (not None) so this part will show in the spreadsheet
-        # even if there is no quantity found.
-        return 0
-    try:
-        return int(re.sub('[^0-9]', '', qty_str))
-    except ValueError:
-        # Return 0 (not None) so this part will show in the spreadsheet
-        # even if there is no quantity found.
-        logger.log(DEBUG_OBSESSIVE, 'No local part quantity found!')
-        return 0
+    # Return 0 (not None) so this part will show in the spreadsheet
+    # even if there is no quantity found.
+    return 0
 
 
 def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=None, local_part_html=None, scrape_retries=2):
-    '''Extract the HTML tree from the HTML page for local parts.
+    '''Get the data of a local part from the index of local parts.
        @param dist
        @param pn Part number `str()`.
        @param extra_search_terms
        @param url
        @param descend
-       @param local_part_html
+       @param local_part_html `dict()` index of the local parts, see `create_part_index()`.
        @param scrape_retries `int` Quantity of retries in case of fail.
-       @return (html `str()` of the page, `None`) The second argument is always `None` bacause there is not url to return.
+       @return (`LocalPart`, url `str()` or `None` if the part has no link).
     '''
-
-    # Extract the HTML tree from the local part HTML page.
     try:
-        tree = BeautifulSoup(local_part_html, 'lxml')
-    except Exception:
-        raise PartHtmlError
-
-    try:
-        # Find the DIV in the tree for the given part and distributor.
-        class_ = dist + SEPRTR + pn
-        part_tree = tree.find('div', class_=class_)
-        url_tree = part_tree.find('div', class_='link')
-        try:
-            # Return the part data tree and any URL associated with the part.
-            return part_tree, url_tree.text.strip()
-        except AttributeError:
-            # Return part data tree and None if the URL is not found.
-            return part_tree, None
-    except AttributeError:
-        # Return an error if the part_tree is not found.
+        part = local_part_html[dist + SEPRTR + pn]
+    except (KeyError, TypeError):
+        # Return an error if the part is not found.
         raise PartHtmlError
+    return part, part.get('link')
@@ -34,60 +34,41 @@ standard_library.install_aliases()
 
 import future
 
-import re
 import difflib
-from bs4 import BeautifulSoup
 import http.client # For web scraping exceptions.
 from .. import urlquote, urlsplit, urlunsplit, urlopen, Request
 from .. import WEB_SCRAPE_EXCEPTIONS
 from .. import FakeBrowser
+from ..web_fetch import fetch_page
+from ..html_strainer import PageStrainer, pn_in_page
+from ..page_extractor import PageExtractor, Field, Table
 from ...globals import PartHtmlError
 from ...globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
 
+# Elements of the product and search pages used to scrape the part data.
+PAGE_STRAINER = PageStrainer(
+    keep=['div.pdp-pricing-table', 'div.PriceBreaks', 'span#spnMouserPartNumFormattedForProdInfo',
+          'div.pdp-product-availability', 'table.SearchResultsTable'],
+    mark=['div#pdpPricingAvailability', 'div#searchResultsTbl'])
+
+# Part data in the product page.
+EXTRACTOR = PageExtractor(
+    part_num=Field('span#spnMouserPartNumFormattedForProdInfo'),
+    qty_avail=Field('div.pdp-product-availability div.row div.col-xs-8 div', 'leading_int'),
+    # In case of "quote price" the row is ignored (check pn STM32F411RCT6).
+    price_tiers=Table('div.col-xs-4:nth-of-type(1)', 'div.col-xs-4:nth-of-type(2)',
+                      rows='div.pdp-pricing-table div.div-table-row div.row',
+                      key_clean='int', value_clean='price'))
+
 
 def get_price_tiers(html_tree):
     '''@brief Get the pricing tiers from the parsed tree of the Mouser product page.
        @param html_tree `str()` html of the distributor part page.
        @return `dict()` price breaks, the keys are the quantities breaks.
     '''
-    price_tiers = {}
-    try:
-        pricing_tbl_tree = html_tree.find('div', class_='pdp-pricing-table')
-        price_row_trees = pricing_tbl_tree.find_all('div', class_='div-table-row')
-        for row_tree in price_row_trees:
-            qty_tree, unit_price_tree, _ = row_tree.find('div', class_='row').find_all('div', class_='col-xs-4')
-            try:
-                qty = int(re.sub('[^0-9]', '', qty_tree.text))
-                unit_price = float(re.sub('[^0-9.]', '', unit_price_tree.text))
-                price_tiers[qty] = unit_price
-            except ValueError:
-                pass # In case of "quote price", ignore and pass to next (check pn STM32F411RCT6).
-        return price_tiers
-
-        qty_strs = []
-        for qty in html_tree.find('div',
-                                  class_='PriceBreaks').find_all(
-                                      'div',
-                                      class_='PriceBreakQuantity'):
-            qty_strs.append(qty.text)
-        price_strs = []
-        for price in html_tree.find('div',
-                                    class_='PriceBreaks').find_all(
-                                        'div',
-                                        class_='PriceBreakPrice'):
-            price_strs.append(price.text)
-        qtys_prices = list(zip(qty_strs, price_strs))
-        for qty_str, price_str in qtys_prices:
-            try:
-                qty = re.search('(\s*)([0-9,]+)', qty_str).group(2)
-                qty = int(re.sub('[^0-9]', '', qty))
-                price_tiers[qty] = float(re.sub('[^0-9\.]', '', price_str))
-            except (TypeError, AttributeError, ValueError, IndexError):
-                continue
-    except AttributeError:
-        # This happens when no pricing info is found in the tree.
+    price_tiers = dict(EXTRACTOR.get('price_tiers', html_tree))
+    if not price_tiers:
         logger.log(DEBUG_OBSESSIVE, 'No Mouser pricing information found!')
-        return price_tiers  # Return empty price tiers.
     return price_tiers
 
 
@@ -96,14 +77,11 @@ def get_part_num(html_tree):
        @param html_tree `str()` html of the distributor part page.
        @return `list()`of the parts that match.
     '''
-    try:
-        partnum = html_tree.find(
-                        'span', id='spnMouserPartNumFormattedForProdInfo'
-                        ).text
-        return partnum.strip()
-    except AttributeError:
+    part_num = EXTRACTOR.get('part_num', html_tree)
+    if part_num is None:
         logger.log(DEBUG_OBSESSIVE, 'No Mouser part number found!')
         return ''
+    return part_num
 
 
 def get_qty_avail(html_tree):
@@ -111,24 +89,12 @@ def get_qty_avail(html_tree):
        @param html_tree `str()` html of the distributor part page.
        @return `int` avaliable quantity.
     '''
-    try:
-        qty_str = html_tree.find(
-                                'div', class_='pdp-product-availability').find(
-                                'div', class_='row').find(
-                                'div', class_='col-xs-8').find('div').text
-    except AttributeError as e:
-        # No quantity found (not even 0) so this is probably a non-stocked part.
-        # Return None so the part won't show in the spreadsheet for this dist.
-        logger.log(DEBUG_OBSESSIVE, 'No Mouser part quantity found!')
-        return None
-    try:
-        qty_str = re.search('(\s*)([0-9,]*)', qty_str, re.IGNORECASE).group(2)
-        return int(re.sub('[^0-9]', '', qty_str))
-    except ValueError:
+    qty = EXTRACTOR.get('qty_avail', html_tree)
+    if qty is None:
         # No quantity found (not even 0) so this is probably a non-stocked part.
         # Return None so the part won't show in the spreadsheet for this dist.
         logger.log(DEBUG_OBSESSIVE, 'No Mouser part quantity found!')
-        return None
+    return qty
 
 
 def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, local_part_html=None, scrape_retries=2):
@@ -156,26 +122,19 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
     # Open the URL, read the HTML from it, and parse it into a tree structure.
     req = FakeBrowser(url)
     req.add_header('Cookie', 'preferences=ps=www2&pl=en-US&pc_www2=USDe')
-    for _ in range(scrape_retries):
-        try:
-            response = urlopen(req)
-            html = response.read()
-            break
-        except WEB_SCRAPE_EXCEPTIONS:
-            logger.log(DEBUG_DETAILED,'Exception while web-scraping {} from {}'.format(pn, dist))
-            pass
-    else: # Couldn't get a good read from the website.
+    html = fetch_page(dist, req, scrape_retries=scrape_retries)
+    if html is None: # Couldn't get a good read from the website.
         logger.log(DEBUG_OBSESSIVE,'No HTML page for {} from {}'.format(pn, dist))
         raise PartHtmlError
 
     # Abort if the part number isn't in the HTML somewhere.
     # (Only use the numbers and letters to compare PN to HTML.)
-    if re.sub('[\W_]','',str.lower(pn)) not in re.sub('[\W_]','',str.lower(str(html))):
+    if not pn_in_page(pn, html):
         logger.log(DEBUG_OBSESSIVE,'No part number {} in HTML page from {}'.format(pn, dist))
         raise PartHtmlError
     
     try:
-        tree = BeautifulSoup(html, 'lxml')
+        tree = PAGE_STRAINER.parse(html)
     except Exception:
         logger.log(DEBUG_OBSESSIVE,'No HTML tree for {} from {}'.format(pn, dist))
         raise PartHtmlError
@@ -0,0 +1,258 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from builtins import str
+from future import standard_library
+standard_library.install_aliases()
+
+import re
+from bs4.element import Tag
+
+from .html_strainer import parse_css
+
+__all__ = ['PageExtractor', 'Field', 'Table', 'Selector', 'CLEANERS']
+
+NON_DIGITS_RE = re.compile('[^0-9]')
+NON_PRICE_RE = re.compile('[^0-9.]')
+SPACES_RE = re.compile(r'\s')
+LEADING_NUMBER_RE = re.compile(r'\s*([0-9,]*)')
+NUMBER_RE = re.compile('[0-9,]+')
+
+
+def clean_int(text):
+    '''@brief All the digits of the text, e.g. '1.500 available' -> 1500.'''
+    return int(NON_DIGITS_RE.sub('', text))
+
+
+def clean_leading_int(text):
+    '''@brief The number at the start of the text, e.g. '1,234 In Stock' -> 1234.'''
+    return int(NON_DIGITS_RE.sub('', LEADING_NUMBER_RE.match(text).group(1)))
+
+
+def clean_first_int(text):
+    '''@brief The first number of the text, e.g. 'From 1,000 pcs' -> 1000.'''
+    return int(NON_DIGITS_RE.sub('', NUMBER_RE.search(text).group(0)))
+
+
+def clean_price(text):
+    '''@brief A price with decimal point, e.g. '$1.25' -> 1.25.'''
+    return float(NON_PRICE_RE.sub('', text))
+
+
+def clean_price_comma(text):
+    '''@brief A price with decimal comma, e.g. '1,25 €' -> 1.25.'''
+    return float(NON_PRICE_RE.sub('', text.replace(',', '.')))
+
+
+# Rules to convert the text of the page elements to values, by name.
+CLEANERS = {
+    'text': lambda text: text.strip(),
+    'nospace': lambda text: SPACES_RE.sub('', text),
+    'int': clean_int,
+    'leading_int': clean_leading_int,
+    'first_int': clean_first_int,
+    'price': clean_price,
+    'price_comma': clean_price_comma,
+}
+
+
+class Selector(object):
+    '''@brief CSS selector (see `parse_css()`) compiled to find `BeautifulSoup` tags.
+
+    The tags are checked from the inner element to the outer ones, as the web
+    browsers do, in a single pass over the tree, so the tags found keep the
+    document order even for lists of selectors. The `BeautifulSoup` search
+    functions aren't used, they prepare their filters again on each call.'''
+
+    def __init__(self, css):
+        '''@param css `str()` selector.'''
+        self.css = css
+        self.alternatives = parse_css(css)
+        # Tag names of the elements selected, to check only those tags.
+        names = [elements[-1][0] for elements in self.alternatives]
+        self.names = None if None in names else frozenset(names)
+
+    @staticmethod
+    def match_element(tag, element):
+        name, tests = element
+        if name is not None and tag.name != name:
+            return False
+        for kind, key, value in tests:
+            if kind == 'class':
+                classes = tag.get('class') or ()
+                if key not in (classes.split() if isinstance(classes, str) else classes):
+                    return False
+            elif kind == 'id':
+                if tag.get('id') != key:
+                    return False
+            elif kind == 'noattr':
+                if tag.get(key) is not None:
+                    return False
+            elif kind == 'nth':
+                n = 1
+                for sibling in tag.previous_siblings:
+                    if isinstance(sibling, Tag) and sibling.name == tag.name:
+                        n += 1
+                        if n > key:
+                            return False
+                if n != key:
+                    return False
+            else:
+                attr = tag.get(key)
+                if attr is None:
+                    return False
+                if value is not None and (' '.join(attr) if isinstance(attr, list) else attr) != value:
+                    return False
+        return True
+
+    def matches(self, tag):
+        '''@brief Check if a tag is selected.'''
+        for elements in self.alternatives:
+            if not self.match_element(tag, elements[-1]):
+                continue
+            node = tag.parent
+            for element in reversed(elements[:-1]):
+                while node is not None and not self.match_element(node, element):
+                    node = node.parent
+                if node is None:
+                    break
+                node = node.parent
+            else:
+                return True
+        return False
+
+    def iter_select(self, tree):
+        '''@brief Iterate over the tags selected inside `tree`.'''
+        names = self.names
+        for tag in tree.descendants:
+            if isinstance(tag, Tag) and (names is None or tag.name in names) and self.matches(tag):
+                yield tag
+
+    def select(self, tree):
+        '''@return `list()` of the tags selected inside `tree`.'''
+        return list(self.iter_select(tree))
+
+    def select_one(self, tree):
+        '''@return first tag selected inside `tree` or `None`.'''
+        return next(self.iter_select(tree), None)
+
+
+class Field(object):
+    '''@brief A value of the page, taken from the first element selected.'''
+
+    def __init__(self, selector, clean='text', attr=None):
+        '''@param selector `str()` CSS selector of the element.
+        @param clean Name of a rule of `CLEANERS` or function to convert the text to the value.
+        @param attr `str()` attribute with the value instead of the element text.'''
+        self.selector = Selector(selector)
+        self.clean = CLEANERS[clean] if isinstance(clean, str) else clean
+        self.attr = attr
+
+    def extract(self, tree):
+        '''@return The value, `None` if the element isn't in the page.
+        @raise ValueError if the element text can't be converted.'''
+        tag = self.selector.select_one(tree)
+        if tag is None:
+            return None
+        text = tag.text if self.attr is None else tag.get(self.attr)
+        if text is None:
+            return None
+        try:
+            return self.clean(text)
+        except (ValueError, TypeError, AttributeError, IndexError) as e:
+            raise ValueError('Bad value "{}" for "{}": {}'.format(text, self.selector.css, e))
+
+
+class Table(object):
+    '''@brief Pairs of key and value of the page, e.g. the price breaks or the
+    attributes of the part. Each pair is taken from a row element or, without
+    rows, the keys and values selected in the page are paired in order.
+    The pairs that can't be converted are skipped.'''
+
+    def __init__(self, key, value, rows=None, key_clean='text', value_clean='text'):
+        '''@param key `str()` CSS selector of the keys (inside each row, if given).
+        @param value `str()` CSS selector of the values (inside each row, if given).
+        @param rows `str()` CSS selector of the rows or `None`.
+        @param key_clean Rule (see `Field`) to convert the keys.
+        @param value_clean Rule to convert the values.'''
+        self.key = Field(key, key_clean)
+        self.value = Field(value, value_clean)
+        self.rows = None if rows is None else Selector(rows)
+
+    def extract(self, tree):
+        '''@return `list()` of (key, value).'''
+        if self.rows is not None:
+            cells = [(self.key.selector.select_one(row), self.value.selector.select_one(row))
+                     for row in self.rows.select(tree)]
+        else:
+            cells = zip(self.key.selector.select(tree), self.value.selector.select(tree))
+        pairs = []
+        for key, value in cells:
+            if key is None or value is None:
+                continue
+            try:
+                pairs.append((self.key.clean(key.text), self.value.clean(value.text)))
+            except (ValueError, TypeError, AttributeError, IndexError):
+                continue
+        return pairs
+
+
+class PageExtractor(object):
+    '''@brief Declarative description of the data in a distributor page.
+
+    Each distributor module describes where the part data is in its pages
+    (selectors) and how to read it (cleaning rules) with named `Field`s and
+    `Table`s. They are compiled once, when the module is imported, and then
+    used with the tree of each page (see `PageStrainer`).
+
+        EXTRACTOR = PageExtractor(
+            part_num=Field('td#reportPartNumber', 'nospace'),
+            price_tiers=Table('td:nth-of-type(1)', 'td:nth-of-type(2)',
+                              rows='table#product-dollars tr', key_clean='int', value_clean='price'))
+        price_tiers = dict(EXTRACTOR.get('price_tiers', html_tree))
+    '''
+
+    def __init__(self, **specs):
+        '''@param specs `Field` or `Table` of each name.'''
+        self.specs = specs
+
+    def extract(self, name, tree):
+        '''@brief Extract a value from a page.
+        @param name `str()` name of the value.
+        @param tree `BeautifulSoup` tree of the page.
+        @return The value (`list()` of pairs for a `Table`), `None` if not in the page.
+        @raise ValueError if the value can't be converted.'''
+        return self.specs[name].extract(tree)
+
+    def get(self, name, tree, default=None):
+        '''@brief Extract a value from a page, `default` if it isn't there or can't be converted.'''
+        try:
+            value = self.extract(name, tree)
+        except ValueError:
+            return default
+        return default if value is None else value
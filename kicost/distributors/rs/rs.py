@@ -32,76 +32,57 @@ standard_library.install_aliases()
 import future
 
 import re, difflib
-from bs4 import BeautifulSoup
 import http.client # For web scraping exceptions.
 from .. import urlquote, urlsplit, urlunsplit, urlopen, Request
 from .. import WEB_SCRAPE_EXCEPTIONS
 from .. import FakeBrowser
+from ..web_fetch import fetch_page
+from ..html_strainer import PageStrainer, pn_in_page
+from ..page_extractor import PageExtractor, Field, Table, clean_int
 from ...globals import PartHtmlError
 from ...globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
 from currency_converter import CurrencyConverter
 currency = CurrencyConverter()
 
+# Elements of the product and search pages used to scrape the part data.
+PAGE_STRAINER = PageStrainer(
+    keep=['div.table-row.value-row', 'span.keyValue', 'span.stock-msg-content', 'span.table-cell',
+          'table#results-table'],
+    mark=['div.advLineLevelContainer', 'div.resultsTable', 'div.results-table-container'])
+
+NOT_CATALOG_RE = re.compile(r'[^0-9\-]')
+
+# Part data in the product page.
+EXTRACTOR = PageExtractor(
+    part_num=Field('span.keyValue', lambda text: NOT_CATALOG_RE.sub('', text)),
+    qty_avail=Field('span.stock-msg-content, span.table-cell', lambda text: clean_int(text[0:10])),
+    price_tiers=Table('div.breakRangeWithoutUnit.col-xs-4', 'div.unitPrice.col-xs-4',
+                      rows='div.table-row.value-row', key_clean='first_int', value_clean='price_comma'))
+
 
 def get_price_tiers(html_tree):
     '''@brief Get the pricing tiers from the parsed tree of the RS Components product page.
        @param html_tree `str()` html of the distributor part page.
        @return `dict()` price breaks, the keys are the quantities breaks.
     '''
-    price_tiers = {}
-    
-    try:
-        for row in html_tree.find_all('div', class_='table-row value-row'):
-            qty = row.find('div',
-                        class_='breakRangeWithoutUnit col-xs-4').text
-            price = row.find('div',
-                        class_='unitPrice col-xs-4').text
-            try:
-                qty = int( re.findall('\s*([0-9\,]+)', qty)[0] )
-                price = re.sub('[^0-9\.]', '', price.replace(',','.') )
-                price = currency.convert(float(price), 'EUR', 'USD')
-                price_tiers[qty] = price
-            except (TypeError, AttributeError, ValueError):
-                continue
-    except AttributeError:
-        # This happens when no pricing info is found in the tree.
-        return price_tiers  # Return empty price tiers.
-    return price_tiers
+    return {qty: currency.convert(price, 'EUR', 'USD')
+            for qty, price in EXTRACTOR.get('price_tiers', html_tree)}
     
 def get_part_num(html_tree):
     '''@brief Get the part number from the RS product page.
        @param html_tree `str()` html of the distributor part page.
        @return `dict()` price breaks, the keys are the quantities breaks.
     '''
-    try:
-        pn_str = html_tree.find('span', class_='keyValue').text
-        pn = re.sub('[^0-9\-]','', pn_str)
-        return pn
-    except KeyError:
-        return '' # No catalog number found in page.
-    except AttributeError:
-        return '' # No ProductDescription found in page.
+    return EXTRACTOR.get('part_num', html_tree, default='')
 
 def get_qty_avail(html_tree):
     '''Get the available quantity of the part from the RS product page.
        @param html_tree `str()` html of the distributor part page.
        @return `int` avaliable quantity.
     '''
-        
-    try:
-        # Note that 'availability' is misspelled in the container class name!        
-        qty_str = html_tree.find('span', class_=('stock-msg-content', 'table-cell')).text
-    except (AttributeError, ValueError):
-        # No quantity found (not even 0) so this is probably a non-stocked part.
-        # Return None so the part won't show in the spreadsheet for this dist.
-        return None
-    try:
-        qty = re.sub('[^0-9]','',qty_str[0:10])  # Strip all non-number chars.
-        return int(qty)  # Return integer for quantity.
-    except ValueError:
-        # No quantity found (not even 0) so this is probably a non-stocked part.
-        # Return None so the part won't show in the spreadsheet for this dist.
-        return None
+    # `None` if no quantity found (not even 0), so this is probably a non-stocked
+    # part and it won't show in the spreadsheet for this dist.
+    return EXTRACTOR.get('qty_avail', html_tree)
 
 def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, local_part_html=None, scrape_retries=2):
     '''@brief Find the RS Components HTML page for a part number and return the URL and parse tree.
@@ -125,30 +106,22 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
         url = 'http://it.rs-online.com/Search/' + url
 
     # Open the URL, read the HTML from it, and parse it into a tree structure.
-    for _ in range(scrape_retries):
-        try:
-            req = FakeBrowser(url)
-            response = urlopen(req)
-            html = response.read()
-            break
-        except WEB_SCRAPE_EXCEPTIONS:
-            logger.log(DEBUG_DETAILED,'Exception while web-scraping {} from {}'.format(pn, dist))
-            pass
-    else: # Couldn't get a good read from the website.
+    html = fetch_page(dist, FakeBrowser(url), scrape_retries=scrape_retries)
+    if html is None: # Couldn't get a good read from the website.
         logger.log(DEBUG_OBSESSIVE,'No HTML page for {} from {}'.format(pn, dist))
         raise PartHtmlError
 
-    try:
-        tree = BeautifulSoup(html, 'lxml')
-    except Exception:
-        logger.log(DEBUG_OBSESSIVE,'No HTML tree for {} from {}'.format(pn, dist))
-        raise PartHtmlError
-
     # Abort if the part number isn't in the HTML somewhere.
     # (Only use the numbers and letters to compare PN to HTML.)
-    if re.sub('[\W_]','',str.lower(pn)) not in re.sub('[\W_]','',str.lower(str(html))):
+    if not pn_in_page(pn, html):
         logger.log(DEBUG_OBSESSIVE,'No part number {} in HTML page from {}'.format(pn, dist))
         raise PartHtmlError
+
+    try:
+        tree = PAGE_STRAINER.parse(html)
+    except Exception:
+        logger.log(DEBUG_OBSESSIVE,'No HTML tree for {} from {}'.format(pn, dist))
+        raise PartHtmlError
         
     # If the tree contains the tag for a product page, then just return it.
     if tree.find('div', class_='advLineLevelContainer'):
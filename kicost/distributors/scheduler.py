@@ -0,0 +1,181 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from builtins import range
+from future import standard_library
+from future.utils import raise_
+standard_library.install_aliases()
+
+import sys
+import threading
+from collections import deque
+from time import time
+
+from .web_fetch import fetch_config
+from .web_routines import scrape_dist, get_scrape_logger
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['TaskScheduler', 'scrape_parts_threaded', 'MAX_PER_HOST']
+
+MAX_PER_HOST = 4 # Default maximum simultaneous accesses to the same distributor website.
+
+
+class TaskScheduler(object):
+    '''@brief Scheduler of the (part, distributor) scraping tasks among threads.
+
+    Each distributor has its own queue of parts. A free worker takes a task of
+    the distributor with more estimated remaining work (queue length times its
+    mean task time) that has an access slot available (throttling) and less
+    than `max_per_host` tasks running, so the slowest distributor is kept busy
+    from the start and a slow or rate-limited distributor can't take all the
+    workers. The data of a part is reassembled when all its distributors are done.'''
+
+    def __init__(self, parts, distributor_dict, local_part_html, scrape_retries,
+                 max_per_host, callback=None, log_level=None):
+        '''@param parts `list()` of part groups.
+        @param distributor_dict `dict()` of the distributors to scrape.
+        @param local_part_html `dict()` index of the local distributors data (see `create_part_index()`).
+        @param scrape_retries `int()` Number of scrape retries.
+        @param max_per_host `int()` Maximum simultaneous tasks of each distributor.
+        @param callback Function called with the `scrape_part()` like result of each part.
+        @param log_level Logging level.'''
+        self.parts = parts
+        self.distributor_dict = distributor_dict
+        self.local_part_html = local_part_html
+        self.scrape_retries = scrape_retries
+        self.max_per_host = max(int(max_per_host), 1)
+        self.callback = callback
+        self.scrape_logger = get_scrape_logger(log_level)
+        self.dists = list(distributor_dict.keys())
+        self.queues = {d: deque(range(len(parts))) for d in self.dists}
+        self.active = {d: 0 for d in self.dists}
+        self.mean_time = {d: 0.0 for d in self.dists} # Seconds (0 if unknown), updated as the tasks finish.
+        self.part_data = [{} for _ in parts]
+        self.results = []
+        self.error = None
+        self.condition = threading.Condition()
+        self.callback_lock = threading.Lock()
+
+    def next_task(self):
+        '''@brief Wait for the next task to run.
+        @return (`str()` distributor, `int()` part index) or `None` when there are no more tasks.'''
+        throttle = fetch_config['throttle']
+        with self.condition:
+            while self.error is None:
+                now = time()
+                best = None
+                wake = None # Time when a throttled distributor can be accessed.
+                for d in self.dists:
+                    if not self.queues[d] or self.active[d] >= self.max_per_host:
+                        continue
+                    slot = throttle.next_slot(d) if throttle is not None else 0.0
+                    if slot > now:
+                        wake = slot if wake is None else min(wake, slot)
+                        continue
+                    work = len(self.queues[d]) * (self.mean_time[d] or 1.0)
+                    if best is None or work > best[0]:
+                        best = (work, d)
+                if best is not None:
+                    d = best[1]
+                    self.active[d] += 1
+                    return d, self.queues[d].popleft()
+                if not any(self.queues.values()):
+                    return None
+                # Wait for a task to finish or a distributor slot.
+                self.condition.wait(None if wake is None else wake - now)
+            return None
+
+    def task_done(self, d, i, data, elapsed):
+        '''@brief Store the data of a finished task and free its distributor.
+        @return The result of the part if all its distributors are done, else `None`.'''
+        result = None
+        with self.condition:
+            self.active[d] -= 1
+            self.mean_time[d] = 0.8 * self.mean_time[d] + 0.2 * elapsed if self.mean_time[d] else elapsed
+            self.part_data[i][d] = data
+            if len(self.part_data[i]) == len(self.dists):
+                url, part_num, price_tiers, qty_avail, info_dist = {}, {}, {}, {}, {}
+                for dist, dist_data in self.part_data[i].items():
+                    url[dist], part_num[dist], price_tiers[dist], qty_avail[dist], info_dist[dist] = dist_data
+                result = (i, url, part_num, price_tiers, qty_avail, info_dist)
+                self.part_data[i] = None
+                self.results.append(result)
+            self.condition.notify_all()
+        return result
+
+    def worker(self):
+        '''@brief Run tasks until there are no more.'''
+        while True:
+            task = self.next_task()
+            if task is None:
+                return
+            d, i = task
+            start = time()
+            try:
+                data = scrape_dist(self.parts[i], d, self.distributor_dict, self.local_part_html,
+                                   self.scrape_retries, self.scrape_logger)
+                result = self.task_done(d, i, data, time() - start)
+                # The callback runs without blocking the other workers,
+                # one part at a time.
+                if result is not None and self.callback is not None:
+                    with self.callback_lock:
+                        self.callback(result)
+            except Exception:
+                with self.condition:
+                    if self.error is None:
+                        self.error = sys.exc_info()
+                    self.condition.notify_all()
+                return
+
+    def run(self, num_workers):
+        '''@brief Scrape all the tasks with `num_workers` threads.
+        @return `list()` of the part results, in the order they were completed.'''
+        num_workers = max(1, min(num_workers, self.max_per_host * len(self.dists)))
+        logger.log(DEBUG_OVERVIEW, 'Starting {} threads with {} accesses per distributor...'.format(
+                        num_workers, self.max_per_host))
+        threads = [threading.Thread(target=self.worker) for _ in range(num_workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+        if self.error is not None:
+            raise_(*self.error)
+        logger.log(DEBUG_DETAILED, 'Mean time of the tasks: {}'.format(
+                        ', '.join('{} {:.2f}s'.format(d, self.mean_time[d]) for d in self.dists)))
+        return self.results
+
+
+def scrape_parts_threaded(parts, distributor_dict, local_part_html, scrape_retries,
+                          num_workers, max_per_host, callback=None, log_level=None):
+    '''@brief Scrape the data of all the parts with a pool of threads running
+    one task for each part and distributor.
+    @param num_workers `int()` Number of threads.
+    @return `list()` of the `scrape_part()` like results, see `TaskScheduler`.'''
+    scheduler = TaskScheduler(parts, distributor_dict, local_part_html, scrape_retries,
+                              max_per_host, callback, log_level)
+    return scheduler.run(num_workers)
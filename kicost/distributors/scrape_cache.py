@@ -0,0 +1,359 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import os
+import json
+import math
+import struct
+import hashlib
+import sqlite3
+import threading
+from time import time
+
+from . import distributor_dict
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['site_key', 'QuoteCache', 'MissCache', 'UrlCache', 'BloomFilter', 'RateStore', 'QUOTE_FIELDS', 'QUOTE_TTL', 'MISS_TTL']
+
+# Part data returned by `scrape_part()` for each distributor.
+QUOTE_FIELDS = ['part_num', 'price_tiers', 'qty_avail', 'url', 'info_dist']
+
+# Default time (in hours) that each field of a cached quote is considered fresh.
+QUOTE_TTL = {
+    'part_num': 24 * 30,
+    'price_tiers': 24,
+    'qty_avail': 1,
+    'url': 24 * 30,
+    'info_dist': 24 * 30,
+}
+
+MISS_TTL = 24 * 7 # Default time (in hours) that a part not found at a distributor is not searched again.
+
+
+def site_key(dist):
+    '''@brief Key of a distributor in the caches, with the locale and currency of
+    its site (as the page cache keys), because the prices and the pages found
+    depend on them.
+    @param dist `str()` distributor name.
+    @return `str()` the name of the distributor, followed by its locale and currency.'''
+    site = distributor_dict.get(dist, {}).get('site') or {}
+    if not site.get('locale') and not site.get('currency'):
+        return dist
+    return '{}@{}-{}'.format(dist, site.get('locale', ''), site.get('currency', ''))
+
+
+class SqliteStore(object):
+    '''@brief Base of the caches kept in a SQLite database file.
+
+    The connection is opened on the first use by each process and thread, so
+    the object itself only holds the configuration and can be passed to the
+    scraping processes.'''
+
+    SCHEMA = '' # SQL used to create the tables, defined by the derived classes.
+
+    def __init__(self, path):
+        '''@param path `str()` database file name.'''
+        self.path = path
+        self._local = None
+        self._pid = None
+
+    def __getstate__(self):
+        # The thread local connections are not passed to other processes.
+        state = self.__dict__.copy()
+        state['_local'] = None
+        state['_pid'] = None
+        return state
+
+    def connection(self):
+        '''@brief Return the database connection of the current process/thread.'''
+        if self._local is None or self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            if not os.path.isdir(os.path.dirname(os.path.abspath(self.path))):
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)))
+            db = sqlite3.connect(self.path, timeout=30)
+            try:
+                db.execute('PRAGMA journal_mode=WAL') # Concurrent readers while scraping.
+            except sqlite3.DatabaseError:
+                pass
+            db.executescript(self.SCHEMA)
+            self._local.db = db
+        return db
+
+
+class QuoteCache(SqliteStore):
+    '''@brief Persistent cache of the part data scraped from each distributor.
+
+    The entries are keyed by distributor (with its locale and currency, see
+    `site_key()`) and the part number (manufacturer or distributor catalog
+    number) used in the search. Each field has its own
+    time-to-live, so the volatile data (stock) is scraped again more often
+    than the stable data (part number, extra information).'''
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS quotes (
+                    dist TEXT, pn TEXT, field TEXT, value TEXT, updated REAL,
+                    PRIMARY KEY (dist, pn, field));'''
+
+    def __init__(self, path, ttl=None, offline=False):
+        '''@param path `str()` database file name.
+        @param ttl `dict()` hours of freshness for the fields, overriding `QUOTE_TTL`.
+        @param offline `bool()` use the cached fields no matter their age.'''
+        super(QuoteCache, self).__init__(path)
+        self.ttl = dict(QUOTE_TTL)
+        self.ttl.update(ttl or {})
+        self.offline = offline
+
+    def get(self, dist, pn):
+        '''@brief Get the fresh fields of a cached quote.
+        @param dist `str()` distributor name.
+        @param pn `str()` part number.
+        @return (`dict()` with the fresh fields, `float()` maximum age in
+        seconds that a page must have to refresh the stale fields or `None` if all fresh).'''
+        now = time()
+        fields = {}
+        max_age = None
+        try:
+            rows = self.connection().execute(
+                'SELECT field, value, updated FROM quotes WHERE dist=? AND pn=?', (site_key(dist), pn)).fetchall()
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'Quote cache read error: {}'.format(e))
+            rows = []
+        for field, value, updated in rows:
+            if field in self.ttl and (self.offline or now - updated <= self.ttl[field] * 3600):
+                fields[field] = json.loads(value)
+        if 'price_tiers' in fields:
+            # JSON only has string keys, the price breaks are integers.
+            fields['price_tiers'] = {int(q): p for q, p in fields['price_tiers'].items()}
+        for field in QUOTE_FIELDS:
+            if field not in fields:
+                age = self.ttl[field] * 3600
+                max_age = age if max_age is None else min(max_age, age)
+        return fields, max_age
+
+    def put(self, dist, pn, fields):
+        '''@brief Store the scraped fields of a part.
+        @param dist `str()` distributor name.
+        @param pn `str()` part number.
+        @param fields `dict()` with the `QUOTE_FIELDS` values.'''
+        now = time()
+        dist = site_key(dist)
+        rows = [(dist, pn, f, json.dumps(fields[f]), now) for f in QUOTE_FIELDS if f in fields]
+        try:
+            db = self.connection()
+            with db:
+                db.executemany('INSERT OR REPLACE INTO quotes VALUES (?, ?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'Quote cache write error: {}'.format(e))
+
+
+class BloomFilter(object):
+    '''@brief Compact set that answers if a key may be in it (with a small
+    rate of false positives) or is surely not in it.'''
+
+    def __init__(self, capacity, error_rate=0.01):
+        '''@param capacity `int()` number of keys expected.
+        @param error_rate `float()` rate of false positives with `capacity` keys.'''
+        capacity = max(capacity, 100)
+        self.num_bits = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def positions(self, key):
+        '''@brief Bits of a key (double hashing of its SHA-1).'''
+        digest = hashlib.sha1(key.encode('utf-8')).digest()
+        h1, h2 = struct.unpack('<QQ', digest[:16])
+        h2 |= 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for p in self.positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(key))
+
+
+class MissCache(SqliteStore):
+    '''@brief Persistent cache of the parts not found at each distributor.
+
+    The entries are keyed by distributor (with its locale and currency, see
+    `site_key()`), part number and the extra search terms used. The known misses are loaded in a `BloomFilter` at the first
+    use in each process, so the parts found (most of them) are checked
+    without reading the database.'''
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS misses (
+                    dist TEXT, pn TEXT, terms TEXT, updated REAL,
+                    PRIMARY KEY (dist, pn, terms));'''
+
+    def __init__(self, path, ttl=MISS_TTL, offline=False):
+        '''@param path `str()` database file name.
+        @param ttl `float()` hours that a miss is remembered.
+        @param offline `bool()` use the misses no matter their age.'''
+        super(MissCache, self).__init__(path)
+        self.ttl = ttl * 3600
+        self.offline = offline
+        self._bloom = None
+
+    def __getstate__(self):
+        state = super(MissCache, self).__getstate__()
+        state['_bloom'] = None # Loaded again by each process.
+        return state
+
+    def min_updated(self):
+        return 0.0 if self.offline else time() - self.ttl
+
+    def bloom(self):
+        '''@brief `BloomFilter` with the current misses, loaded on the first use.'''
+        if self._bloom is None or self._pid != os.getpid():
+            try:
+                rows = self.connection().execute('SELECT dist, pn, terms FROM misses WHERE updated >= ?',
+                                                 (self.min_updated(),)).fetchall()
+            except sqlite3.Error as e:
+                logger.log(DEBUG_DETAILED, 'Miss cache read error: {}'.format(e))
+                rows = []
+            bloom = BloomFilter(2 * len(rows))
+            for row in rows:
+                bloom.add('\0'.join(row))
+            self._bloom = bloom
+        return self._bloom
+
+    def is_miss(self, dist, pn, terms):
+        '''@brief Check if a search was recently done without finding the part.
+        @param dist `str()` distributor name.
+        @param pn `str()` part number.
+        @param terms `str()` extra search terms.
+        @return `bool()`.'''
+        dist = site_key(dist)
+        if '\0'.join((dist, pn, terms)) not in self.bloom():
+            return False
+        try:
+            row = self.connection().execute(
+                'SELECT 1 FROM misses WHERE dist=? AND pn=? AND terms=? AND updated >= ?',
+                (dist, pn, terms, self.min_updated())).fetchone()
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'Miss cache read error: {}'.format(e))
+            return False
+        return row is not None
+
+    def put(self, dist, pn, terms):
+        '''@brief Remember a search that didn't find the part.'''
+        dist = site_key(dist)
+        try:
+            db = self.connection()
+            with db:
+                db.execute('INSERT OR REPLACE INTO misses VALUES (?, ?, ?, ?)', (dist, pn, terms, time()))
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'Miss cache write error: {}'.format(e))
+        self.bloom().add('\0'.join((dist, pn, terms)))
+
+
+class UrlCache(SqliteStore):
+    '''@brief Persistent cache of the product page URL found by each search.
+
+    The entries are keyed by distributor (and its site locale and currency),
+    part number and the extra search terms used, so the next lookups of the part go straight to its product
+    page, without the search (and the product table) requests, even when the
+    page itself must be read again.'''
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS urls (
+                    dist TEXT, pn TEXT, terms TEXT, url TEXT, updated REAL,
+                    PRIMARY KEY (dist, pn, terms));'''
+
+    def __init__(self, path, ttl=QUOTE_TTL['url'], offline=False):
+        '''@param path `str()` database file name.
+        @param ttl `float()` hours that a product page URL is used.
+        @param offline `bool()` use the URLs no matter their age.'''
+        super(UrlCache, self).__init__(path)
+        self.ttl = ttl * 3600
+        self.offline = offline
+
+    def get(self, dist, pn, terms):
+        '''@brief Get the product page found by a search.
+        @param dist `str()` distributor name.
+        @param pn `str()` part number.
+        @param terms `str()` extra search terms.
+        @return `str()` URL or `None` if not known.'''
+        try:
+            row = self.connection().execute(
+                'SELECT url FROM urls WHERE dist=? AND pn=? AND terms=? AND updated >= ?',
+                (site_key(dist), pn, terms, 0.0 if self.offline else time() - self.ttl)).fetchone()
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'URL cache read error: {}'.format(e))
+            return None
+        return row[0] if row is not None else None
+
+    def put(self, dist, pn, terms, url):
+        '''@brief Remember the product page found by a search.'''
+        try:
+            db = self.connection()
+            with db:
+                db.execute('INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)', (site_key(dist), pn, terms, url, time()))
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'URL cache write error: {}'.format(e))
+
+    def forget(self, dist, pn, terms):
+        '''@brief Forget a product page that doesn't have the part anymore.'''
+        try:
+            db = self.connection()
+            with db:
+                db.execute('DELETE FROM urls WHERE dist=? AND pn=? AND terms=?', (site_key(dist), pn, terms))
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'URL cache write error: {}'.format(e))
+
+
+class RateStore(SqliteStore):
+    '''@brief Delays between accesses to each distributor learned by the adaptive
+    throttling, so the next run starts with them.'''
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS rates (
+                    dist TEXT PRIMARY KEY, delay REAL, updated REAL);'''
+
+    def load(self):
+        '''@brief Get the learned delays.
+        @return `dict()` distributor name: seconds.'''
+        try:
+            return dict(self.connection().execute('SELECT dist, delay FROM rates').fetchall())
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'Rate store read error: {}'.format(e))
+            return {}
+
+    def save(self, delays):
+        '''@brief Store the learned delays.
+        @param delays `dict()` distributor name: seconds.'''
+        now = time()
+        try:
+            db = self.connection()
+            with db:
+                db.executemany('INSERT OR REPLACE INTO rates VALUES (?, ?, ?)',
+                               [(d, delay, now) for d, delay in delays.items()])
+        except sqlite3.Error as e:
+            logger.log(DEBUG_DETAILED, 'Rate store write error: {}'.format(e))
@@ -0,0 +1,100 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+from future.utils import raise_
+standard_library.install_aliases()
+
+import sys
+import threading
+from collections import OrderedDict
+
+__all__ = ['SingleFlight']
+
+
+class SingleFlight(object):
+    '''@brief Run each call (identified by a key) once per scraping run.
+
+    The threads asking for a key that is being computed wait for it and get
+    the same result, the later ones get the remembered result. Errors are
+    passed to the threads waiting, but not remembered.
+    Each process has its own calls, so the object can be passed to the
+    scraping processes (it is copied empty).'''
+
+    def __init__(self, max_size=None):
+        '''@param max_size `int()` maximum number of results remembered
+        (the least recently used are forgotten), `None` for no limit.'''
+        self.max_size = max_size
+        self._reset()
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.results = OrderedDict()
+        self.running = {} # Key: [`threading.Event`, result, exception info].
+        self.hits = 0
+
+    def __getstate__(self):
+        return {'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.max_size = state['max_size']
+        self._reset()
+
+    def do(self, key, func, *args, **kwargs):
+        '''@brief Return `func(*args, **kwargs)`, computed once for each `key`.
+        @return (result, `bool()` True if the result was computed by another call).'''
+        with self.lock:
+            if key in self.results:
+                self.results[key] = result = self.results.pop(key) # Most recently used.
+                self.hits += 1
+                return result, True
+            call = self.running.get(key)
+            owner = call is None
+            if owner:
+                call = self.running[key] = [threading.Event(), None, None]
+        if not owner:
+            call[0].wait()
+            if call[2] is not None:
+                raise_(*call[2])
+            with self.lock:
+                self.hits += 1
+            return call[1], True
+        try:
+            call[1] = func(*args, **kwargs)
+        except Exception:
+            call[2] = sys.exc_info()
+        with self.lock:
+            del self.running[key]
+            if call[2] is None:
+                self.results[key] = call[1]
+                if self.max_size is not None and len(self.results) > self.max_size:
+                    self.results.popitem(last=False)
+        call[0].set()
+        if call[2] is not None:
+            raise_(*call[2])
+        return call[1], False
@@ -0,0 +1,138 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import threading
+import multiprocessing
+from time import time, sleep
+
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['Throttle']
+
+ADAPTIVE_START_DELAY = 0.1 # Delay (seconds) to start the adaptive throttling of a new distributor.
+ADAPTIVE_MIN_DELAY = 0.01 # Limits of the adaptive delays.
+ADAPTIVE_MAX_DELAY = 30.0
+ADAPTIVE_RATE_STEP = 0.1 # Accesses/second added to the rate after each healthy answer.
+
+
+class Throttle(object):
+    '''@brief Rate limiter of the accesses to each distributor website.
+
+    Token bucket for each distributor (implemented as the "virtual scheduling"
+    of GCRA): at most one access every `delay` seconds is allowed, with a
+    burst of up to `burst` accesses after an idle period.
+    Each access reserves its time slot with a single lock operation and the
+    caller sleeps until it, so no process or thread spins while waiting.
+    With `shared=True` the state is kept in shared memory and the object must
+    be passed to the scraping processes at their creation (`Pool` initializer).
+
+    In adaptive mode the delay of each distributor is tuned by the answers
+    of its website (AIMD): the access rate is increased a little after each
+    healthy answer and halved after an overload sign (HTTP 429/503, errors,
+    slow answers or captcha pages).'''
+
+    def __init__(self, dists, delay=0.0, burst=1, shared=False, adaptive=False, delays=None):
+        '''@param dists `list()` of distributor names.
+        @param delay `float()` minimum time (seconds) between accesses to a distributor.
+        @param burst `int()` number of accesses allowed without delay after idle periods.
+        @param shared `bool()` share the state among processes.
+        @param adaptive `bool()` tune the delays by the answers of the websites.
+        @param delays `dict()` initial delays of the distributors (learned in previous runs)
+        for the adaptive mode.'''
+        self.index = {d: i for i, d in enumerate(dists)}
+        self.burst = max(int(burst), 1)
+        self.adaptive = adaptive
+        n = len(self.index)
+        if adaptive:
+            self.min_interval = max(float(delay), ADAPTIVE_MIN_DELAY)
+            delays = delays or {}
+            intervals = [min(max(delays.get(d, ADAPTIVE_START_DELAY), self.min_interval), ADAPTIVE_MAX_DELAY)
+                         for d in sorted(self.index, key=self.index.get)]
+        else:
+            intervals = [float(delay)] * n
+        if shared:
+            self.lock = multiprocessing.Lock()
+            self.interval = multiprocessing.RawArray('d', intervals)
+            self.tat = multiprocessing.RawArray('d', [0.0] * n) # Theoretical arrival times.
+        else:
+            self.lock = threading.Lock()
+            self.interval = intervals
+            self.tat = [0.0] * n
+
+    def next_slot(self, dist):
+        '''@brief Time when `dist` can be accessed again (without reserving it).
+        @param dist `str()` distributor name.
+        @return `float()` time in the `time()` scale.'''
+        i = self.index.get(dist)
+        if i is None:
+            return 0.0
+        return self.tat[i] - (self.burst - 1) * self.interval[i]
+
+    def reserve(self, dist):
+        '''@brief Reserve the next access slot of a distributor.
+        @param dist `str()` distributor name.
+        @return `float()` seconds to wait before the access.'''
+        i = self.index.get(dist)
+        if i is None or self.interval[i] <= 0:
+            return 0.0
+        with self.lock:
+            now = time()
+            slot = max(now, self.tat[i] - (self.burst - 1) * self.interval[i])
+            self.tat[i] = max(self.tat[i], slot) + self.interval[i]
+        return slot - now
+
+    def wait(self, dist):
+        '''@brief Block until the distributor can be accessed.
+        @param dist `str()` distributor name.'''
+        delay = self.reserve(dist)
+        if delay > 0:
+            logger.log(DEBUG_OBSESSIVE, 'Throttling {} for {:.2f}s'.format(dist, delay))
+            sleep(delay)
+
+    def feedback(self, dist, healthy):
+        '''@brief Tune the delay of a distributor by an answer of its website (adaptive mode).
+        @param dist `str()` distributor name.
+        @param healthy `bool()` False if the answer shows the website is overloaded or blocking us.'''
+        i = self.index.get(dist)
+        if not self.adaptive or i is None:
+            return
+        with self.lock:
+            if healthy:
+                interval = max(self.min_interval, 1.0 / (1.0 / self.interval[i] + ADAPTIVE_RATE_STEP))
+            else:
+                interval = min(ADAPTIVE_MAX_DELAY, self.interval[i] * 2)
+            self.interval[i] = interval
+        if not healthy:
+            logger.log(DEBUG_DETAILED, 'Slowing down {} to one access every {:.2f}s'.format(dist, interval))
+
+    def delays(self):
+        '''@brief Current delays of the distributors.
+        @return `dict()` distributor name: seconds.'''
+        return {d: self.interval[i] for d, i in self.index.items()}
@@ -42,114 +42,119 @@ import http.client # For web scraping exceptions.
 from .. import urlencode, urlquote, urlsplit, urlunsplit, urlopen, Request
 from .. import WEB_SCRAPE_EXCEPTIONS
 from .. import FakeBrowser
+from ..web_fetch import fetch_page
+from ..html_strainer import PageStrainer, pn_in_page
+from ..page_extractor import PageExtractor, Field, Table
 from ...globals import PartHtmlError
 from ...globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
 
-HTML_RESPONSE_RETRIES = 2
+# Elements of the product and search pages used to scrape the part data.
+PAGE_STRAINER = PageStrainer(keep=['td.pip-product-symbol', 'table#products'], mark=['div#ph'])
 
-def __ajax_details(pn):
-    '''@brief Load part details from TME using XMLHttpRequest.
-       @param pn `str()` part number
-       @return (html, quantity avaliable)
+# Part data in the product page and in the prices template of its AJAX details.
+EXTRACTOR = PageExtractor(
+    part_num=Field('td.pip-product-symbol'),
+    price_tiers=Table('td:nth-of-type(1)', 'td:nth-of-type(3)', rows='tbody#prices_body tr',
+                      key_clean='first_int', value_clean='price'))
+
+# Parts of each batch lookup, their stocks and prices are read with one request.
+BATCH_SIZE = 20
+
+# Links to the product pages, e.g. '/en/details/lm358dt/...' (the TME symbol is lowercase in them).
+DETAILS_LINK_RE = re.compile(r'/details/([^/?#]+)')
+
+
+class PartDetails(dict):
+    '''@brief Part data of TME, given to the functions that extract it in place
+    of the HTML tree of the product page: the TME 'symbol', the 'stock' and the
+    'prices' tree from the JSON payload of the stock and price AJAX request.'''
+
+    def decompose(self):
+        if self.get('prices') is not None:
+            self['prices'].decompose()
+
+
+def __ajax_details(symbols, scrape_retries=2):
+    '''@brief Load the details of parts from TME using XMLHttpRequest.
+       @param symbols `list()` of TME part numbers, all asked in one request.
+       @param scrape_retries `int` Quantity of retries in case of fail.
+       @return `dict()` of lowercase symbol: `PartDetails` with the parts in the answer,
+       their symbols are the ones asked (the answer may not have them).
     '''
-    data = urlencode({
-        'symbol': pn,
-        'currency': 'USD'
-    }).encode("utf-8")
+    # A single symbol is asked as the product page does, several as an array.
+    key = 'symbol' if len(symbols) == 1 else 'symbol[]'
+    data = urlencode([(key, s) for s in symbols] + [('currency', 'USD')]).encode("utf-8")
     req = FakeBrowser('https://www.tme.eu/en/_ajax/ProductInformationPage/_getStocks.html')
     req.add_header('X-Requested-With', 'XMLHttpRequest')
-    for _ in range(HTML_RESPONSE_RETRIES):
-        try:
-            response = urlopen(req, data)
-            r = response.read()
-            break
-        except WEB_SCRAPE_EXCEPTIONS:
-            logger.log(DEBUG_DETAILED,'Exception while web-scraping {} from {}'.format(pn, dist))
-            pass
-    else: # Couldn't get a good read from the website.
-        logger.log(DEBUG_OBSESSIVE,'No AJAX data for {} from {}'.format(pn, dist))
-        return None, None
+    r = fetch_page('tme', req, data, scrape_retries=scrape_retries)
+    if r is None: # Couldn't get a good read from the website.
+        logger.log(DEBUG_OBSESSIVE,'No AJAX data for {} from {}'.format(symbols, 'tme'))
+        return {}
 
+    details = {}
     try:
         r = r.decode('utf-8')  # Convert bytes to string in Python 3.
-        p = json.loads(r).get('Products')
-        if p is not None and isinstance(p, list):
-            p = p[0]
-            html_tree = BeautifulSoup(p.get('PriceTpl', '').replace("\n", ""), "lxml")
-            quantity = p.get('InStock', '0')
-            return html_tree, quantity
-        else:
-            return None, None
-    except (ValueError, KeyError, IndexError):
+        products = json.loads(r).get('Products')
+        if products is not None and isinstance(products, list):
+            # The products are in the order of the symbols asked (they may not have their 'Symbol').
+            if len(products) != len(symbols):
+                logger.log(DEBUG_OBSESSIVE, 'Got {} TME products for {} symbols!'.format(len(products), len(symbols)))
+                products = []
+            for symbol, p in zip(symbols, products):
+                details[symbol.lower()] = PartDetails(
+                    symbol=symbol,
+                    prices=BeautifulSoup(p.get('PriceTpl', '').replace("\n", ""), "lxml"),
+                    stock=p.get('InStock', '0'))
+    except (ValueError, KeyError, IndexError, AttributeError):
         logger.log(DEBUG_OBSESSIVE, 'Could not obtain AJAX data from TME!')
-        return None, None
+    return details
+
+
+def __part_details(symbol, scrape_retries=2):
+    '''@brief Load the details of a part from TME.
+       @param symbol `str()` TME part number.
+       @param scrape_retries `int` Quantity of retries in case of fail.
+       @return `PartDetails` (without 'stock' and 'prices' if they couldn't be read).
+    '''
+    return __ajax_details([symbol], scrape_retries).get(symbol.lower(), PartDetails(symbol=symbol))
+
 
 def get_price_tiers(html_tree):
-    '''@brief Get the pricing tiers from the parsed tree of the TME product page.
-       @param html_tree `str()` html of the distributor part page.
+    '''@brief Get the pricing tiers of the TME part.
+       @param html_tree `PartDetails` of the part.
        @return `dict()` price breaks, the keys are the quantities breaks.
     '''
-    price_tiers = {}
-    try:
-        pn = get_part_num(html_tree)
-        if pn == '':
-            return price_tiers
-
-        ajax_tree, quantity = __ajax_details(pn)
-        if ajax_tree is None:
-            return price_tiers
-
-        qty_strs = []
-        price_strs = []
-        for tr in ajax_tree.find('tbody', id='prices_body').find_all('tr'):
-            td = tr.find_all('td')
-            if len(td) == 3:
-                qty_strs.append(td[0].text)
-                price_strs.append(td[2].text)
-
-        qtys_prices = list(zip(qty_strs, price_strs))
-        for qty_str, price_str in qtys_prices:
-            try:
-                qty = re.search('(\s*)([0-9,]+)', qty_str).group(2)
-                qty = int(re.sub('[^0-9]', '', qty))
-                price_tiers[qty] = float(re.sub('[^0-9\.]', '', price_str))
-            except (TypeError, AttributeError, ValueError, IndexError):
-                continue
-    except AttributeError:
-        # This happens when no pricing info is found in the tree.
+    if not isinstance(html_tree, PartDetails) or html_tree.get('prices') is None:
+        logger.log(DEBUG_OBSESSIVE, 'No TME pricing information found!')
+        return {}
+    price_tiers = dict(EXTRACTOR.get('price_tiers', html_tree['prices']))
+    if not price_tiers:
         logger.log(DEBUG_OBSESSIVE, 'No TME pricing information found!')
-        return price_tiers  # Return empty price tiers.
     return price_tiers
 
 
 def get_part_num(html_tree):
-    '''@brief Get the part number from the TME product page.
-       @param html_tree `str()` html of the distributor part page.
+    '''@brief Get the part number of the TME part.
+       @param html_tree `PartDetails` of the part.
        @return `list()`of the parts that match.
     '''
-    try:
-        return html_tree.find('td', class_="pip-product-symbol").text
-    except AttributeError:
+    if not isinstance(html_tree, PartDetails):
         logger.log(DEBUG_OBSESSIVE, 'No TME part number found!')
         return ''
+    return html_tree['symbol']
 
 
 def get_qty_avail(html_tree):
-    '''@brief Get the available quantity of the part from the TME product page.
-       @param html_tree `str()` html of the distributor part page.
+    '''@brief Get the available quantity of the TME part.
+       @param html_tree `PartDetails` of the part.
        @return `int` avaliable quantity.
     '''
-    pn = get_part_num(html_tree)
-    if pn == '':
+    if not isinstance(html_tree, PartDetails) or html_tree.get('stock') is None:
         logger.log(DEBUG_OBSESSIVE, 'No TME part quantity found!')
         return None
 
-    ajax_tree, qty_str = __ajax_details(pn)
-    if qty_str is None:
-        return None
-
     try:
-        return int(qty_str)
+        return int(html_tree['stock'])
     except ValueError:
         # No quantity found (not even 0) so this is probably a non-stocked part.
         # Return None so the part won't show in the spreadsheet for this dist.
@@ -166,12 +171,53 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
        @param descend
        @param local_part_html
        @param scrape_retries `int` Quantity of retries in case of fail.
-       @return (html `str()` of the page, url)
+       @return (`PartDetails`, url)
     '''
+    symbol, url = __find_symbol(dist, pn, extra_search_terms, url, descend, scrape_retries)
+    return __part_details(symbol, scrape_retries), url
+
+
+def get_parts_batch(dist, pns, scrape_retries=2):
+    '''@brief Look up several parts, with one request for all their stocks and prices.
+       @param dist
+       @param pns `list()` of (part number `str()`, extra search terms `str()`).
+       @param scrape_retries `int` Quantity of retries in case of fail.
+       @return `dict()` of (part number, extra search terms): (`PartDetails`, url) with the parts found.
+    '''
+    found = {}
+    for pn, extra_search_terms in pns:
+        try:
+            found[(pn, extra_search_terms)] = __find_symbol(dist, pn, extra_search_terms,
+                                                           scrape_retries=scrape_retries)
+        except PartHtmlError:
+            pass # Looked up again alone, also without the extra search terms.
+    if not found:
+        return {}
+    details = __ajax_details(sorted(set(s for s, _ in found.values())), scrape_retries)
+    parts = {}
+    used = set()
+    for key in pns:
+        if key not in found:
+            continue
+        symbol, url = found[key]
+        # Each tree is freed after its extraction, so the part numbers
+        # with the same symbol (but the first) are looked up alone.
+        if symbol.lower() in details and symbol.lower() not in used:
+            used.add(symbol.lower())
+            parts[key] = (details[symbol.lower()], url)
+    return parts
 
-    global HTML_RESPONSE_RETRIES
-    HTML_RESPONSE_RETRIES = scrape_retries
 
+def __find_symbol(dist, pn, extra_search_terms='', url=None, descend=2, scrape_retries=2):
+    '''@brief Find the TME symbol of a part number with the site search.
+       @param dist
+       @param pn Part number `str()`.
+       @param extra_search_terms
+       @param url Product or search page to start from, `None` to search the part number.
+       @param descend
+       @param scrape_retries `int` Quantity of retries in case of fail.
+       @return (`str()` TME symbol, url of the product page)
+    '''
     # Use the part number to lookup the part using the site search function, unless a starting url was given.
     if url is None:
         url = 'https://www.tme.eu/en/katalog/?search=' + urlquote(
@@ -181,34 +227,32 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
         url = 'https://www.tme.eu' + url
 
     # Open the URL, read the HTML from it, and parse it into a tree structure.
-    req = FakeBrowser(url)
-    for _ in range(scrape_retries):
-        try:
-            response = urlopen(req)
-            html = response.read()
-            break
-        except WEB_SCRAPE_EXCEPTIONS:
-            logger.log(DEBUG_DETAILED,'Exception while web-scraping {} from {}'.format(pn, dist))
-            pass
-    else: # Couldn't get a good read from the website.
+    html = fetch_page(dist, FakeBrowser(url), scrape_retries=scrape_retries)
+    if html is None: # Couldn't get a good read from the website.
         logger.log(DEBUG_OBSESSIVE,'No HTML page for {} from {}'.format(pn, dist))
         raise PartHtmlError
 
     # Abort if the part number isn't in the HTML somewhere.
     # (Only use the numbers and letters to compare PN to HTML.)
-    if re.sub('[\W_]','',str.lower(pn)) not in re.sub('[\W_]','',str.lower(str(html))):
+    if not pn_in_page(pn, html):
         logger.log(DEBUG_OBSESSIVE,'No part number {} in HTML page from {} ({})'.format(pn, dist, url))
         raise PartHtmlError
 
     try:
-        tree = BeautifulSoup(html, 'lxml')
+        tree = PAGE_STRAINER.parse(html)
     except Exception:
         logger.log(DEBUG_OBSESSIVE,'No HTML tree for {} from {}'.format(pn, dist))
         raise PartHtmlError
 
-    # If the tree contains the tag for a product page, then just return it.
+    # If the tree contains the tag for a product page, then get the details
+    # of its TME symbol.
     if tree.find('div', id='ph') is not None:
-        return tree, url
+        symbol = EXTRACTOR.get('part_num', tree)
+        tree.decompose()
+        if not symbol:
+            logger.log(DEBUG_OBSESSIVE,'No TME symbol for {} from {}'.format(pn, dist))
+            raise PartHtmlError
+        return symbol, url
 
     # If the tree is for a list of products, then examine the links to try to find the part number.
     if tree.find('table', id="products") is not None:
@@ -242,20 +286,20 @@ def get_part_html_tree(dist, pn, extra_search_terms='', url=None, descend=2, loc
                     if (not l.get('href', '').startswith('./katalog')) and l.text == match:
                         # Get the tree for the linked-to page and return that.
                         logger.log(DEBUG_OBSESSIVE,'Selecting {} from product table for {} from {}'.format(l.text, pn, dist))
-                        # TODO: The current implementation does up to four HTTP
-                        # requests per part (search, part details page for TME P/N,
-                        # XHR for pricing information, and XHR for stock
-                        # availability). This is mainly for the compatibility with
-                        # other distributor implementations (html_tree gets passed
-                        # to all functions).
-                        # A modified implementation (which would pass JSON data
-                        # obtained by the XHR instead of the HTML DOM tree) might be
-                        # able to do the same with just two requests (search for TME
-                        # P/N, XHR for pricing and stock availability).
-                        return get_part_html_tree(dist, pn, extra_search_terms,
-                                                  url=l.get('href', ''),
-                                                  descend=descend-1,
-                                                  scrape_retries=scrape_retries)
+                        # The stock and prices are read by an AJAX request with
+                        # the TME symbol, which is the text of the links to the
+                        # product pages, so the product page is only read for
+                        # other links (two requests for each part instead of three).
+                        link = l.get('href', '')
+                        if DETAILS_LINK_RE.search(link) is None:
+                            # Get the symbol in the linked-to page.
+                            return __find_symbol(dist, pn, extra_search_terms,
+                                                 url=link,
+                                                 descend=descend-1,
+                                                 scrape_retries=scrape_retries)
+                        if link.startswith('/'):
+                            link = 'https://www.tme.eu' + link
+                        return l.text.strip(), link
                 except KeyError:
                     pass    # This happens if there is no 'href' in the link, so just skip it.
 
@@ -0,0 +1,185 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import os
+import gzip
+import hashlib
+import threading
+from time import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['WebCache', 'default_cache_dir', 'request_key']
+
+CACHE_TTL = 24.0 # Default time (in hours) that a cached page is considered fresh.
+CACHE_SIZE = 200 # Default maximum size (in MB) of the pages kept in the cache.
+CACHE_EXT = '.html.gz' # Extension of the compressed page files.
+
+
+def default_cache_dir():
+    '''@brief Return the default folder to keep the KiCost web cache.
+    @return `str()` with the path (not created here).'''
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'kicost')
+
+
+def normalize_url(url):
+    '''@brief Normalize an URL so equivalent requests share the same cache entry.
+
+    Scheme and host are lowercased, default ports and fragments are removed and
+    the query parameters are sorted.
+    @param url `str()` URL to normalize.
+    @return `str()` normalized URL.'''
+    scheme, netloc, path, query, _ = urlsplit(url.strip())
+    scheme = scheme.lower()
+    netloc = netloc.lower()
+    if (scheme, netloc[-3:]) == ('http', ':80') or (scheme, netloc[-4:]) == ('https', ':443'):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path or '/', query, ''))
+
+
+def request_key(dist, url, data=None, site=None):
+    '''@brief Compute the key that identifies a request to a distributor.
+    @param dist `str()` distributor name.
+    @param url `str()` URL requested.
+    @param data `bytes` POST data or `None`.
+    @param site `dict()` distributor site definitions (locale/currency) or `None`.
+    @return `str()` with the hexadecimal key.'''
+    site = site or {}
+    h = hashlib.sha1()
+    for k in (dist, normalize_url(url), site.get('locale', ''), site.get('currency', '')):
+        h.update(k.encode('utf-8'))
+        h.update(b'\0')
+    if data:
+        h.update(data)
+    return h.hexdigest()
+
+
+class WebCache(object):
+    '''@brief Persistent cache of the pages read from the distributor web sites.
+
+    Each page is stored compressed in a file named by the hash of the
+    distributor, the normalized URL, the POST data and the distributor
+    locale/currency. Pages older than `ttl` are not used (except in offline
+    mode) and the least recently used pages are removed by `trim()` when the
+    cache grows over `max_size`.
+    The object only holds configuration, so it can be passed to the scraping
+    processes.'''
+
+    def __init__(self, path=None, ttl=CACHE_TTL, max_size=CACHE_SIZE, offline=False):
+        '''@brief Configure the cache.
+        @param path `str()` folder of the cache files, `None` to use `default_cache_dir()`.
+        @param ttl `float()` hours that a page stays fresh.
+        @param max_size `float()` maximum size in MB of the cache folder.
+        @param offline `bool()` only use the cached pages, never access the web.'''
+        self.path = path or default_cache_dir()
+        self.ttl = ttl * 3600
+        self.max_size = int(max_size * 1024 * 1024)
+        self.offline = offline
+
+    def key(self, dist, url, data=None, site=None):
+        '''@brief Compute the cache key of a request, see `request_key()`.'''
+        return request_key(dist, url, data, site)
+
+    def file_name(self, key):
+        '''@brief Path of the file that holds the page of `key`.'''
+        return os.path.join(self.path, key[:2], key + CACHE_EXT)
+
+    def get(self, dist, url, data=None, site=None, max_age=None):
+        '''@brief Get a page from the cache.
+        @param max_age `float()` seconds, if given and shorter than the cache TTL it is used instead.
+        @return `bytes` with the page or `None` if not cached or expired.'''
+        file_name = self.file_name(self.key(dist, url, data, site))
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        try:
+            modified = os.path.getmtime(file_name)
+            if not self.offline and time() - modified > ttl:
+                logger.log(DEBUG_OBSESSIVE, 'Cached page of {} expired'.format(url))
+                return None
+            with gzip.open(file_name, 'rb') as f:
+                html = f.read()
+            os.utime(file_name, (time(), modified)) # Access time is used by the LRU.
+            return html
+        except (IOError, OSError, EOFError):
+            return None
+
+    def put(self, dist, url, data, html, site=None):
+        '''@brief Store a page in the cache.'''
+        file_name = self.file_name(self.key(dist, url, data, site))
+        tmp_name = '{}.{}.{}.tmp'.format(file_name, os.getpid(), threading.current_thread().ident)
+        try:
+            if not os.path.isdir(os.path.dirname(file_name)):
+                os.makedirs(os.path.dirname(file_name))
+            with gzip.open(tmp_name, 'wb') as f:
+                f.write(html)
+            if os.path.exists(file_name):
+                os.remove(file_name) # Windows doesn't rename over an existing file.
+            os.rename(tmp_name, file_name)
+        except (IOError, OSError):
+            logger.log(DEBUG_DETAILED, 'Could not write {} to the web cache'.format(url))
+            try:
+                os.remove(tmp_name)
+            except OSError:
+                pass
+
+    def trim(self):
+        '''@brief Remove the least recently used pages until the cache fits `max_size`.
+        @return `int()` number of pages removed.'''
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(CACHE_EXT):
+                    continue
+                file_name = os.path.join(root, name)
+                try:
+                    st = os.stat(file_name)
+                except OSError:
+                    continue
+                entries.append((st.st_atime, st.st_size, file_name))
+                total += st.st_size
+        removed = 0
+        for _, size, file_name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(file_name)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.log(DEBUG_OVERVIEW, 'Removed {} pages from the web cache.'.format(removed))
+        return removed
@@ -0,0 +1,342 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from builtins import range
+from future import standard_library
+from future.utils import raise_
+standard_library.install_aliases()
+
+import sys
+import threading
+from random import uniform
+from time import sleep, time
+from contextlib import contextmanager
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request
+
+from . import WEB_SCRAPE_EXCEPTIONS
+from . import distributor_dict
+from .web_session import HttpSession
+from .web_replay import NotRecorded
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['fetch_page', 'configure_fetch', 'fetch_config', 'max_page_age', 'session', 'fetch_in_background',
+           'PAGE_MEMO_SIZE', 'PROCESS_PAGE_MEMO_SIZE']
+
+RETRY_DELAY = 1.0 # Seconds waited before the first retry of a page, doubled on each retry...
+RETRY_MAX_DELAY = 30.0 # ... up to this.
+SLOW_ANSWER = 10.0 # Seconds of a page read that show an overloaded website.
+CAPTCHA_MAX_SIZE = 50000 # Bytes, larger pages are not checked for captcha challenges.
+PAGE_MEMO_SIZE = 64 # Pages read in a run kept in memory for the other parts that use them...
+PROCESS_PAGE_MEMO_SIZE = 4 # ... in each process of the process engine.
+BACKGROUND_PER_HOST = 2 # Pages of each distributor read in background threads at the same time (in each process).
+
+# Configuration of the page fetching of this process. It is set by `configure_fetch()`
+# in the main process and in each scraping process (as the `Pool` initializer).
+fetch_config = {
+    'page_cache': None, # `WebCache` used to store the pages, `None` to disable.
+    'quote_cache': None, # `QuoteCache` with the scraped part data, `None` to disable.
+    'miss_cache': None, # `MissCache` with the parts not found, `None` to disable.
+    'url_cache': None, # `UrlCache` with the product pages found by the searches, `None` to disable.
+    'throttle': None, # `Throttle` of the accesses to each distributor, `None` to disable.
+    'breaker': None, # `CircuitBreaker` of the distributors failing, `None` to disable.
+    'fixtures': None, # `HttpFixtures` to record or replay the web answers, `None` to disable.
+    'profiler': None, # `Profiler` to time the page reads, `None` to disable.
+    'stand_in': None, # Base URL of a local server answering instead of the web sites (tests), `None` to disable.
+    'stats': None, # `FetchStats` counting the web accesses, `None` to disable.
+    'pages': None, # `SingleFlight` of the pages read in this run, `None` to disable.
+    'lookups': None, # `SingleFlight` of the part lookups in this run, `None` to disable.
+    'batches': None, # `BatchLookups` with the parts looked up in batches, `None` to disable.
+}
+
+# Connections and cookies used by all the distributor modules of this process.
+session = HttpSession()
+
+# Settings of the fetches done by the current thread (`failed` is set when
+# a page could not be read, `fetch_time` sums the seconds spent reading pages).
+fetch_local = threading.local()
+
+# Slots of the background reads of each distributor, see `fetch_in_background()`.
+background_slots = {}
+background_lock = threading.Lock()
+
+
+def configure_fetch(config):
+    '''@brief Configure the page fetching of the current process.
+    @param config `dict()` with the `fetch_config` keys to update.'''
+    fetch_config.update(config)
+
+
+@contextmanager
+def max_page_age(seconds):
+    '''@brief Limit the age of the cached pages used by the current thread.
+
+    Used when some data of a part must be refreshed sooner than the page cache
+    expiration time.
+    @param seconds `float()` maximum page age or `None` for no limit.'''
+    last = getattr(fetch_local, 'max_age', None)
+    fetch_local.max_age = seconds
+    try:
+        yield
+    finally:
+        fetch_local.max_age = last
+
+
+class BackgroundFetch(object):
+    '''@brief Call that reads pages in another thread, see `fetch_in_background()`.'''
+
+    def __init__(self, dist, func, args, kwargs):
+        self.max_age = getattr(fetch_local, 'max_age', None)
+        self.value = None
+        self.exc_info = None
+        self.failed = False
+        with background_lock:
+            self.slots = background_slots.setdefault(dist, threading.BoundedSemaphore(BACKGROUND_PER_HOST))
+        if self.slots.acquire(False):
+            self.thread = threading.Thread(target=self.run, args=(func, args, kwargs))
+            self.thread.daemon = True
+            self.thread.start()
+        else:
+            # Too many pages of the distributor read in background, read it now.
+            self.thread = None
+            self.run(func, args, kwargs)
+
+    def run(self, func, args, kwargs):
+        failed = getattr(fetch_local, 'failed', False)
+        fetch_local.failed = False
+        try:
+            with max_page_age(self.max_age):
+                self.value = func(*args, **kwargs)
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.failed = fetch_local.failed
+            fetch_local.failed = failed
+            if self.thread is not None:
+                self.slots.release()
+
+    def result(self):
+        '''@brief Wait for the call to finish.
+        @return The value returned by the call, its exception is raised here.'''
+        if self.thread is not None:
+            start = time()
+            self.thread.join()
+            # The current thread was waiting for the pages.
+            fetch_local.fetch_time = getattr(fetch_local, 'fetch_time', 0.0) + time() - start
+        # Tell the caller that some page could not be read.
+        if self.failed:
+            fetch_local.failed = True
+        if self.exc_info is not None:
+            raise_(*self.exc_info)
+        return self.value
+
+
+def fetch_in_background(dist, func, *args, **kwargs):
+    '''@brief Call `func(*args, **kwargs)`, that reads some pages, in another thread.
+
+    Used to read several pages of a part at the same time, each read still
+    waits for its access slot of the distributor throttling. No more than
+    `BACKGROUND_PER_HOST` calls of a distributor run in background threads,
+    the others run in the current thread. The call uses the maximum page age
+    of the current thread and `result()` sets its `failed` flag if some page
+    could not be read.
+    @param dist `str()` distributor of the pages.
+    @return `BackgroundFetch`, its `result()` waits for the call.'''
+    return BackgroundFetch(dist, func, args, kwargs)
+
+
+class PageNotRead(Exception):
+    '''Raised by `read_page()` when the page could not be read.'''
+
+
+class PageNotFound(PageNotRead):
+    '''Raised by `read_page()` when the web site answers that the page doesn't exist.'''
+    pass
+
+
+def is_captcha(html):
+    '''@brief Check if a page is a captcha challenge instead of the page requested.
+    @param html `bytes` with the page.
+    @return `bool()`.'''
+    return len(html) < CAPTCHA_MAX_SIZE and b'captcha' in html.lower()
+
+
+def retry_delay(retry):
+    '''@brief Time to wait before retrying a page read: exponential backoff
+    with random jitter, so the processes don't retry at the same time.
+    @param retry `int()` number of the retry (1 for the first).
+    @return `float()` seconds.'''
+    delay = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (retry - 1))
+    return uniform(delay / 2, delay)
+
+
+def read_url(dist, req, data, site, stats):
+    '''@brief Read a page from the web or, in replay mode, the recorded fixtures.
+    @return `bytes` with the page. The errors are raised as `urllib` does.'''
+    fixtures = fetch_config['fixtures']
+    url = req.get_full_url()
+    if fixtures is not None and fixtures.replay:
+        return fixtures.load(dist, url, data, site)
+    stand_in = fetch_config['stand_in']
+    if stand_in is not None:
+        # Ask the stand-in server, passing the original URL in the path.
+        req = Request('{}/{}'.format(stand_in.rstrip('/'), quote(url, safe='')), headers=dict(req.header_items()))
+    if fixtures is None:
+        return session.read(req, data, stats)
+    try:
+        html = session.read(req, data, stats)
+    except HTTPError as e:
+        fixtures.save(dist, url, data, b'', site, e.code)
+        raise
+    fixtures.save(dist, url, data, html, site)
+    return html
+
+
+def fetch_page(dist, req, data=None, scrape_retries=2):
+    '''@brief Read a page from a distributor web site.
+
+    All the distributor modules read their pages through this function, so
+    the page cache (and offline mode) and the throttling are applied to every
+    web access, and the connections to each web site are reused. The failed
+    reads are retried with increasing delays, and a distributor that keeps
+    failing is not accessed anymore.
+    A page is read once in each run, even when requested by several threads
+    at the same time (e.g. the same page shared by several parts).
+    @param dist `str()` distributor name.
+    @param req `Request` created by `FakeBrowser()`.
+    @param data `bytes` to POST or `None` to GET the page.
+    @param scrape_retries `int` Quantity of retries in case of fail.
+    @return `bytes` with the page or `None` if it could not be read.'''
+
+    start = time()
+    try:
+        pages = fetch_config['pages']
+        if pages is None:
+            return read_page(dist, req, data, scrape_retries)
+        html, shared = pages.do((dist, req.get_full_url(), data), read_page, dist, req, data, scrape_retries)
+        if shared:
+            logger.log(DEBUG_OBSESSIVE, 'Reusing page {} from {}'.format(req.get_full_url(), dist))
+        return html
+    except PageNotFound:
+        return None
+    except PageNotRead:
+        # Tell the caller that the part may exist even if not found.
+        fetch_local.failed = True
+        return None
+    finally:
+        elapsed = time() - start
+        fetch_local.fetch_time = getattr(fetch_local, 'fetch_time', 0.0) + elapsed
+        profiler = fetch_config['profiler']
+        if profiler is not None:
+            profiler.add('fetch ' + dist, elapsed)
+
+
+def read_page(dist, req, data=None, scrape_retries=2):
+    '''@brief Read a page from the page cache or the distributor web site.
+    @return `bytes` with the page, raises `PageNotRead` if it could not be read.'''
+
+    url = req.get_full_url()
+    site = distributor_dict.get(dist, {}).get('site')
+    cache = fetch_config['page_cache']
+    stats = fetch_config['stats']
+    if stats is not None:
+        stats = stats.for_dist(dist)
+    if cache is not None:
+        html = cache.get(dist, url, data, site, getattr(fetch_local, 'max_age', None))
+        if html is not None:
+            logger.log(DEBUG_OBSESSIVE, 'Using cached page {} from {}'.format(url, dist))
+            if stats is not None:
+                stats.add('cache_hits')
+            return html
+        if stats is not None:
+            stats.add('cache_misses')
+        if cache.offline:
+            logger.log(DEBUG_DETAILED, 'No cached page {} from {} in offline mode'.format(url, dist))
+            raise PageNotRead
+
+    breaker = fetch_config['breaker']
+    if breaker is not None and breaker.is_open(dist):
+        breaker.skip(dist)
+        raise PageNotRead
+
+    throttle = fetch_config['throttle']
+    for retry in range(scrape_retries):
+        if retry:
+            sleep(retry_delay(retry))
+            if stats is not None:
+                stats.add('retries')
+        if throttle is not None:
+            throttle.wait(dist) # Sleep until this distributor can be accessed again.
+        start = time()
+        try:
+            try:
+                html = read_url(dist, req, data, site, stats)
+            finally:
+                if stats is not None:
+                    stats.observe('fetch_seconds', time() - start)
+        except NotRecorded:
+            # Replaying, it would never be there.
+            logger.warning('No recorded answer for {} from {}'.format(url, dist))
+            raise PageNotRead
+        except HTTPError as e:
+            logger.log(DEBUG_DETAILED, 'HTTP error {} while web-scraping {} from {}'.format(e.code, url, dist))
+            if stats is not None and 300 <= e.code < 600:
+                stats.add('status_{}xx'.format(e.code // 100))
+            if e.code in (404, 410):
+                # The page doesn't exist, retrying won't help.
+                if throttle is not None:
+                    throttle.feedback(dist, True)
+                if breaker is not None:
+                    breaker.success(dist) # The website is answering.
+                raise PageNotFound
+        except WEB_SCRAPE_EXCEPTIONS:
+            logger.log(DEBUG_DETAILED, 'Exception while web-scraping {} from {}'.format(url, dist))
+            if stats is not None:
+                stats.add('errors')
+        else:
+            if stats is not None:
+                stats.add('status_2xx')
+            if not is_captcha(html):
+                if throttle is not None:
+                    throttle.feedback(dist, time() - start < SLOW_ANSWER)
+                break
+            logger.log(DEBUG_DETAILED, 'Captcha page while web-scraping {} from {}'.format(url, dist))
+        if throttle is not None:
+            throttle.feedback(dist, False)
+    else: # Couldn't get a good read from the website.
+        if breaker is not None and breaker.failure(dist):
+            logger.warning('Too many failures accessing {}, it will not be scraped anymore in this run.'.format(
+                                distributor_dict.get(dist, {}).get('label', dist)))
+        raise PageNotRead
+
+    if breaker is not None:
+        breaker.success(dist)
+
+    if cache is not None:
+        cache.put(dist, url, data, html, site)
+    return html
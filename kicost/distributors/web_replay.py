@@ -0,0 +1,110 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import os
+import io
+import gzip
+import json
+import threading
+from time import sleep
+from urllib.error import HTTPError
+
+from .web_cache import request_key
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['HttpFixtures', 'NotRecorded']
+
+FIXTURE_INDEX = 'index.jsonl' # List of the requests recorded, for humans.
+
+
+class NotRecorded(Exception):
+    '''Raised by `HttpFixtures.load()` for a request not recorded.'''
+
+
+class HttpFixtures(object):
+    '''@brief Folder with the answers of the distributor web sites recorded in
+    a run, to replay them later without network access.
+
+    In record mode each answer read from the web (page or HTTP error) is
+    saved. In replay mode the web is never accessed: the recorded answers are
+    served back, after an optional delay to emulate the network latency, and
+    the requests not recorded raise `NotRecorded`.
+    The object only holds configuration, so it can be passed to the
+    scraping processes.'''
+
+    def __init__(self, path, replay=False, latency=0.0):
+        '''@param path `str()` folder of the fixtures.
+        @param replay `bool()` replay instead of record.
+        @param latency `float()` seconds added to each replayed answer.'''
+        self.path = path
+        self.replay = replay
+        self.latency = latency
+
+    def file_name(self, key):
+        return os.path.join(self.path, key + '.gz')
+
+    def save(self, dist, url, data, html, site=None, status=200):
+        '''@brief Record an answer.
+        @param html `bytes` page received (empty for errors).
+        @param status `int()` HTTP status.'''
+        key = request_key(dist, url, data, site)
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            tmp_name = '{}.{}.{}.tmp'.format(self.file_name(key), os.getpid(), threading.current_thread().ident)
+            with gzip.open(tmp_name, 'wb') as f:
+                f.write(json.dumps({'status': status}).encode('utf-8') + b'\n')
+                f.write(html)
+            if os.path.exists(self.file_name(key)):
+                os.remove(self.file_name(key))
+            os.rename(tmp_name, self.file_name(key))
+            entry = {'key': key, 'dist': dist, 'url': url, 'status': status,
+                     'data': data.decode('utf-8', 'replace') if data else None}
+            with io.open(os.path.join(self.path, FIXTURE_INDEX), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except (IOError, OSError):
+            logger.log(DEBUG_DETAILED, 'Could not record {} in {}'.format(url, self.path))
+
+    def load(self, dist, url, data, site=None):
+        '''@brief Replay an answer.
+        @return `bytes` with the page, raises `HTTPError` for the errors recorded
+        and `NotRecorded` for the requests not recorded.'''
+        if self.latency > 0:
+            sleep(self.latency)
+        try:
+            with gzip.open(self.file_name(request_key(dist, url, data, site)), 'rb') as f:
+                status = json.loads(f.readline().decode('utf-8'))['status']
+                html = f.read()
+        except (IOError, OSError, EOFError, ValueError):
+            raise NotRecorded(url)
+        if status >= 400:
+            raise HTTPError(url, status, 'Recorded error', None, None)
+        return html
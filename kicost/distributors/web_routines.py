@@ -30,8 +30,9 @@ import sys
 from bs4 import BeautifulSoup # XML file interpreter.
 import multiprocessing # To deal with the parallel scrape.
 import logging
+import copy
+from random import shuffle
 from time import time
-from random import choice
 
 try:
     # This is for Python 3.
@@ -44,6 +45,7 @@ from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE #
 from ..globals import SEPRTR
 from ..globals import PartHtmlError
 from . import distributor_dict
+from .web_fetch import fetch_config, fetch_local, max_page_age
 
 import os, re
 
@@ -66,7 +68,7 @@ for module in os.listdir(directory):
     # Import the module.
     dist_modules[module] = __import__(module, globals(), locals(), [], level=1)
 
-__all__ = ['scrape_part', 'config_distributor']
+__all__ = ['scrape_part', 'scrape_dist', 'config_distributor', 'part_lookup_key', 'extract_part_data']
 
 def config_distributor(dist_name, locale_currency='USD'):
     '''@brief Configure the distributor for some locale/country and
@@ -93,18 +95,82 @@ def config_distributor(dist_name, locale_currency='USD'):
     except AttributeError:
         logger.warning('\tNo currency/country configuration for {}'.format(distributor_dict[dist_name]['label']))
         pass
-
-
-def get_part_html_tree(part, dist, get_html_tree_func, local_part_html, scrape_retries, logger):
+    except PartHtmlError:
+        # Happens when the configuration page can't be read (e.g. offline mode).
+        logger.warning('\tCould not configure currency/country for {}, using its default'.format(distributor_dict[dist_name]['label']))
+
+
+def part_search_number(part, dist):
+    '''@brief Get the code used to search a part in a distributor.
+    @param part Part group.
+    @param `str` dist Distributor name.
+    @return `str` distributor catalog number or manufacturer part number, `None` if none.'''
+    for key in (dist+'#', dist+SEPRTR+'cat#', 'manf#'):
+        if part.fields.get(key):
+            return part.fields[key]
+    return None
+
+
+def part_lookup_key(part, dists):
+    '''@brief Key of the searches of a part, the parts with the same key get
+    the same data from the distributors.
+    @param part Part group.
+    @param dists `list()` of distributor names.
+    @return `tuple()` with the codes searched (`None` if no code at all).'''
+    key = tuple(part_search_number(part, d) for d in dists)
+    if not any(key):
+        return None
+    return key + (part.fields.get('manf', ''),)
+
+
+def search_part_html_tree(get_html_tree_func, dist, pn, extra_search_terms, local_part_html,
+                          scrape_retries, logger, url_cache=None):
+    '''@brief Get the HTML tree for a part number, starting from the product page
+    found by a previous search of it, if any.
+    @param get_html_tree_func `get_part_html_tree()` of the distributor module.
+    @param `str` dist Distributor to scrape.
+    @param `str` pn Manufacturer or distributor part number.
+    @param `str` extra_search_terms
+    @param `dict` local_part_html Index of the local distributors data.
+    @param `int` scrape_retries Maximum times of web ritries.
+    @param logger Logger handle.
+    @param url_cache `UrlCache` with the product pages found by the searches, `None` to disable.
+    @return (HTML tree, url), raises `PartHtmlError` if not found.'''
+    if url_cache is not None:
+        url = url_cache.get(dist, pn, extra_search_terms)
+        if url:
+            logger.log(DEBUG_OBSESSIVE, 'Reading {} at {} from {} without searching'.format(pn, url, dist))
+            try:
+                html_tree, url = get_html_tree_func(dist, pn, extra_search_terms, url=url,
+                                                    local_part_html=local_part_html, scrape_retries=scrape_retries)
+                if fetch_config['stats'] is not None:
+                    fetch_config['stats'].add('url_hits', dist=dist)
+                return html_tree, url
+            except PartHtmlError:
+                # The part isn't there anymore, search it again.
+                if not fetch_local.failed:
+                    url_cache.forget(dist, pn, extra_search_terms)
+                fetch_local.failed = False
+    html_tree, url = get_html_tree_func(dist, pn, extra_search_terms, local_part_html=local_part_html,
+                                        scrape_retries=scrape_retries)
+    if url_cache is not None and url:
+        url_cache.put(dist, pn, extra_search_terms, url)
+    return html_tree, url
+
+
+def get_part_html_tree(part, dist, get_html_tree_func, local_part_html, scrape_retries, logger,
+                       miss_cache=None, url_cache=None):
     '''@brief Get the HTML tree for a part.
     
     Get the HTML tree for a part from the given distributor website or local HTML.
     @param `str` part Part manufactor code or distributor stock code.
     @param `str` dist Distributor do scrape.
     @param `str` get_html_tree_func
-    @param `str` local_part_html
+    @param `dict` local_part_html Index of the local distributors data.
     @param `int` scrape_retries Maximum times of web ritries.
     @param logger Logger handle.
+    @param miss_cache `MissCache` with the searches that didn't find the part, `None` to disable.
+    @param url_cache `UrlCache` with the product pages found by the searches, `None` to disable.
     @return `str` with the HTML webpage.'''
 
     logger.log(DEBUG_OBSESSIVE, '%s %s', dist, str(part.refs))
@@ -118,7 +184,21 @@ def get_part_html_tree(part, dist, get_html_tree_func, local_part_html, scrape_r
                 if key in part.fields:
                     if part.fields[key]:
                         # Founded manufacturer / distributor code valid (not empty).
-                        return get_html_tree_func(dist, part.fields[key], extra_search_terms, local_part_html=local_part_html, scrape_retries=scrape_retries)
+                        pn = part.fields[key]
+                        if miss_cache is not None and miss_cache.is_miss(dist, pn, extra_search_terms):
+                            logger.log(DEBUG_OBSESSIVE, 'Skipping {} {} at {}, not found recently'.format(pn, extra_search_terms, dist))
+                            if fetch_config['stats'] is not None:
+                                fetch_config['stats'].add('miss_hits', dist=dist)
+                            raise PartHtmlError
+                        fetch_local.failed = False
+                        try:
+                            return search_part_html_tree(get_html_tree_func, dist, pn, extra_search_terms,
+                                                         local_part_html, scrape_retries, logger, url_cache)
+                        except PartHtmlError:
+                            # Remember the part was not found, unless some page could not be read.
+                            if miss_cache is not None and not fetch_local.failed:
+                                miss_cache.put(dist, pn, extra_search_terms)
+                            raise
             # No distributor or manufacturer number, so give up.
             else:
                 logger.warning("No '%s#' or 'manf#' field: cannot lookup part %s at %s.", dist, part.refs, dist)
@@ -133,6 +213,170 @@ def get_part_html_tree(part, dist, get_html_tree_func, local_part_html, scrape_r
     return BeautifulSoup('<html></html>', 'lxml'), ''
 
 
+def get_dist_module(dist, distributor_dict):
+    '''@brief Get the module that scrapes a distributor.
+    @param `str` dist Distributor name.
+    @param `dict` distributor_dict Distributors definitions.
+    @return Distributor module.'''
+    try:
+        return dist_modules[dist]
+    except KeyError: # When use local distributor with personalized name.
+        return dist_modules[distributor_dict[dist]['module']]
+
+
+def scrape_dist(part, dist, distributor_dict, local_part_html, scrape_retries, scrape_logger):
+    '''@brief Scrape the data for a part from one distributor website or local HTML.
+
+    The same part code is looked up once in each run (the other parts with it
+    wait for the first lookup and get a copy of its data).
+    @param part Part group.
+    @param `str` dist Distributor name.
+    @param `dict` distributor_dict Distributors definitions.
+    @param `dict` local_part_html Index of the local distributors data.
+    @param `int` scrape_retries Number of scrape retries.
+    @param scrape_logger Logger handle.
+    @return url, `str` distributor stock part number, `dict` price tiers, `int` qty avail, `dict` extrainfo dist
+    '''
+    lookups = fetch_config['lookups']
+    pn = part_search_number(part, dist)
+    if lookups is None or not pn or distributor_dict[dist]['scrape'] == 'local':
+        return lookup_dist(part, dist, distributor_dict, local_part_html, scrape_retries, scrape_logger)
+    data, shared = lookups.do((dist, pn, part.fields.get('manf', '')), lookup_dist,
+                        part, dist, distributor_dict, local_part_html, scrape_retries, scrape_logger)
+    if shared:
+        scrape_logger.log(DEBUG_OBSESSIVE, 'Reusing the lookup of {} from {}'.format(pn, dist))
+        return copy.deepcopy(data)
+    return data
+
+
+def extract_part_data(dist_module, html_tree, free_tree=True):
+    '''@brief Extract the part data from its HTML tree and free the tree.
+    @param dist_module Distributor module.
+    @param html_tree Tree returned by the `get_part_html_tree()` of the module.
+    @param free_tree `bool` Free the tree after the extraction (the local parts data is kept in the index).
+    @return `str` distributor stock part number, `dict` price tiers, `int` qty avail, `dict` extrainfo dist
+    '''
+    # Call the functions that extract the data from the HTML tree.
+    part_num = dist_module.get_part_num(html_tree)
+    qty_avail = dist_module.get_qty_avail(html_tree)
+    price_tiers = dist_module.get_price_tiers(html_tree)
+
+    try:
+        # Get extra characeristics of the part in the web page.
+        # This will be use to comment in the 'cat#' column of the
+        # spreadsheet and some validations (in the future implementaions)
+        info_dist = dist_module.get_extra_info(html_tree)
+    except:
+        info_dist = {}
+        pass
+
+    # Free the tree now, its elements reference each other.
+    if free_tree:
+        html_tree.decompose()
+    return part_num, price_tiers, qty_avail, info_dist
+
+
+def lookup_dist(part, dist, distributor_dict, local_part_html, scrape_retries, scrape_logger):
+    '''@brief Look up a part at one distributor website or local HTML.
+
+    The quote cache is used when its fields are fresh, otherwise the
+    distributor is scraped and the cache is updated.
+    @param part Part group.
+    @param `str` dist Distributor name.
+    @param `dict` distributor_dict Distributors definitions.
+    @param `dict` local_part_html Index of the local distributors data.
+    @param `int` scrape_retries Number of scrape retries.
+    @param scrape_logger Logger handle.
+    @return url, `str` distributor stock part number, `dict` price tiers, `int` qty avail, `dict` extrainfo dist
+    '''
+
+    # Use the part data in the quote cache if all its fields are fresh.
+    quote_cache = fetch_config['quote_cache']
+    stats = fetch_config['stats']
+    pn = part_search_number(part, dist)
+    max_age = None
+    if quote_cache is not None and distributor_dict[dist]['scrape'] == 'web' and pn:
+        fields, max_age = quote_cache.get(dist, pn)
+        if max_age is None:
+            scrape_logger.log(DEBUG_OBSESSIVE, 'Using cached quote of {} from {}'.format(pn, dist))
+            if stats is not None:
+                stats.add('quote_hits', dist=dist)
+            return fields['url'], fields['part_num'], fields['price_tiers'], fields['qty_avail'], fields['info_dist']
+        if stats is not None:
+            stats.add('quote_misses', dist=dist)
+    else:
+        quote_cache = None
+
+    # Use the part data looked up in a batch with other parts.
+    batches = fetch_config['batches']
+    manf = part.fields.get('manf', '')
+    data = batches.get(dist, pn, manf) if batches is not None and pn else None
+    if data is not None:
+        scrape_logger.log(DEBUG_OBSESSIVE, 'Using the batch lookup of {} from {}'.format(pn, dist))
+        if stats is not None:
+            stats.add('batch_hits', dist=dist)
+        if quote_cache is not None and not batches.read_failed(dist, pn, manf):
+            quote_cache.put(dist, pn, dict(zip(('url', 'part_num', 'price_tiers', 'qty_avail', 'info_dist'), data)))
+        return data
+
+    dist_module = get_dist_module(dist, distributor_dict)
+
+    # Don't search the distributors that stopped answering.
+    breaker = fetch_config['breaker']
+    if breaker is not None and breaker.is_open(dist):
+        breaker.skip(dist)
+        return '', '', {}, None, {}
+
+    # Time spent parsing the pages (not reading them).
+    start = time()
+    fetch_time = getattr(fetch_local, 'fetch_time', 0.0)
+
+    # Get the HTML tree for the part. If some cached quote field is
+    # stale, don't use cached pages older than it.
+    miss_cache = None
+    url_cache = None
+    if distributor_dict[dist]['scrape'] == 'web':
+        miss_cache = fetch_config['miss_cache']
+        url_cache = fetch_config['url_cache']
+    fetch_local.failed = False
+    with max_page_age(max_age):
+        html_tree, url = get_part_html_tree(part, dist, dist_module.get_part_html_tree, local_part_html,
+                                            scrape_retries, scrape_logger, miss_cache, url_cache)
+
+    part_num, price_tiers, qty_avail, info_dist = extract_part_data(dist_module, html_tree,
+                                                                    distributor_dict[dist]['scrape'] != 'local')
+
+    parse_time = time() - start - (getattr(fetch_local, 'fetch_time', 0.0) - fetch_time)
+    profiler = fetch_config['profiler']
+    if profiler is not None:
+        profiler.add('parse ' + dist, parse_time)
+    if stats is not None:
+        stats.observe('parse_seconds', parse_time, dist)
+        stats.add('found' if url else 'not_found', dist=dist)
+
+    # Keep the part data found for the next runs, unless some page could
+    # not be read (e.g. the prices of a part found).
+    if quote_cache is not None and url and not fetch_local.failed:
+        quote_cache.put(dist, pn, {'url': url, 'part_num': part_num, 'qty_avail': qty_avail,
+                                   'price_tiers': price_tiers, 'info_dist': info_dist})
+
+    return url, part_num, price_tiers, qty_avail, info_dist
+
+
+def get_scrape_logger(log_level):
+    '''@brief Get the logger to use in the scraping process or thread.
+    @param log_level Logging level of the main process.
+    @return Logger handle.'''
+    if multiprocessing.current_process().name == "MainProcess":
+        return logging.getLogger('kicost')
+    scrape_logger = multiprocessing.get_logger()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(log_level)
+    scrape_logger.addHandler(handler)
+    scrape_logger.setLevel(log_level)
+    return scrape_logger
+
+
 def scrape_part(args):
     '''@brief Scrape the data for a part from each distributor website or local HTML.
     
@@ -142,24 +386,15 @@ def scrape_part(args):
     @param `int` Count of the main loop.
     @param `str`String with the part number / distributor stock.
     @param `dict`
-    @param `str`
+    @param `dict` Index of the local distributors data (at least of this part).
     @param `int`Number of scrape retries.
     @param logger.getEffectiveLevel()
-    @param throttle_lock
-    @param throttle_tim
     @return id, url, `str` distributor stock part number, `dict` price tiers, `int` qty avail, `dict` extrainfo dist
     '''
 
-    id, part, distributor_dict, local_part_html, scrape_retries, log_level, throttle_lock, throttle_timeouts = args # Unpack the arguments.
+    id, part, distributor_dict, local_part_html, scrape_retries, log_level = args # Unpack the arguments.
 
-    if multiprocessing.current_process().name == "MainProcess":
-        scrape_logger = logging.getLogger('kicost')
-    else:
-        scrape_logger = multiprocessing.get_logger()
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(log_level)
-        scrape_logger.addHandler(handler)
-        scrape_logger.setLevel(log_level)
+    scrape_logger = get_scrape_logger(log_level)
 
     # Create dictionaries for the various items of part data from each distributor.
     url = {}
@@ -169,56 +404,33 @@ def scrape_part(args):
     info_dist = {}
 
     # Scrape the part data from each distributor website or the local HTML.
-    # Create a list of the distributor keys and randomly choose one of the
-    # keys to scrape. After scraping, remove the distributor key.
+    # Create a list of the distributor keys and choose one of the keys to
+    # scrape. After scraping, remove the distributor key.
     # Do this until all the distributors have been scraped.
     distributors = list(distributor_dict.keys())
+
+    # The local distributors are just looked up in their index.
+    for d in [d for d in distributors if distributor_dict[d]['scrape'] == 'local']:
+        url[d], part_num[d], price_tiers[d], qty_avail[d], info_dist[d] = scrape_dist(
+                    part, d, distributor_dict, local_part_html, scrape_retries, scrape_logger)
+        distributors.remove(d)
+
+    # Scrape first the distributor that can be accessed sooner (the ties are
+    # broken randomly), so a throttled distributor doesn't hold the others.
+    shuffle(distributors)
+    throttle = fetch_config['throttle']
     while distributors:
 
-        d = choice(distributors)  # Randomly choose one of the available distributors.
+        if throttle is not None:
+            d = min(distributors, key=throttle.next_slot)
+        else:
+            d = distributors[0]
 
-        try:
-            #dist_module = getattr(THIS_MODULE, d)
-            dist_module = dist_modules[d]
-        except KeyError: # When use local distributor with personalized name.
-            dist_module = dist_modules[distributor_dict[d]['module']]
-
-        # Try to access the list of distributor throttling timeouts.
-        # Abort if some other process is already using the timeouts.
-        if throttle_lock.acquire(blocking=False):
-
-            # Check the throttling timeout for the chosen distributor to see if
-            # another access to its website is allowed.
-            if throttle_timeouts[d] <= time():
-
-                # Update the timeout for this distributor website and release the sync. lock.
-                throttle_timeouts[d] = time() + distributor_dict[d]['throttling_delay']
-                throttle_lock.release()
-
-                # Get the HTML tree for the part.
-                html_tree, url[d] = get_part_html_tree(part, d, dist_module.get_part_html_tree, local_part_html, scrape_retries, scrape_logger)
-
-                # Call the functions that extract the data from the HTML tree.
-                part_num[d] = dist_module.get_part_num(html_tree)
-                qty_avail[d] = dist_module.get_qty_avail(html_tree)
-                price_tiers[d] = dist_module.get_price_tiers(html_tree)
-                
-                try:
-                    # Get extra characeristics of the part in the web page.
-                    # This will be use to comment in the 'cat#' column of the
-                    # spreadsheet and some validations (in the future implementaions)
-                    info_dist[d] = dist_module.get_extra_info(html_tree)
-                except:
-                    info_dist[d] = {}
-                    pass
-
-                # The part data has been scraped from this distributor, so remove it from the list.
-                distributors.remove(d)
-
-            # If the timeout for this distributor has not expired, then release
-            # the sync. lock and try another distributor.
-            else:
-                throttle_lock.release()
+        url[d], part_num[d], price_tiers[d], qty_avail[d], info_dist[d] = scrape_dist(
+                    part, d, distributor_dict, local_part_html, scrape_retries, scrape_logger)
+
+        # The part data has been scraped from this distributor, so remove it from the list.
+        distributors.remove(d)
 
     # Return the part data.
     return id, url, part_num, price_tiers, qty_avail, info_dist
@@ -0,0 +1,194 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from builtins import range
+from future import standard_library
+standard_library.install_aliases()
+
+import os
+import zlib
+import socket
+import threading
+import http.client
+from http.cookiejar import CookieJar
+from urllib.parse import urlsplit, urljoin
+from urllib.request import Request, getproxies, urlopen
+from urllib.error import URLError, HTTPError
+
+from ..globals import logger, DEBUG_OVERVIEW, DEBUG_DETAILED, DEBUG_OBSESSIVE
+
+__all__ = ['HttpSession', 'decode_body']
+
+HTTP_TIMEOUT = 60 # Seconds waiting for a distributor web site answer.
+MAX_REDIRECTS = 10
+ACCEPT_ENCODING = 'gzip, deflate' # Compressed transfers accepted from the web sites.
+
+
+def decode_body(body, encoding):
+    '''@brief Decompress a page received with the given `Content-Encoding`.
+    @param body `bytes` received.
+    @param encoding `str()` value of the `Content-Encoding` header or `None`.
+    @return `bytes` with the page.'''
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS) # Some servers send raw deflate.
+    return body
+
+
+class HttpSession(object):
+    '''@brief Persistent HTTP connections and cookies used to read the pages.
+
+    Each thread keeps one open (keep-alive) connection for each host, so the
+    connection and TLS handshake are done once per host and thread instead
+    of once per page. The cookies set by the web sites are kept in a cookie
+    jar shared by the threads of the process. The pages are requested
+    compressed (gzip or deflate) and decompressed here.
+    The connections are reopened in a new process, so the object can be used
+    in the scraping processes.'''
+
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        '''@param timeout `float()` seconds to wait for the web sites.'''
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self._local = None
+        self._pid = None
+
+    def connections(self):
+        '''@brief `dict()` with the open connections of the current thread, by host.'''
+        if self._local is None or self._pid != os.getpid():
+            # Don't use the sockets (and cookies) of the parent process.
+            self._local = threading.local()
+            self._pid = os.getpid()
+            self.cookies = CookieJar()
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = {}
+        return conns
+
+    def close(self):
+        '''@brief Close the connections of the current thread.'''
+        conns = self.connections()
+        for conn in conns.values():
+            conn.close()
+        conns.clear()
+
+    def read(self, req, data=None, stats=None):
+        '''@brief Read a page, following the redirections.
+        @param req `Request` created by `FakeBrowser()`.
+        @param data `bytes` to POST or `None` to GET the page.
+        @param stats `FetchStats` to count the requests, new connections and bytes or `None`.
+        @return `bytes` with the page. The errors are raised as `urllib` does.'''
+        scheme = urlsplit(req.get_full_url()).scheme
+        if scheme in getproxies():
+            # Let `urllib` deal with the proxy configuration.
+            req.add_header('Accept-Encoding', ACCEPT_ENCODING)
+            response = urlopen(req, data) if data is not None else urlopen(req)
+            return self.decode(response.read(), response.info().get('Content-Encoding'), stats)
+
+        for _ in range(MAX_REDIRECTS):
+            response, body = self.request(req, data, stats)
+            location = response.getheader('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(req.get_full_url(), location)
+                logger.log(DEBUG_OBSESSIVE, 'Redirected to {}'.format(url))
+                # Keep the headers given by the distributor module, the
+                # cookies of the new URL are added from the jar.
+                req = Request(url, headers=dict(req.headers))
+                if response.status not in (307, 308):
+                    data = None
+                continue
+            if response.status >= 400:
+                raise HTTPError(req.get_full_url(), response.status, response.reason, response.msg, None)
+            return self.decode(body, response.getheader('Content-Encoding'), stats)
+        raise HTTPError(req.get_full_url(), response.status, 'Too many redirections', response.msg, None)
+
+    def decode(self, body, encoding, stats=None):
+        '''@brief Decompress a page and count its bytes.'''
+        try:
+            html = decode_body(body, encoding)
+        except zlib.error:
+            raise http.client.IncompleteRead(body) # Truncated or corrupted page.
+        if stats is not None:
+            stats.add('bytes_wire', len(body))
+            stats.add('bytes_body', len(html))
+        return html
+
+    def request(self, req, data=None, stats=None):
+        '''@brief Send one request through the connection to the host of `req`.
+        @return (`HTTPResponse`, `bytes` with its body).'''
+        parts = urlsplit(req.get_full_url())
+        host = parts.netloc
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        self.cookies.add_cookie_header(req)
+        headers = dict(req.header_items())
+        headers['Accept-Encoding'] = ACCEPT_ENCODING
+        if data is not None and 'Content-type' not in headers:
+            headers['Content-type'] = 'application/x-www-form-urlencoded'
+        method = 'POST' if data is not None else 'GET'
+
+        conns = self.connections()
+        key = (parts.scheme, host)
+        for attempt in range(2):
+            conn = conns.get(key)
+            reused = conn is not None
+            if conn is None:
+                if parts.scheme == 'https':
+                    conn = http.client.HTTPSConnection(host, timeout=self.timeout)
+                else:
+                    conn = http.client.HTTPConnection(host, timeout=self.timeout)
+                conns[key] = conn
+                if stats is not None:
+                    stats.add('connections')
+                logger.log(DEBUG_DETAILED, 'Opening connection to {}'.format(host))
+            try:
+                if stats is not None:
+                    stats.add('requests')
+                conn.request(method, path, data, headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, socket.error) as e:
+                conn.close()
+                del conns[key]
+                if reused and attempt == 0:
+                    # The server closed the idle connection, try a new one.
+                    continue
+                if isinstance(e, http.client.HTTPException):
+                    raise
+                raise URLError(e)
+            if response.will_close:
+                conn.close()
+                del conns[key]
+            self.cookies.extract_cookies(response, req)
+            return response, body
@@ -31,10 +31,12 @@ standard_library.install_aliases()
 import future
 
 import sys, os
+import copy
 import pprint
 import tqdm
 from time import time
-from multiprocessing import Pool, Manager, Lock
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 
 # Stops UnicodeDecodeError exceptions.
 try:
@@ -54,8 +56,23 @@ from .globals import *
 
 # Import information about various distributors.
 from .distributors import distributor_dict
-from .distributors.web_routines import scrape_part, config_distributor
-from .distributors.local.local import create_part_html as create_local_part_html
+from .distributors.web_routines import scrape_part, config_distributor, part_lookup_key
+from .distributors.web_fetch import configure_fetch, PAGE_MEMO_SIZE, PROCESS_PAGE_MEMO_SIZE
+from .distributors.web_cache import WebCache, CACHE_TTL, CACHE_SIZE, default_cache_dir
+from .distributors.scrape_cache import QuoteCache, MissCache, UrlCache, RateStore, MISS_TTL
+from .distributors.throttle import Throttle
+from .distributors.fetch_stats import FetchStats
+from .distributors.circuit_breaker import CircuitBreaker, MAX_FAILURES
+from .distributors.single_flight import SingleFlight
+from .distributors.batch_lookup import BatchLookups
+from .distributors.scheduler import scrape_parts_threaded, MAX_PER_HOST
+from .distributors.checkpoint import ScrapeCheckpoint, CHECKPOINT_EXT
+from .distributors.web_replay import HttpFixtures
+from .profiler import Profiler
+# Scraping engines, 'asyncio' is kept as a name of the 'thread' engine (the
+# page reads block, so an event loop gave nothing over the pool of threads).
+SCRAPE_ENGINES = ['process', 'thread', 'asyncio']
+from .distributors.local.local import create_part_index, part_index
 
 # Import information for various EDA tools.
 from .eda_tools import eda_modules
@@ -66,9 +83,16 @@ from .spreadsheet import * # Creation of the final XLSX spreadsheet.
 def kicost(in_file, eda_tool_name, out_filename,
         user_fields, ignore_fields, group_fields, variant,
         dist_list=list(distributor_dict.keys()),
-        num_processes=4, scrape_retries=5, throttling_delay=0.0,
+        num_processes=4, scrape_retries=5, throttling_delay=0.0, throttling_burst=1,
+        adaptive_throttling=False,
+        scrape_engine='process', max_per_host=MAX_PER_HOST, page_memo_size=None,
         collapse_refs=True,
-        local_currency='USD'):
+        local_currency='USD',
+        cache_dir=None, cache_ttl=CACHE_TTL, cache_size=CACHE_SIZE, offline=False,
+        quote_ttl=None, miss_ttl=MISS_TTL, max_failures=MAX_FAILURES,
+        checkpoint=True, resume=False,
+        record_dir=None, replay_dir=None, replay_latency=0.0, stand_in_url=None,
+        profile=False, profile_file=None, metrics_file=None, metrics_format='json'):
     ''' @brief Run KiCost.
     
     Take a schematic input file and create an output file with a cost spreadsheet in xlsx format.
@@ -88,11 +112,51 @@ def kicost(in_file, eda_tool_name, out_filename,
     @param scrape_retries `int()` Number of attempts to retrieve part data from a website..
     @param throttling_delay `float()` Minimum delay (in seconds) between successive accesses to a
     distributor's website.
+    @param throttling_burst `int()` Number of successive accesses to a distributor's website allowed
+    without the `throttling_delay` after an idle period.
+    @param adaptive_throttling `bool()` Tune the delay of each distributor by the answers of its
+    website, starting with the delays learned in the previous runs (`throttling_delay` is the minimum).
+    @param scrape_engine `str()` How to scrape in parallel (when `num_processes` > 1): 'process'
+    uses a pool of processes (one task for each part), 'thread' a pool of threads sharing the
+    part data (one task for each part and distributor), 'asyncio' is the same as 'thread',
+    see `SCRAPE_ENGINES`.
+    @param max_per_host `int()` Maximum simultaneous accesses to each distributor website
+    ('thread' engine).
+    @param page_memo_size `int()` Pages read in the run kept in memory (by each scraping process)
+    for the other parts that use them, 0 to only share the pages being read. `None` for
+    `PAGE_MEMO_SIZE` or, with the 'process' engine, `PROCESS_PAGE_MEMO_SIZE`.
     @param collapse_refs `bool()` Collapse or not the designator references in the spreadsheet.
     Default `True`.
     @param local_currency `str()` Local/country in ISO3166:2 and currency in ISO4217. Default 'USD'.
+    @param cache_dir `str()` Folder of the web page cache. If `None` (and not `offline`) the pages
+    are not cached.
+    @param cache_ttl `float()` Hours that a cached page is used before being read again from the web.
+    @param cache_size `float()` Maximum size (in MB) of the web page cache.
+    @param offline `bool()` Only use the cached pages, never access the distributor websites.
+    @param quote_ttl `dict()` Hours that each field of the cached part data (e.g. 'price_tiers',
+    'qty_avail') is used before scraping it again. The defaults are in `QUOTE_TTL`.
+    @param miss_ttl `float()` Hours that a part not found at a distributor is not searched again.
+    @param max_failures `int()` Consecutive pages of a distributor that could not be read to stop
+    scraping it (0 to never stop).
+    @param checkpoint `bool()` Write the data of each part, as soon as it is scraped, to a file
+    beside the spreadsheet (removed when the spreadsheet is created).
+    @param resume `bool()` Use the data of the parts in the checkpoint file of an interrupted run.
+    @param record_dir `str()` Folder to record the answers of the distributor websites (the
+    caches are not used while recording).
+    @param replay_dir `str()` Folder with the answers recorded, to replay instead of accessing the web.
+    @param replay_latency `float()` Seconds added to each answer replayed.
+    @param stand_in_url `str()` Base URL of a local server that answers instead of the distributor
+    websites (for tests and benchmarks), the original URL is passed quoted in the path.
+    @param profile `bool()` Print the time spent in each phase of the run.
+    @param profile_file `str()` JSON file to write the time spent in each phase (or `None`).
+    @param metrics_file `str()` File to write the counters and latency histograms of the web
+    accesses to each distributor (or `None`).
+    @param metrics_format `str()` Format of the `metrics_file`: 'json' or 'prometheus' (text format).
     '''
 
+    if scrape_engine not in SCRAPE_ENGINES:
+        raise ValueError('The "{}" scrape engine is not available.'.format(scrape_engine))
+
     # Only keep distributors in the included list and not in the excluded list.
     if dist_list!=None:
         if not dist_list:
@@ -106,6 +170,11 @@ def kicost(in_file, eda_tool_name, out_filename,
         for d in list(distributor_dict.keys()):
             distributor_dict.pop(d, None)
 
+    # Time of each phase of the run, the distributor phases are timed by the
+    # scraping processes.
+    profiler = Profiler(distributor_dict.keys(),
+                        shared=bool(dist_list) and num_processes > 1 and scrape_engine == 'process')
+
     # Deal with some code exception (only one EDA tool or variant
     # informed in the multiple BOM files input).
     if not isinstance(in_file,list):
@@ -124,8 +193,10 @@ def kicost(in_file, eda_tool_name, out_filename,
     prj_info = list()
     for i_prj in range(len(in_file)):
         eda_tool_module = eda_modules[eda_tool_name[i_prj]]
-        p, info = eda_tool_module.get_part_groups(in_file[i_prj], ignore_fields, variant[i_prj])
-        p = subpartqty_split(p)
+        with profiler.phase('get_part_groups'):
+            p, info = eda_tool_module.get_part_groups(in_file[i_prj], ignore_fields, variant[i_prj])
+        with profiler.phase('subpartqty_split'):
+            p = subpartqty_split(p)
         # In the case of multiple BOM files, add the project prefix
         # identifier to each reference/designator. Use the field
         # 'manf#_qty' to control each quantity goes to each project
@@ -169,7 +240,8 @@ def kicost(in_file, eda_tool_name, out_filename,
                                     # and 'var' ('variant') fields, merging
                                     # the components in groups.
     group_fields = set(group_fields)
-    parts = group_parts(parts, group_fields)
+    with profiler.phase('group_parts'):
+        parts = group_parts(parts, group_fields)
 
     # If do not have the manufacture code 'manf#' and just distributors codes,
     # check if is asked to scrap a distributor that do not have any code in the
@@ -189,8 +261,9 @@ def kicost(in_file, eda_tool_name, out_filename,
                 logger.warning("No 'manf#' and '%s#' field in any part: distributor '%s' will be not scraped.", d, distributor_dict[d]['label'])
                 distributor_dict.pop(d, None)
 
-    # Create an HTML page containing all the local part information.
-    local_part_html = create_local_part_html(parts, distributor_dict)
+    # Create an index with all the local part information.
+    with profiler.phase('create_part_index'):
+        local_parts = create_part_index(parts, distributor_dict)
     
     if logger.isEnabledFor(DEBUG_DETAILED):
         pprint.pprint(distributor_dict)
@@ -198,24 +271,82 @@ def kicost(in_file, eda_tool_name, out_filename,
     # Get the distributor product page for each part and scrape the part data.
     if dist_list:
 
+        # Configure the web page cache used by all the distributor modules,
+        # in this process and in the scraping processes.
+        page_cache = None
+        quote_cache = None
+        miss_cache = None
+        url_cache = None
+        if record_dir is not None and (cache_dir is not None or offline):
+            # The answers taken from the caches would not be recorded.
+            logger.warning('The web page cache is not used while recording the web answers.')
+        elif cache_dir is not None or offline:
+            page_cache = WebCache(cache_dir, cache_ttl, cache_size, offline)
+            quote_cache = QuoteCache(os.path.join(page_cache.path, 'quotes.sqlite'), quote_ttl, offline)
+            miss_cache = MissCache(quote_cache.path, miss_ttl, offline)
+            url_cache = UrlCache(quote_cache.path, quote_cache.ttl['url'], offline)
+            logger.log(DEBUG_OVERVIEW, 'Using web page cache at {}{}...'.format(
+                            page_cache.path, ' (offline)' if offline else ''))
+        # Limit the rate of access to each distributor website. The state is
+        # shared by the scraping processes, each access reserves its time slot.
+        # The threads of the other engines just use the same object.
+        use_processes = num_processes > 1 and scrape_engine == 'process'
+        rate_store = None
+        learned_delays = None
+        if adaptive_throttling:
+            rate_store = RateStore(os.path.join(cache_dir or default_cache_dir(), 'quotes.sqlite'))
+            learned_delays = rate_store.load()
+        throttle = Throttle(distributor_dict.keys(), throttling_delay, throttling_burst,
+                            shared=use_processes, adaptive=adaptive_throttling, delays=learned_delays)
+        stats = FetchStats(distributor_dict.keys(), shared=use_processes)
+        breaker = CircuitBreaker(distributor_dict.keys(), max_failures, shared=use_processes)
+        # Pages and part lookups done once in this run (by each process).
+        # Record or replay the answers of the distributor websites.
+        fixtures = None
+        if replay_dir is not None:
+            fixtures = HttpFixtures(replay_dir, replay=True, latency=replay_latency)
+            logger.log(DEBUG_OVERVIEW, 'Replaying the web answers recorded in {}...'.format(replay_dir))
+        elif record_dir is not None:
+            fixtures = HttpFixtures(record_dir)
+            logger.log(DEBUG_OVERVIEW, 'Recording the web answers in {}...'.format(record_dir))
+        # Each scraping process keeps its own pages, so they keep fewer.
+        if page_memo_size is None:
+            page_memo_size = PROCESS_PAGE_MEMO_SIZE if use_processes else PAGE_MEMO_SIZE
+        fetch_cfg = {'page_cache': page_cache, 'quote_cache': quote_cache, 'miss_cache': miss_cache,
+                     'url_cache': url_cache,
+                     'fixtures': fixtures, 'stand_in': stand_in_url, 'profiler': profiler,
+                     'throttle': throttle, 'breaker': breaker,
+                     'stats': stats, 'pages': SingleFlight(page_memo_size), 'lookups': SingleFlight(),
+                     'batches': None}
+        configure_fetch(fetch_cfg)
+
+        def create_pool():
+            '''Pool of processes or, sharing the data of this process, of threads.'''
+            if use_processes:
+                return Pool(num_processes, initializer=configure_fetch, initargs=(fetch_cfg,))
+            return ThreadPool(num_processes)
+
         if local_currency:
             logger.log(DEBUG_OVERVIEW, 'Configuring the distributors locate and currency...')
+            config_start = time()
             if num_processes <= 1:
                 for d in distributor_dict:
                     config_distributor(distributor_dict[d]['module'], local_currency)
             else:
                 logger.log(DEBUG_OVERVIEW, '\tUsing {} simultaneos access...'.format(min(len(distributor_dict), num_processes)))
-                pool = Pool(num_processes)
+                pool = create_pool()
                 for d in distributor_dict:
                     args = [distributor_dict[d]['module'], local_currency]
                     pool.apply_async(config_distributor, args)
                 pool.close()
                 pool.join()
+            profiler.add('config_distributor', time() - config_start)
 
         logger.log(DEBUG_OVERVIEW, 'Scraping part data for each component group...')
-        # Set the throttling delay for each distributor.
-        for d in distributor_dict:
-            distributor_dict[d]['throttling_delay'] = throttling_delay
+
+        # Wall and CPU time of this process, to report the cost of the scraping.
+        scrape_start = time()
+        scrape_cpu_start = sum(os.times()[:2])
 
         global scraping_progress
         scraping_progress = tqdm.tqdm(desc='Progress', total=len(parts), unit='part', miniters=1)
@@ -236,88 +367,141 @@ def kicost(in_file, eda_tool_name, out_filename,
                     self.handleError(record)
         logger.addHandler(TqdmLoggingHandler())
 
+        def store_part(i, result):
+            '''Store the data scraped for a part.'''
+            _, url, part_num, price_tiers, qty_avail, info_dist = result
+            parts[i].part_num = part_num
+            parts[i].url = url
+            parts[i].price_tiers = price_tiers
+            parts[i].qty_avail = qty_avail
+            parts[i].info_dist = info_dist # Extra distributor web page.
+
+        # Keep the data of each part scraped, so an interrupted run can be resumed.
+        scrape_checkpoint = None
+        resumed = {}
+        if checkpoint or resume:
+            scrape_checkpoint = ScrapeCheckpoint(os.path.splitext(out_filename)[0] + CHECKPOINT_EXT)
+            if resume:
+                resumed = scrape_checkpoint.load(parts, list(distributor_dict.keys()))
+                for i, result in resumed.items():
+                    store_part(i, result)
+                scraping_progress.update(len(resumed))
+            else:
+                scrape_checkpoint.remove() # From an old interrupted run.
+            if not checkpoint:
+                scrape_checkpoint = None
+
+        # Scrape only one of the part groups with the same codes (e.g. same
+        # manufacturer code with different footprints or from other BOMs),
+        # the others get a copy of its data.
+        scrape_ids = []
+        same_parts = {} # Scraped part index: indexes of the other parts with the same codes.
+        lookup_ids = {}
+        for i, part in enumerate(parts):
+            if i in resumed:
+                continue
+            key = part_lookup_key(part, list(distributor_dict.keys()))
+            if key is not None and key in lookup_ids:
+                same_parts[lookup_ids[key]].append(i)
+            else:
+                lookup_ids[key] = i
+                scrape_ids.append(i)
+                same_parts[i] = []
+        scrape_list = [parts[i] for i in scrape_ids]
+        if len(scrape_list) < len(parts):
+            logger.log(DEBUG_OVERVIEW, 'Scraping {} lookups for {} part groups...'.format(len(scrape_list), len(parts)))
+
+        # Look up in batches the parts of the distributors that can, while the
+        # others are scraped. The scraping processes get all the batches done.
+        batches = BatchLookups(scrape_list, distributor_dict, scrape_retries)
+        if batches.batches:
+            fetch_cfg['batches'] = batches
+            configure_fetch(fetch_cfg)
+            batches.start()
+            if use_processes:
+                batches.wait()
+
+        def update_part(result):
+            '''Store the data scraped for a part (and the parts with the same codes).'''
+            id = scrape_ids[result[0]]
+            store_part(id, result)
+            for i in same_parts[id]:
+                store_part(i, copy.deepcopy(result))
+            if scrape_checkpoint is not None:
+                scrape_checkpoint.write(parts[id], result)
+            scraping_progress.update(1 + len(same_parts[id]))
+
         if num_processes <= 1:
             # Scrape data, one part at a time using single processing.
-
-            class DummyLock:
-                """Dummy synchronization lock used when single processing."""
-                def __init__(self):
-                    pass
-                def acquire(*args, **kwargs):
-                    return True  # Lock can ALWAYS be acquired when just one process is running.
-                def release(*args, **kwargs):
-                    pass
-
-            # Create sync lock and timeouts to control the rate at which distributor
-            # websites are scraped.
-            throttle_lock = DummyLock()
-            throttle_timeouts = dict()
-            throttle_timeouts = {d:time() for d in distributor_dict}
-
             logger.log(DEBUG_OVERVIEW, '\tStarting {} parallels process...'.format(num_processes))
-            for i in range(len(parts)):
-                args = (i, parts[i], distributor_dict, local_part_html, scrape_retries,
-                        logger.getEffectiveLevel(), throttle_lock, throttle_timeouts)
-                id, url, part_num, price_tiers, qty_avail, info_dist = scrape_part(args)
-                parts[id].part_num = part_num
-                parts[id].url = url
-                parts[id].price_tiers = price_tiers
-                parts[id].qty_avail = qty_avail
-                parts[id].info_dist = info_dist # Extra distributor web page.
-                scraping_progress.update(1)
+            for i in range(len(scrape_list)):
+                args = (i, scrape_list[i], distributor_dict, local_parts, scrape_retries,
+                        logger.getEffectiveLevel())
+                update_part(scrape_part(args))
+        elif scrape_engine in ('thread', 'asyncio'):
+            # Scrape data of each part from each distributor as independent
+            # tasks, taken by the threads from the distributors available.
+            scrape_parts_threaded(scrape_list, distributor_dict, local_parts, scrape_retries,
+                                  num_processes, max_per_host, update_part, logger.getEffectiveLevel())
         else:
             # Scrape data, multiple parts at a time using multiprocessing.
 
-            # Create sync lock and timeouts to control the rate at which distributor
-            # websites are scraped.
-            throttle_manager = Manager()  # Manages shared lock and dict.
-            throttle_lock = throttle_manager.Lock()
-            throttle_timeouts = throttle_manager.dict()
-            for d in distributor_dict:
-                throttle_timeouts[d] = time()
-
             # Create pool of processes to scrape data for multiple parts simultaneously.
-            pool = Pool(num_processes)
-
-            # Package part data for passing to each process.
-            arg_sets = [(i, parts[i], distributor_dict, local_part_html, scrape_retries, 
-                        logger.getEffectiveLevel(), throttle_lock, throttle_timeouts) for i in range(len(parts))]
-            
-            # Define a callback routine for updating the scraping progress bar.
-            def update(x):
-                scraping_progress.update(1)
-                return x
-
-            # Start the web scraping processes, one for each part.
-            logger.log(DEBUG_OVERVIEW, 'Starting {} parallels process...'.format(num_processes))
-            results = [pool.apply_async(scrape_part, [args], callback=update) for args in arg_sets]
+            pool = create_pool()
+
+            # Package part data for passing to each process (created only when
+            # the pool asks for the next task), with only its local parts info.
+            arg_sets = ((i, scrape_list[i], distributor_dict, part_index(local_parts, scrape_list[i]),
+                         scrape_retries, logger.getEffectiveLevel()) for i in range(len(scrape_list)))
 
-            # Wait for all the processes to have results, then kill-off all the scraping processes.
-            for r in results:
-                while(not r.ready()):
-                    pass
+            # Start the web scraping processes, one task for each part, and get
+            # the data of each part as soon as it is scraped. The main process
+            # just sleeps waiting for the results.
+            logger.log(DEBUG_OVERVIEW, 'Starting {} parallels process...'.format(num_processes))
+            for result in pool.imap_unordered(scrape_part, arg_sets):
+                update_part(result)
             logger.log(DEBUG_OVERVIEW, 'All parallels process finished with success.')
             pool.close()
             pool.join()
 
-            # Get the data from each process result structure.
-            logger.log(DEBUG_OVERVIEW, 'Getting the part scraped informations...')
-            for result in results:
-                id, url, part_num, price_tiers, qty_avail, info_dist = result.get()
-                parts[id].part_num = part_num
-                parts[id].url = url
-                parts[id].price_tiers = price_tiers
-                parts[id].qty_avail = qty_avail
-                parts[id].info_dist = info_dist # Extra distributor web page.
-
         # Done with the scraping progress bar so delete it or else we get an 
         # error when the program terminates.
         logger.removeHandler(TqdmLoggingHandler()) # Return the print channel of the logging.
         del scraping_progress
+        profiler.add('scraping', time() - scrape_start)
+        logger.log(DEBUG_OVERVIEW, 'Scraping took {:.2f}s ({:.2f}s of CPU in the main process).'.format(
+                        time() - scrape_start, sum(os.times()[:2]) - scrape_cpu_start))
+        logger.log(DEBUG_OVERVIEW, 'Web accesses: {requests} requests, {connections} new connections, {cache_hits} cached pages.'.format(
+                        **stats.as_dict()))
+        if rate_store is not None:
+            delays = throttle.delays()
+            logger.log(DEBUG_OVERVIEW, 'Delays learned for the distributors: {}'.format(
+                            ', '.join('{} {:.2f}s'.format(d, delays[d]) for d in sorted(delays))))
+            rate_store.save(delays)
+        for d, skipped in breaker.summary().items():
+            logger.warning('{} stopped answering and was not scraped for the remaining parts ({} pages skipped).'.format(
+                                distributor_dict[d]['label'], skipped))
+        logger.log(DEBUG_OVERVIEW, 'Received {:.1f} kB from the web sites ({:.1f} kB decompressed).'.format(
+                        stats.get('bytes_wire') / 1024, stats.get('bytes_body') / 1024))
+        if metrics_file:
+            stats.save(metrics_file, metrics_format)
+            logger.log(DEBUG_OVERVIEW, 'Scraping metrics written to {}'.format(metrics_file))
+
+        # Keep the web page cache inside its size limit.
+        if page_cache is not None:
+            page_cache.trim()
+
+        if scrape_checkpoint is not None:
+            scrape_checkpoint.close()
 
     # Create the part pricing spreadsheet.
-    create_spreadsheet(parts, prj_info, out_filename, collapse_refs,
-                      user_fields, '-'.join(variant) if len(variant)>1 else variant[0])
+    with profiler.phase('create_spreadsheet'):
+        create_spreadsheet(parts, prj_info, out_filename, collapse_refs,
+                          user_fields, '-'.join(variant) if len(variant)>1 else variant[0])
+
+    # The scraped data is in the spreadsheet, the checkpoint isn't needed anymore.
+    if dist_list and scrape_checkpoint is not None:
+        scrape_checkpoint.remove()
 
     # Print component groups for debugging purposes.
     if logger.isEnabledFor(DEBUG_DETAILED):
@@ -338,6 +522,13 @@ def kicost(in_file, eda_tool_name, out_filename,
                         pass
             print()
 
+    # Report the time spent in each phase.
+    if profile:
+        print(profiler.report())
+    if profile_file:
+        profiler.save(profile_file)
+        logger.log(DEBUG_OVERVIEW, 'Profile written to {}'.format(profile_file))
+
 
 
 
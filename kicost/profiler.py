@@ -0,0 +1,166 @@
+# MIT license
+#
+# Copyright (C) 2018 by XESS Corporation
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Inserted by Pasteurize tool.
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from future import standard_library
+standard_library.install_aliases()
+
+import io
+import json
+import threading
+import multiprocessing
+from time import time
+from contextlib import contextmanager
+
+__all__ = ['Profiler', 'PHASES', 'add_profile_hook', 'remove_profile_hook']
+
+# Phases of a KiCost run, in the order they are done.
+PHASES = [
+    'get_part_groups', # Read the BOM files (EDA tool modules).
+    'subpartqty_split', # Split the sub parts and their quantities.
+    'group_parts', # Group the identical components.
+    'create_part_index', # Index of the local distributors data.
+    'config_distributor', # Locale/currency of the distributor sites.
+    'scraping', # Part data of all the distributors (wall time).
+    'create_spreadsheet', # Write the XLSX file.
+]
+
+# Phases of each distributor, timed in the scraping processes/threads and
+# summed over the parallel tasks.
+DIST_PHASES = [
+    'fetch', # Read the pages (web, cache and throttling waits).
+    'parse', # Build the HTML trees and extract the part data.
+]
+
+profile_hooks = [] # Functions called at the end of each phase.
+
+
+def add_profile_hook(hook):
+    '''@brief Register a function called at the end of each phase, with the
+    phase name (e.g. 'group_parts' or 'fetch digikey') and its seconds. The
+    distributor phases are reported by the process/thread that scraped them.
+    @param hook Function `hook(name, seconds)`.'''
+    profile_hooks.append(hook)
+
+
+def remove_profile_hook(hook):
+    '''@brief Unregister a function added by `add_profile_hook()`.'''
+    profile_hooks.remove(hook)
+
+
+class Profiler(object):
+    '''@brief Time spent in each phase of a KiCost run.
+
+    The time of the main phases is measured in the main process. The fetch
+    and parse time of each distributor is accumulated by the scraping
+    processes/threads; with `shared=True` it is kept in shared memory and the
+    object must be passed to the scraping processes at their creation (`Pool`
+    initializer), like `FetchStats`.'''
+
+    def __init__(self, dists=(), shared=False):
+        '''@param dists `list()` of the distributor names.
+        @param shared `bool()` share the times among processes.'''
+        self.dists = list(dists)
+        self.names = PHASES + ['{} {}'.format(p, d) for d in self.dists for p in DIST_PHASES]
+        self.index = {k: i for i, k in enumerate(self.names)}
+        self.start = time()
+        if shared:
+            self.lock = multiprocessing.Lock()
+            self.seconds = multiprocessing.RawArray('d', len(self.names))
+            self.calls = multiprocessing.RawArray('l', len(self.names))
+        else:
+            self.lock = threading.Lock()
+            self.seconds = [0.0] * len(self.names)
+            self.calls = [0] * len(self.names)
+
+    def add(self, name, seconds):
+        '''@brief Add the time of a phase.
+        @param name `str()` one of `PHASES` or '<`DIST_PHASES`> <distributor>'.
+        @param seconds `float()` time spent.'''
+        i = self.index.get(name)
+        if i is not None:
+            with self.lock:
+                self.seconds[i] += seconds
+                self.calls[i] += 1
+        for hook in profile_hooks:
+            hook(name, seconds)
+
+    @contextmanager
+    def phase(self, name):
+        '''@brief Time the code run in the context as a phase.'''
+        start = time()
+        try:
+            yield
+        finally:
+            self.add(name, time() - start)
+
+    def get(self, name):
+        '''@return (`float()` seconds, `int()` calls) of a phase.'''
+        i = self.index[name]
+        return self.seconds[i], int(self.calls[i])
+
+    def as_dict(self):
+        '''@brief Times of the run as a `dict()` (JSON-ready).'''
+        result = {'total': time() - self.start, 'phases': {}, 'distributors': {}}
+        for name in PHASES:
+            seconds, calls = self.get(name)
+            result['phases'][name] = {'seconds': seconds, 'calls': calls}
+        for d in self.dists:
+            phases = {}
+            for p in DIST_PHASES:
+                seconds, calls = self.get('{} {}'.format(p, d))
+                phases[p] = {'seconds': seconds, 'calls': calls}
+            if any(v['calls'] for v in phases.values()):
+                result['distributors'][d] = phases
+        return result
+
+    def report(self):
+        '''@brief Table with the time of each phase.
+        @return `str()`.'''
+        data = self.as_dict()
+        total = data['total']
+        lines = ['{:32} {:>10} {:>8} {:>7}'.format('Phase', 'Seconds', 'Calls', '%')]
+        row = '{:32} {:10.3f} {:8d} {:7.1f}'
+        for name in PHASES:
+            v = data['phases'][name]
+            if v['calls']:
+                lines.append(row.format(name, v['seconds'], v['calls'], 100 * v['seconds'] / total if total else 0))
+            if name == 'scraping' and data['distributors']:
+                lines.append('  (distributor times are summed over the parallel tasks)')
+                for d in sorted(data['distributors']):
+                    for p in DIST_PHASES:
+                        v = data['distributors'][d][p]
+                        lines.append(row.format('  {} {}'.format(p, d), v['seconds'], v['calls'],
+                                                100 * v['seconds'] / total if total else 0))
+        lines.append('{:32} {:10.3f}'.format('Total', total))
+        return '\n'.join(lines)
+
+    def save(self, path):
+        '''@brief Write the times as JSON.
+        @param path `str()` file name.'''
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.as_dict(), indent=2, sort_keys=True))
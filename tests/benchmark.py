@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+benchmark
+----------------------------------
+
+End-to-end benchmark of `kicost()` over the BOMs of this folder, with the
+distributor web sites replaced by a local stand-in server that answers after
+a configurable latency. Each BOM is costed with each scraping engine in its
+own process, measuring the wall time, CPU time (including the scraping
+processes), peak RSS and web requests per part. The results are saved as JSON
+to compare versions.
+
+The stand-in answers the requests recorded with `kicost --record FOLDER`
+(use `--fixtures FOLDER`). Without fixtures it answers synthetic search and
+product pages of each distributor (from `test_html_strainer`), with the part
+searched in them, so the parts are found and the parsing, extraction and
+price paths are timed: Digi-Key and TME searches return a table of products
+(as for several matching parts), the others return the product page.
+
+    python tests/benchmark.py --latency 0.1 --engines serial thread -o bench.json
+
+With `--pages FOLDER` the product pages recorded there are parsed instead,
+with a whole `BeautifulSoup` tree and with the elements kept by the
+distributor `PAGE_STRAINER`, comparing their time and peak memory, and the
+time of the part data extraction alone is measured for each distributor.
+"""
+
+from __future__ import print_function
+
+import os
+import io
+import sys
+import glob
+import gzip
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from time import sleep
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote, urlsplit, parse_qsl
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from tests.test_html_strainer import FILLER, DIGIKEY_PAGE, MOUSER_PAGE, FARNELL_PAGE, RS_PAGE
+
+ENGINES = ['serial', 'process', 'thread']
+EMPTY_PAGE = b'<html><head><title>No results</title></head><body></body></html>'
+
+NEWARK_PAGE = FARNELL_PAGE.replace('Codice Prodotto', 'Newark Part No.:').replace(
+    '1.500 disponibili', '1,500 available').replace('0,50 €', '$0.50').replace('0,40 €', '$0.40')
+
+DIGIKEY_SEARCH = '''<html><body>{filler}<table id="productTable"><tbody>
+<tr><td class="tr-mfgPartNumber"><a href="/product-detail/en/{q}">{pn}</a></td>
+<td class="tr-dkPartNumber"><a href="/product-detail/en/{q}">296-{pn}-ND</a></td></tr>
+<tr><td class="tr-mfgPartNumber"><a href="/product-detail/en/{q}-X">{pn}-X</a></td>
+<td class="tr-dkPartNumber"><a href="/product-detail/en/{q}-X">296-{pn}-X-ND</a></td></tr>
+</tbody></table>{filler}</body></html>'''
+
+TME_SEARCH = '''<html><body>{filler}<table id="products">
+<tr class="product-row"><td class="product"><a href="/en/details/{q}/parts/acme/">{pn}</a></td></tr>
+<tr class="product-row"><td class="product"><a href="/en/details/{q}-x/parts/acme/">{pn}-X</a></td></tr>
+</table>{filler}</body></html>'''
+
+TME_PAGE = '''<html><body>{filler}<div id="ph"><table><tr>
+<td class="pip-product-symbol">{pn}</td></tr></table></div>{filler}</body></html>'''
+
+TME_PRICES = ('<table><tbody id="prices_body"><tr><td>1+</td><td>-</td><td>0.25</td></tr>'
+              '<tr><td>100+</td><td>-</td><td>0.12</td></tr></tbody></table>')
+
+# Distributor (by its host) and page template answering its part searches.
+SEARCH_PAGES = [('digikey', DIGIKEY_SEARCH), ('mouser', MOUSER_PAGE), ('farnell', FARNELL_PAGE),
+                ('newark', NEWARK_PAGE), ('rs-online', RS_PAGE), ('tme', TME_SEARCH)]
+SEARCH_KEYS = ('keywords', 'Keyword', 'st', 'searchTerm', 'search')
+
+
+def synthetic_answer(url, data):
+    '''Synthetic page of a distributor for a request, with the part searched in it.
+    @return `bytes` page or `None` if the request is not a part search or product page.'''
+    parts = urlsplit(url)
+    if 'tme.eu' in parts.netloc and data:
+        # Stock and prices of the TME symbols.
+        symbols = [v for k, v in parse_qsl(data) if k.startswith('symbol')]
+        return json.dumps({'Products': [{'Symbol': s.upper(), 'InStock': '1200', 'PriceTpl': TME_PRICES}
+                                        for s in symbols]}).encode('utf-8')
+    if 'tme.eu' in parts.netloc and '/details/' in parts.path:
+        pn = unquote(parts.path.split('/details/')[1].split('/')[0]).upper()
+        return TME_PAGE.format(filler=FILLER + '<h1>{}</h1>'.format(pn), pn=pn).encode('utf-8')
+    if 'digikey' in parts.netloc and '/product-detail/' in parts.path:
+        pn = unquote(parts.path.rstrip('/').split('/')[-1])
+        return DIGIKEY_PAGE.format(filler=FILLER + '<h1>{}</h1>'.format(pn)).encode('utf-8')
+    query = dict(parse_qsl(parts.query))
+    pn = next((query[k].strip() for k in SEARCH_KEYS if query.get(k, '').strip()), None)
+    if pn is None:
+        return None
+    for host, page in SEARCH_PAGES:
+        if host in parts.netloc:
+            pn = pn.split(' ')[0]
+            return page.format(filler=FILLER + '<h1>{}</h1>'.format(pn), pn=pn, q=pn.lower()).encode('utf-8')
+    return None
+
+
+class StandInSite(object):
+    '''Local web server answering instead of all the distributor web sites,
+    the original URL comes quoted in the path (see `stand_in_url` of `kicost()`).'''
+
+    def __init__(self, latency=0.0, fixtures=None):
+        '''@param latency `float()` seconds before each answer.
+        @param fixtures `str()` folder recorded by `kicost --record` or `None`.'''
+        self.latency = latency
+        self.answers = {} # (URL, POST data): fixture file.
+        if fixtures is not None:
+            with io.open(os.path.join(fixtures, 'index.jsonl'), encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.answers[(entry['url'], entry['data'] or '')] = os.path.join(fixtures, entry['key'] + '.gz')
+        self.lock = threading.Lock()
+        self.requests = 0
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, as the distributor sites.
+
+            def do_GET(self, data=''):
+                with owner.lock:
+                    owner.requests += 1
+                sleep(owner.latency)
+                status, body = owner.answer(unquote(self.path[1:]), data)
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self.do_GET(data.decode('utf-8', 'replace'))
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.httpd = Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def answer(self, url, data):
+        '''@return (`int()` HTTP status, `bytes` body) for a request.'''
+        name = self.answers.get((url, data))
+        if name is None:
+            if not self.answers:
+                return 200, synthetic_answer(url, data) or EMPTY_PAGE
+            return 200, EMPTY_PAGE
+        try:
+            with gzip.open(name, 'rb') as f:
+                status = json.loads(f.readline().decode('utf-8'))['status']
+                return status, f.read()
+        except (IOError, OSError, EOFError, ValueError):
+            return 200, EMPTY_PAGE
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def run_kicost(bom, engine, processes, stand_in_url):
+    '''Cost a BOM in this process and measure it.
+    @return `dict()` with the measures.'''
+    import resource
+    import kicost.kicost as kicost_module
+
+    counted = {}
+    create_spreadsheet = kicost_module.create_spreadsheet
+
+    def counting_spreadsheet(parts, *args, **kwargs):
+        counted['parts'] = len(parts)
+        return create_spreadsheet(parts, *args, **kwargs)
+
+    kicost_module.create_spreadsheet = counting_spreadsheet
+    out_dir = tempfile.mkdtemp(prefix='kicost_bench_')
+    start_wall = time.time()
+    start_cpu = os.times()
+    kicost_module.kicost(in_file=[bom], eda_tool_name=['kicad'],
+                         out_filename=os.path.join(out_dir, 'bench.xlsx'),
+                         user_fields=[], ignore_fields=[], group_fields=[], variant=[' '],
+                         num_processes=1 if engine == 'serial' else processes,
+                         scrape_engine='process' if engine == 'serial' else engine,
+                         scrape_retries=2, checkpoint=False, stand_in_url=stand_in_url)
+    end_cpu = os.times()
+    wall = time.time() - start_wall
+    cpu = sum(end_cpu[:4]) - sum(start_cpu[:4]) # User and system, of this process and its children.
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {'wall': round(wall, 3), 'cpu': round(cpu, 3), 'peak_rss_kb': rss,
+            'parts': counted.get('parts', 0)}
+
+
+def benchmark(boms, engines, processes=8, latency=0.05, fixtures=None):
+    '''Cost each BOM with each engine, each run in a new Python process.
+    @return `list()` of `dict()` with the measures of each run.'''
+    site = StandInSite(latency, fixtures)
+    runs = []
+    try:
+        for bom in boms:
+            for engine in engines:
+                site.requests = 0
+                child = subprocess.Popen(
+                    [sys.executable, os.path.abspath(__file__), '--run', bom, engine, str(processes), site.url],
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                out, err = child.communicate()
+                run = {'bom': os.path.basename(bom), 'engine': engine,
+                       'processes': 1 if engine == 'serial' else processes}
+                if child.returncode != 0:
+                    run['error'] = err.decode('utf-8', 'replace').strip().splitlines()[-1:]
+                else:
+                    run.update(json.loads(out.decode('utf-8').strip().splitlines()[-1]))
+                    run['requests'] = site.requests
+                    run['requests_per_part'] = round(site.requests / max(run['parts'], 1), 2)
+                runs.append(run)
+                print_run(run)
+    finally:
+        site.close()
+    return runs
+
+
+def benchmark_parsing(fixtures, repeat=5):
+    '''Parse the pages recorded by `kicost --record` and extract their part data,
+    from the whole page and from the elements kept by the distributor module.
+    @return `dict()` with the total seconds and peak memory of each distributor.'''
+    import tracemalloc
+    from bs4 import BeautifulSoup
+    from kicost.distributors import distributor_dict
+    from kicost.distributors.web_routines import dist_modules
+
+    def extract(module, tree):
+        for f in ('get_part_num', 'get_qty_avail', 'get_price_tiers', 'get_extra_info'):
+            try:
+                getattr(module, f)(tree)
+            except Exception:
+                pass
+
+    def measure(parse):
+        start = time.time()
+        for _ in range(repeat):
+            extract(module, parse(html))
+        seconds = (time.time() - start) / repeat
+        tracemalloc.start()
+        tree = parse(html)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del tree
+        return seconds, peak
+
+    results = {}
+    with io.open(os.path.join(fixtures, 'index.jsonl'), encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    for entry in entries:
+        module = dist_modules.get(distributor_dict.get(entry['dist'], {}).get('module'))
+        if entry['status'] != 200 or not hasattr(module, 'PAGE_STRAINER'):
+            continue
+        with gzip.open(os.path.join(fixtures, entry['key'] + '.gz'), 'rb') as g:
+            g.readline()
+            html = g.read()
+        r = results.setdefault(entry['dist'], {'pages': 0, 'full_seconds': 0.0, 'full_peak_kb': 0,
+                                               'strained_seconds': 0.0, 'strained_peak_kb': 0,
+                                               'extract_seconds': 0.0})
+        r['pages'] += 1
+        for name, parse in (('full', lambda html: BeautifulSoup(html, 'lxml')),
+                            ('strained', module.PAGE_STRAINER.parse)):
+            seconds, peak = measure(parse)
+            r[name + '_seconds'] += seconds
+            r[name + '_peak_kb'] = max(r[name + '_peak_kb'], peak // 1024)
+        # Only the extraction of the part data (the `EXTRACTOR` of the module).
+        tree = module.PAGE_STRAINER.parse(html)
+        start = time.time()
+        for _ in range(repeat):
+            extract(module, tree)
+        r['extract_seconds'] += (time.time() - start) / repeat
+    for d, r in sorted(results.items()):
+        print('{:10} {:4d} pages: whole tree {:8.3f}s {:7d}kB, strained {:8.3f}s {:7d}kB ({:.1f}x faster), '
+              'extraction {:8.3f}s'.format(
+                d, r['pages'], r['full_seconds'], r['full_peak_kb'], r['strained_seconds'],
+                r['strained_peak_kb'], r['full_seconds'] / max(r['strained_seconds'], 1e-6),
+                r['extract_seconds']))
+    return results
+
+
+def print_run(run):
+    if 'error' in run:
+        print('{:28} {:8} failed: {}'.format(run['bom'], run['engine'], ' '.join(run['error'])))
+    else:
+        print('{bom:28} {engine:8} {parts:5d} parts {wall:8.2f}s wall {cpu:8.2f}s CPU '
+              '{peak_rss_kb:8d}kB RSS {requests_per_part:6.2f} req/part'.format(**run))
+    sys.stdout.flush()
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        # Child process of `benchmark()`.
+        bom, engine, processes, url = sys.argv[2:6]
+        print(json.dumps(run_kicost(bom, engine, int(processes), url)))
+        return
+    parser = argparse.ArgumentParser(description='Benchmark KiCost over the test BOMs.')
+    parser.add_argument('boms', nargs='*', help='BOM files (all the XML files of the tests folder by default).')
+    parser.add_argument('-e', '--engines', nargs='+', choices=ENGINES, default=ENGINES,
+                        help='Scraping engines to run.')
+    parser.add_argument('-np', '--processes', type=int, default=8,
+                        help='Processes/threads of the parallel engines.')
+    parser.add_argument('-l', '--latency', type=float, default=0.05,
+                        help='Seconds the stand-in server takes to answer each request.')
+    parser.add_argument('-f', '--fixtures', default=None,
+                        help='Folder with the web answers recorded by "kicost --record".')
+    parser.add_argument('-p', '--pages', default=None,
+                        help='Benchmark the parsing of the pages recorded in this folder by "kicost --record".')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help='JSON file to save the results.')
+    args = parser.parse_args()
+
+    from kicost import __version__
+    results = {'version': __version__, 'python': platform.python_version(), 'platform': platform.platform(),
+               'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+    if args.pages:
+        results.update({'pages': args.pages, 'parsing': benchmark_parsing(args.pages)})
+    else:
+        boms = args.boms or sorted(glob.glob(os.path.join(TESTS_DIR, '*.xml')))
+        runs = benchmark(boms, args.engines, args.processes, args.latency, args.fixtures)
+        results.update({'latency': args.latency, 'fixtures': args.fixtures, 'runs': runs})
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results saved in {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_batch_lookup
+----------------------------------
+
+Tests for the parts looked up in batches by the distributors that can.
+"""
+
+import os
+import pickle
+import shutil
+import logging
+import tempfile
+import unittest
+
+from kicost.eda_tools.eda_tools import IdenticalComponents
+from kicost.distributors import web_routines
+from kicost.distributors.web_fetch import configure_fetch, fetch_local
+from kicost.distributors.scrape_cache import QuoteCache
+from kicost.distributors.fetch_stats import FetchStats
+from kicost.distributors.batch_lookup import BatchLookups
+
+
+class PartTree(dict):
+    '''Part data given in place of the HTML tree of a web distributor.'''
+
+    def decompose(self):
+        pass
+
+
+class BatchModule(object):
+    '''Distributor module answering the parts with an even number, in batches of 2.
+    The pages of the parts starting by 'F' are not read.'''
+    BATCH_SIZE = 2
+
+    def __init__(self):
+        self.batches = []
+
+    def get_parts_batch(self, dist, pns, scrape_retries=2):
+        self.batches.append(pns)
+        if ('BAD', '') in pns:
+            raise IOError('Site down')
+        if any(pn[0] == 'F' for pn, _ in pns):
+            fetch_local.failed = True
+        return {(pn, manf): (PartTree({'cat#': pn + manf, 'pricing': '1:0.5'}), 'https://shop.com/' + pn)
+                for pn, manf in pns if pn[-1] in '02468'}
+
+    def get_part_html_tree(self, dist, pn, extra_search_terms='', local_part_html=None, scrape_retries=2):
+        if pn[0] == 'F':
+            fetch_local.failed = True
+        return PartTree({'cat#': pn + '-alone'}), 'https://shop.com/alone'
+
+    get_part_num = staticmethod(lambda tree: tree['cat#'])
+    get_qty_avail = staticmethod(lambda tree: 10)
+    get_price_tiers = staticmethod(lambda tree: {1: 0.5} if 'pricing' in tree else {})
+    get_extra_info = staticmethod(lambda tree: {})
+
+
+def make_part(ref, pn, manf=None):
+    part = IdenticalComponents()
+    part.refs = [ref]
+    part.fields = {'manf#': pn}
+    if manf is not None:
+        part.fields['manf'] = manf
+    return part
+
+
+class TestBatchLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.module = BatchModule()
+        web_routines.dist_modules['batchshop'] = self.module
+        self.dists = {'batchshop': {'scrape': 'web', 'module': 'batchshop'}}
+        self.parts = [make_part('U{}'.format(i), pn) for i, pn in enumerate(['P2', 'P3', 'P2', 'BAD', 'P4'])]
+        self.parts.append(make_part('U5', 'P2', 'Acme'))
+        self.stats = FetchStats(['batchshop'])
+        configure_fetch({'quote_cache': None, 'miss_cache': None, 'breaker': None, 'stats': self.stats})
+
+    def tearDown(self):
+        del web_routines.dist_modules['batchshop']
+        configure_fetch({'batches': None, 'stats': None})
+
+    def test_batches(self):
+        batches = BatchLookups(self.parts, self.dists)
+        batched = [[('P2', ''), ('P3', '')], [('BAD', ''), ('P4', '')], [('P2', 'Acme')]]
+        self.assertEqual(batches.batches, {'batchshop': batched})
+        batches.start()
+        self.assertEqual(batches.get('batchshop', 'P2'), ('https://shop.com/P2', 'P2', {1: 0.5}, 10, {}))
+        self.assertEqual(batches.get('batchshop', 'P2', 'Acme')[1], 'P2Acme') # Searched with its manufacturer.
+        self.assertIsNone(batches.get('batchshop', 'P3')) # Not found in its batch.
+        self.assertIsNone(batches.get('batchshop', 'P4')) # Failed batch.
+        self.assertIsNone(batches.get('batchshop', 'P9')) # Not batched.
+        batches.wait()
+        self.assertEqual(self.module.batches, batched)
+        # The scraping processes get the data already looked up.
+        copied = pickle.loads(pickle.dumps(batches))
+        self.assertEqual(copied.get('batchshop', 'P2')[1], 'P2')
+
+    def test_lookup(self):
+        batches = BatchLookups(self.parts, self.dists)
+        configure_fetch({'batches': batches})
+        batches.start()
+        scrape_logger = logging.getLogger('test_batch_lookup')
+        lookup = lambda part: web_routines.lookup_dist(part, 'batchshop', self.dists, None, 2, scrape_logger)
+        self.assertEqual(lookup(self.parts[0])[1], 'P2')
+        self.assertEqual(lookup(self.parts[1])[1], 'P3-alone')
+        self.assertEqual(lookup(self.parts[5])[1], 'P2Acme')
+        self.assertEqual(self.stats.get('batch_hits', 'batchshop'), 2)
+
+    def test_read_failed(self):
+        # The data of the parts with some page not read is not cached.
+        path = tempfile.mkdtemp()
+        try:
+            quote_cache = QuoteCache(os.path.join(path, 'quotes.sqlite'))
+            configure_fetch({'quote_cache': quote_cache})
+            parts = [make_part('U1', 'P2'), make_part('U2', 'P6'), make_part('U3', 'F4'), make_part('U4', 'F5')]
+            batches = BatchLookups(parts, self.dists)
+            configure_fetch({'batches': batches})
+            batches.start()
+            batches.wait()
+            self.assertTrue(batches.read_failed('batchshop', 'F4'))
+            self.assertTrue(pickle.loads(pickle.dumps(batches)).read_failed('batchshop', 'F4'))
+            scrape_logger = logging.getLogger('test_batch_lookup')
+            for part in parts:
+                web_routines.lookup_dist(part, 'batchshop', self.dists, None, 2, scrape_logger)
+            self.assertIsNone(quote_cache.get('batchshop', 'P2')[1])
+            self.assertEqual(quote_cache.get('batchshop', 'F4')[0], {}) # Found in a failed batch.
+            self.assertEqual(quote_cache.get('batchshop', 'F5')[0], {}) # Looked up alone.
+        finally:
+            configure_fetch({'quote_cache': None})
+            shutil.rmtree(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_benchmark
+----------------------------------
+
+Tests for the end-to-end benchmark and its stand-in of the distributor web sites.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from kicost.distributors import FakeBrowser
+from kicost.distributors.web_fetch import fetch_page, configure_fetch, fetch_config
+from kicost.distributors.web_replay import HttpFixtures
+
+from tests.benchmark import StandInSite, benchmark, EMPTY_PAGE
+from kicost.distributors.web_routines import dist_modules, extract_part_data
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.last_config = dict(fetch_config)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        configure_fetch(self.last_config)
+
+    def test_stand_in(self):
+        HttpFixtures(self.folder).save('digikey', 'https://www.digikey.com/p/1', None, b'<html>part</html>')
+        site = StandInSite(fixtures=self.folder)
+        try:
+            configure_fetch({'page_cache': None, 'throttle': None, 'fixtures': None, 'stand_in': site.url})
+            html = fetch_page('digikey', FakeBrowser('https://www.digikey.com/p/1'))
+            self.assertEqual(html, b'<html>part</html>')
+            html = fetch_page('digikey', FakeBrowser('https://www.digikey.com/p/2'))
+            self.assertEqual(html, EMPTY_PAGE)
+            self.assertEqual(site.requests, 2)
+        finally:
+            site.close()
+
+    def test_synthetic_pages(self):
+        # Without fixtures the parts are found at all the distributors.
+        site = StandInSite()
+        try:
+            configure_fetch({'page_cache': None, 'throttle': None, 'fixtures': None, 'pages': None,
+                             'stand_in': site.url})
+            for dist in ('digikey', 'mouser', 'farnell', 'newark', 'rs', 'tme'):
+                module = dist_modules[dist]
+                part_num, price_tiers, qty_avail, info_dist = extract_part_data(
+                    module, module.get_part_html_tree(dist, 'LM358N')[0])
+                self.assertTrue(part_num and price_tiers and qty_avail, dist)
+            # The product page of a TME part found before.
+            tree, url = dist_modules['tme'].get_part_html_tree('tme', 'LM358N', url='/en/details/lm358n/parts/acme/')
+            self.assertEqual(extract_part_data(dist_modules['tme'], tree)[0], 'LM358N')
+        finally:
+            site.close()
+
+    def test_benchmark(self):
+        runs = benchmark([os.path.join(TESTS_DIR, 'single_component.xml')], ['thread'], 2, 0.0)
+        self.assertEqual(len(runs), 1)
+        self.assertNotIn('error', runs[0])
+        self.assertEqual(runs[0]['parts'], 1)
+        self.assertGreater(runs[0]['requests'], 0)
+        for k in ('wall', 'cpu', 'peak_rss_kb', 'requests_per_part'):
+            self.assertIn(k, runs[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_checkpoint
+----------------------------------
+
+Tests for the checkpoint file used to resume the scraping.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from kicost.distributors.checkpoint import ScrapeCheckpoint
+
+from tests.test_scheduler import make_parts
+
+
+def result(i, dists):
+    return (i, {d: 'https://{}/P{}'.format(d, i) for d in dists},
+            {d: '{}-P{}'.format(d, i) for d in dists},
+            {d: {1: 0.5, 100: 0.25} for d in dists},
+            {d: i * 10 for d in dists},
+            {d: {'manf': 'ACME'} for d in dists})
+
+
+class TestScrapeCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.path, 'board.scrape.jsonl')
+        self.dists = ['digikey', 'mouser']
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_resume(self):
+        parts = make_parts(4)
+        checkpoint = ScrapeCheckpoint(self.file_name)
+        checkpoint.write(parts[0], result(0, self.dists))
+        checkpoint.write(parts[2], result(2, self.dists))
+        checkpoint.close()
+        with io.open(self.file_name, 'a', encoding='utf-8') as f:
+            f.write(u'{"manf": "", "dis') # Interrupted while writing.
+
+        # The parts are matched by their codes, not their position in the BOM.
+        parts = [parts[2], parts[3], parts[0]]
+        loaded = ScrapeCheckpoint(self.file_name).load(parts, self.dists)
+        self.assertEqual(sorted(loaded.keys()), [0, 2])
+        self.assertEqual(loaded[0][1:], result(2, self.dists)[1:])
+        self.assertEqual(loaded[2][1:], result(0, self.dists)[1:])
+
+    def test_other_distributors(self):
+        parts = make_parts(1)
+        checkpoint = ScrapeCheckpoint(self.file_name)
+        checkpoint.write(parts[0], result(0, self.dists))
+        checkpoint.close()
+        self.assertEqual(checkpoint.load(parts, ['digikey']).keys(), {0})
+        self.assertEqual(checkpoint.load(parts, self.dists + ['tme']), {})
+        checkpoint.remove()
+        self.assertFalse(os.path.exists(self.file_name))
+        self.assertEqual(checkpoint.load(parts, self.dists), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_circuit_breaker
+----------------------------------
+
+Tests for the retries and the circuit breaker of the page reads.
+"""
+
+import threading
+import unittest
+from time import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from kicost.distributors import FakeBrowser
+from kicost.distributors import web_fetch
+from kicost.distributors.web_fetch import fetch_page, configure_fetch, fetch_config, fetch_local, retry_delay
+from kicost.distributors.circuit_breaker import CircuitBreaker
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        Handler.requests += 1
+        self.send_response(404 if self.path == '/missing' else 503)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_trip(self):
+        for shared in (False, True):
+            breaker = CircuitBreaker(['digikey', 'mouser'], 3, shared=shared)
+            self.assertFalse(breaker.failure('digikey'))
+            self.assertFalse(breaker.failure('digikey'))
+            breaker.success('digikey') # Not consecutive.
+            self.assertFalse(breaker.failure('digikey'))
+            self.assertFalse(breaker.failure('digikey'))
+            self.assertTrue(breaker.failure('digikey'))
+            self.assertFalse(breaker.failure('digikey')) # Tripped only once.
+            self.assertTrue(breaker.is_open('digikey'))
+            self.assertFalse(breaker.is_open('mouser'))
+            breaker.skip('digikey')
+            self.assertEqual(breaker.summary(), {'digikey': 1})
+
+    def test_never_trip(self):
+        breaker = CircuitBreaker(['digikey'], 0)
+        self.assertFalse(any(breaker.failure('digikey') for _ in range(100)))
+
+    def test_retry_delay(self):
+        for retry in range(1, 10):
+            delay = min(web_fetch.RETRY_MAX_DELAY, web_fetch.RETRY_DELAY * 2 ** (retry - 1))
+            self.assertTrue(delay / 2 <= retry_delay(retry) <= delay)
+
+
+class TestFetchRetries(unittest.TestCase):
+
+    def setUp(self):
+        Handler.requests = 0
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.last_config = dict(fetch_config)
+        self.last_delay = web_fetch.RETRY_DELAY
+        web_fetch.RETRY_DELAY = 0.05
+        configure_fetch({'page_cache': None, 'pages': None, 'throttle': None,
+                         'breaker': CircuitBreaker(['nowhere'], 2)})
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        configure_fetch(self.last_config)
+        web_fetch.RETRY_DELAY = self.last_delay
+
+    def test_backoff_and_breaker(self):
+        start = time()
+        self.assertIsNone(fetch_page('nowhere', FakeBrowser(self.url + '/p1'), scrape_retries=3))
+        self.assertEqual(Handler.requests, 3)
+        self.assertGreater(time() - start, 0.025 + 0.05) # Waited before the 2 retries.
+        self.assertIsNone(fetch_page('nowhere', FakeBrowser(self.url + '/p2'), scrape_retries=3))
+        self.assertEqual(Handler.requests, 6)
+        # Not accessed anymore.
+        self.assertIsNone(fetch_page('nowhere', FakeBrowser(self.url + '/p3'), scrape_retries=3))
+        self.assertEqual(Handler.requests, 6)
+        self.assertEqual(fetch_config['breaker'].summary(), {'nowhere': 1})
+
+    def test_not_found(self):
+        fetch_local.failed = False
+        self.assertIsNone(fetch_page('nowhere', FakeBrowser(self.url + '/missing'), scrape_retries=3))
+        self.assertEqual(Handler.requests, 1) # Not retried.
+        self.assertFalse(fetch_config['breaker'].is_open('nowhere'))
+        self.assertFalse(fetch_local.failed) # The page surely doesn't exist.
+        self.assertIsNone(fetch_page('nowhere', FakeBrowser(self.url + '/p1'), scrape_retries=1))
+        self.assertTrue(fetch_local.failed)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_digikey
+----------------------------------
+
+Tests for the Digi-Key scraping of the part attributes and of the parts with
+alternate packagings, whose pages are read at the same time.
+"""
+
+import threading
+import unittest
+from time import sleep
+
+from bs4 import BeautifulSoup
+
+from kicost.distributors import web_fetch
+from kicost.distributors.web_fetch import fetch_local, fetch_in_background
+from kicost.distributors.digikey import digikey
+
+PAGE = '''<html><body><div class="product-top-section">LM358
+<table><tr><td id="reportPartNumber">{pn}</td></tr>
+<tr><td id="quantityAvailable"><span id="dkQty">{qty} In Stock</span></td></tr></table>
+<table id="product-dollars"><tr><th>Qty</th><th>Price</th></tr>{prices}</table>{extra}</div></body></html>'''
+
+PACKAGINGS = '''<div class="bota" id="additionalPackaging">
+<ul class="more-expander-item"><li class="lnkAltPack"><a href="/product-detail/en/ct">CT</a></li></ul>
+<ul class="more-expander-item"><li class="lnkAltPack"><a href="/product-detail/en/dr">DR</a></li></ul></div>'''
+
+PAGES = {
+    # Reeled main page.
+    'katalog': PAGE.format(pn='296-TR-ND', qty=100, prices='<tr><td>2500</td><td>$0.10</td></tr>',
+                           extra=PACKAGINGS),
+    'ct': PAGE.format(pn='296-CT-ND', qty=50, prices='<tr><td>1</td><td>$0.50</td></tr>'
+                                                     '<tr><td>10</td><td>$0.40</td></tr>', extra=''),
+    'dr': PAGE.format(pn='296-DR-ND', qty=200, prices='<tr><td>5</td><td>$0.45</td></tr>',
+                      extra='<table id="product-details-reel-pricing"></table>'),
+}
+
+ATTRIBUTES = '''<html><body><table id="prod-att-table">
+<tr id="prod-att-title-row"><th>Categories</th><td>Integrated Circuits</td></tr>
+<tr><th>Packaging</th><td>Cut Tape</td></tr><tr><th>Voltage</th><td>3V ~ 32V</td></tr></table></body></html>'''
+
+
+class TestDigikey(unittest.TestCase):
+
+    def setUp(self):
+        self.fetch_page = digikey.fetch_page
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.failing = []
+
+        def fetch_page(dist, req, data=None, scrape_retries=2):
+            url = req.get_full_url()
+            with self.lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            sleep(0.1)
+            with self.lock:
+                self.active -= 1
+            page = 'katalog' if 'keywords=' in url else url.split('/')[-1]
+            if page in self.failing:
+                fetch_local.failed = True
+                return None
+            return PAGES[page].encode('utf-8')
+
+        digikey.fetch_page = fetch_page
+
+    def tearDown(self):
+        digikey.fetch_page = self.fetch_page
+
+    def test_alternate_packagings(self):
+        tree, url = digikey.get_part_html_tree('digikey', 'LM358')
+        # The cut tape page is used as the main page, with all the price breaks.
+        self.assertTrue(url.endswith('/product-detail/en/ct'))
+        self.assertEqual(digikey.get_part_num(tree), '296-CT-ND')
+        self.assertEqual(digikey.get_price_tiers(tree), {1: 0.5, 5: 0.45, 10: 0.4, 2500: 0.1})
+        self.assertEqual(digikey.get_qty_avail(tree), 200)
+        self.assertEqual(self.max_active, 2) # Both packagings read at the same time.
+
+    def test_attributes(self):
+        # The header row (with an id) isn't an attribute.
+        tree = BeautifulSoup(ATTRIBUTES, 'lxml')
+        self.assertEqual(digikey.EXTRACTOR.get('attributes', tree), [('Packaging', 'Cut Tape'), ('Voltage', '3V ~ 32V')])
+        self.assertEqual(digikey.get_extra_info(tree), {'voltage': '3V ~ 32V'})
+
+    def test_failed_packaging(self):
+        # The caller is told that a page read in background failed.
+        self.failing.append('dr')
+        fetch_local.failed = False
+        tree, url = digikey.get_part_html_tree('digikey', 'LM358')
+        self.assertEqual(digikey.get_part_num(tree), '296-CT-ND')
+        self.assertTrue(fetch_local.failed)
+        fetch_local.failed = False
+
+    def test_background_slots(self):
+        # The calls over the limit of the distributor run in the current thread.
+        release = threading.Event()
+        fetches = [fetch_in_background('slots', release.wait) for i in range(web_fetch.BACKGROUND_PER_HOST)]
+        current = fetch_in_background('slots', threading.current_thread)
+        self.assertIs(current.result(), threading.current_thread())
+        self.assertIsNot(fetch_in_background('other', threading.current_thread).result(), threading.current_thread())
+        release.set()
+        for fetch in fetches:
+            self.assertTrue(fetch.result())
+        self.assertIsNot(fetch_in_background('slots', threading.current_thread).result(), threading.current_thread())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_fetch_stats
+----------------------------------
+
+Tests for the metrics of the web accesses to each distributor.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Pool
+
+from kicost.distributors.fetch_stats import FetchStats
+
+
+def count_request(stats):
+    stats.for_dist('mouser').add('requests')
+    stats.observe('fetch_seconds', 0.3, 'mouser')
+
+
+class TestFetchStats(unittest.TestCase):
+
+    def test_counters(self):
+        stats = FetchStats(['digikey', 'mouser'])
+        stats.add('requests', dist='digikey')
+        stats.for_dist('mouser').add('requests', 2)
+        stats.add('requests') # No distributor.
+        self.assertEqual(stats.get('requests', 'digikey'), 1)
+        self.assertEqual(stats.get('requests', 'mouser'), 2)
+        self.assertEqual(stats.get('requests'), 4)
+        self.assertEqual(stats.as_dict()['requests'], 4)
+        self.assertEqual(stats.labels(), ['', 'digikey', 'mouser'])
+
+    def test_percentile(self):
+        stats = FetchStats(['digikey'])
+        self.assertIsNone(stats.percentile('fetch_seconds', 'digikey', 50))
+        for s in [0.2] * 9 + [3.0]:
+            stats.observe('fetch_seconds', s, 'digikey')
+        counts, total = stats.histogram('fetch_seconds', 'digikey')
+        self.assertEqual(sum(counts), 10)
+        self.assertAlmostEqual(total, 4.8)
+        self.assertTrue(0.1 < stats.percentile('fetch_seconds', 'digikey', 50) <= 0.25)
+        self.assertTrue(2.5 < stats.percentile('fetch_seconds', 'digikey', 99) <= 5.0)
+
+    def test_prometheus(self):
+        stats = FetchStats(['digikey', 'mouser'])
+        stats.add('status_2xx', dist='digikey')
+        stats.observe('parse_seconds', 0.02, 'digikey')
+        stats.observe('parse_seconds', 50.0, 'digikey')
+        text = stats.prometheus()
+        self.assertIn('kicost_http_responses_total{distributor="digikey",status="2xx"} 1', text)
+        self.assertIn('kicost_parse_seconds_bucket{distributor="digikey",le="0.025"} 1', text)
+        self.assertIn('kicost_parse_seconds_bucket{distributor="digikey",le="+Inf"} 2', text)
+        self.assertIn('kicost_parse_seconds_count{distributor="digikey"} 2', text)
+        self.assertNotIn('mouser', text) # Nothing counted.
+
+    def test_shared(self):
+        stats = FetchStats(['digikey', 'mouser'], shared=True)
+        pool = Pool(2, initializer=count_request, initargs=(stats,))
+        pool.close()
+        pool.join()
+        folder = tempfile.mkdtemp()
+        try:
+            stats.save(os.path.join(folder, 'metrics.json'))
+            with open(os.path.join(folder, 'metrics.json')) as f:
+                metrics = json.load(f)
+        finally:
+            shutil.rmtree(folder)
+        self.assertEqual(metrics['total']['requests'], 2)
+        self.assertEqual(metrics['distributors']['mouser']['fetch_seconds']['count'], 2)
+        self.assertEqual(list(metrics['distributors']), ['mouser'])
+
+if __name__ == '__main__':
+    unittest.main()
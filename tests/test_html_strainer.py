@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_html_strainer
+----------------------------------
+
+Tests for the parsing of only the elements of the distributor pages used.
+"""
+
+import unittest
+
+from bs4 import BeautifulSoup
+
+from kicost.distributors.html_strainer import PageStrainer, css_to_xpath, pn_in_page
+from kicost.distributors.digikey import digikey
+from kicost.distributors.mouser import mouser
+from kicost.distributors.farnell import farnell
+from kicost.distributors.rs import rs
+
+FILLER = '<div class="menu"><ul>' + ''.join('<li><a href="/c{0}">Category {0}</a></li>'.format(i) for i in range(200)) + '</ul></div>'
+
+DIGIKEY_PAGE = '''<html><head><title>Digi-Key</title></head><body>{filler}
+<div class="product-top-section"><table><tr>
+<td id="reportPartNumber"> 296-1234-1-ND </td></tr>
+<tr><td id="quantityAvailable"><span id="dkQty">1,234</span> In Stock</td></tr></table>
+<a href="//www.ti.com/ds.pdf" target="_blank">Datasheet</a>
+<img itemprop="image" src="//media.digikey.com/p.jpg"/>
+<table id="product-dollars"><tr><th>Price Break</th><th>Unit Price</th></tr>
+<tr><td>1</td><td>$0.50</td></tr><tr><td>10</td><td>$0.40</td></tr></table></div>
+{filler}<table id="prod-att-table"><tr id="hdr"><th>Attribute</th></tr>
+<tr><th>Packaging</th><td>Cut Tape</td></tr><tr><th>Manufacturer</th><td>TI</td></tr></table>
+</body></html>'''
+
+MOUSER_PAGE = '''<html><body>{filler}<div id="pdpPricingAvailability">
+<span id="spnMouserPartNumFormattedForProdInfo"> 595-LM358 </span>
+<div class="pdp-product-availability"><div class="row"><div class="col-xs-4">Stock:</div>
+<div class="col-xs-8"><div>5,000 In Stock</div></div></div></div>
+<div class="pdp-pricing-table">
+<div class="div-table-row"><div class="row"><div class="col-xs-4">1</div><div class="col-xs-4">$0.45</div><div class="col-xs-4">$0.45</div></div></div>
+<div class="div-table-row"><div class="row"><div class="col-xs-4">100</div><div class="col-xs-4">$0.30</div><div class="col-xs-4">$30.00</div></div></div>
+</div></div>{filler}</body></html>'''
+
+FARNELL_PAGE = '''<html><body>{filler}<div class="productDisplay" id="page">
+<div class="productDescription"><dl><dt>Codice Prodotto</dt><dd> 123 4567 </dd></dl></div>
+<p class="availabilityHeading">1.500 disponibili</p>
+<table class="tableProductDetailPrice pricing"><tr><td class="qty">1+</td><td class="threeColTd">0,50 €</td></tr>
+<tr><td class="qty">10+</td><td class="threeColTd">0,40 €</td></tr></table></div>{filler}</body></html>'''
+
+RS_PAGE = '''<html><body>{filler}<div class="advLineLevelContainer">
+<span class="keyValue">Codice RS 123-4567</span>
+<span class="stock-msg-content">250 disponibile</span>
+<div class="table-row value-row"><div class="breakRangeWithoutUnit col-xs-4">1 - 9</div><div class="unitPrice col-xs-4">€ 0,50</div></div>
+<div class="table-row value-row"><div class="breakRangeWithoutUnit col-xs-4">10 +</div><div class="unitPrice col-xs-4">€ 0,40</div></div>
+</div>{filler}</body></html>'''
+
+
+def extract(module, tree):
+    data = [module.get_part_num(tree), module.get_qty_avail(tree), module.get_price_tiers(tree)]
+    if hasattr(module, 'get_extra_info'):
+        data.append(module.get_extra_info(tree))
+    return data
+
+
+class TestHtmlStrainer(unittest.TestCase):
+
+    def test_css_to_xpath(self):
+        self.assertEqual(css_to_xpath('table#prices'), '//table[@id="prices"]')
+        self.assertEqual(css_to_xpath('a[target=_blank][href]'), '//a[@target="_blank"][@href]')
+        self.assertEqual(css_to_xpath('.x'), '//*[contains(concat(" ", normalize-space(@class), " "), " x ")]')
+        self.assertEqual(css_to_xpath('table#t tr td:nth-of-type(2), p'), '//table[@id="t"]//tr//td[2] | //p')
+        self.assertEqual(css_to_xpath('table#t tr:not([id])'), '//table[@id="t"]//tr[not(@id)]')
+        self.assertRaises(ValueError, css_to_xpath, 'div > span')
+
+    def test_pn_in_page(self):
+        self.assertTrue(pn_in_page('LM358-N', b'<td>lm 358n</td>'))
+        self.assertTrue(pn_in_page('LM358', b'<td>LM358N/NOPB</td>'))
+        self.assertFalse(pn_in_page('LM358', b'<td>LM35 8</td><td>LM8</td>'.replace(b' ', b'x')))
+
+    def test_order_and_marks(self):
+        strainer = PageStrainer(['span.v', 'table#t'], mark=['div.page'])
+        tree = strainer.parse(b'<html><body><div class="page main"><p>skip</p><span class="v">1</span>'
+                              b'<table id="t"><tr><td><span class="v">2</span></td></tr></table></div>'
+                              b'<span class="v">3</span></body></html>')
+        self.assertIsNotNone(tree.find('div', class_='page'))
+        self.assertIsNone(tree.find('p'))
+        self.assertEqual([s.text for s in tree.find_all('span', class_='v')], ['1', '2', '3'])
+
+    def test_distributor_pages(self):
+        for module, page in ((digikey, DIGIKEY_PAGE), (mouser, MOUSER_PAGE),
+                             (farnell, FARNELL_PAGE), (rs, RS_PAGE)):
+            html = page.format(filler=FILLER).encode('utf-8')
+            full = extract(module, BeautifulSoup(html, 'lxml'))
+            strained = extract(module, module.PAGE_STRAINER.parse(html))
+            self.assertEqual(full, strained, module.__name__)
+            self.assertTrue(full[0] and full[2], module.__name__) # The page was really scraped.
+
+if __name__ == '__main__':
+    unittest.main()
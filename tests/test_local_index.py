@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_local_index
+----------------------------------
+
+Tests for the index of the parts of the local distributors.
+"""
+
+import copy
+import pickle
+import unittest
+
+from kicost.globals import PartHtmlError
+from kicost.eda_tools.eda_tools import IdenticalComponents
+from kicost.distributors import distributor_dict
+from kicost.distributors.local.local import (LocalPart, create_part_index, part_index, index_to_html,
+                                              get_part_html_tree, get_part_num, get_price_tiers, get_qty_avail)
+
+
+def make_part(ref, fields):
+    part = IdenticalComponents()
+    part.refs = [ref]
+    part.fields = fields
+    return part
+
+
+class TestLocalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dists = {'local_template': copy.deepcopy(distributor_dict['local_template'])}
+        self.parts = [make_part('R1', {'manf#': 'RC0603', 'shop:pricing': '1:0.10; 100:0.05', 'shop:link': 'https://shop.com/r'}),
+                      make_part('C1', {'store:cat#': 'C-22', 'store:pricing': '1:0.20'}),
+                      make_part('U1', {'manf#': 'LM358'})]
+        self.index = create_part_index(self.parts, self.dists)
+
+    def test_index(self):
+        self.assertEqual(sorted(self.dists), ['shop', 'store'])
+        self.assertEqual(sorted(self.index), ['shop:RC0603', 'store:C-22'])
+        self.assertEqual(self.parts[0].fields['shop:cat#'], 'RC0603') # Generated cat#.
+        self.assertEqual(part_index(self.index, self.parts[1]), {'store:C-22': self.index['store:C-22']})
+        self.assertEqual(part_index(self.index, self.parts[2]), {})
+        self.assertIn('<div class="shop:RC0603"><div class="cat#">RC0603</div>', index_to_html(self.index))
+
+    def test_duplicate(self):
+        parts = [make_part('C1', {'store:cat#': 'C-22', 'store:pricing': '1:0.20'}),
+                 make_part('C2', {'store:cat#': 'C-22', 'store:pricing': '1:0.20'}),
+                 make_part('C3', {'store:cat#': 'C-22', 'store:pricing': '1:0.30'})]
+        dists = {'local_template': copy.deepcopy(distributor_dict['local_template'])}
+        with self.assertLogs('kicost', 'WARNING') as logs:
+            index = create_part_index(parts, dists)
+        self.assertEqual(index, {'store:C-22': {'cat#': 'C-22', 'pricing': '1:0.20'}})
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('C3', logs.output[0])
+
+    def test_lookup(self):
+        tree, url = get_part_html_tree('shop', 'RC0603', local_part_html=self.index)
+        self.assertEqual(url, 'https://shop.com/r')
+        self.assertEqual(get_part_num(tree), 'RC0603')
+        self.assertEqual(get_price_tiers(tree), {1: 0.1, 100: 0.05})
+        self.assertEqual(get_qty_avail(tree), 0)
+        tree, url = get_part_html_tree('store', 'C-22', local_part_html=pickle.loads(pickle.dumps(self.index)))
+        self.assertIsNone(url)
+        self.assertIsInstance(tree, LocalPart)
+        self.assertRaises(PartHtmlError, get_part_html_tree, 'shop', 'LM358', local_part_html=self.index)
+
+    def test_bad_pricing(self):
+        # The pricing of grouped parts with different values, keep the good price breaks.
+        self.assertEqual(get_price_tiers(LocalPart({'cat#': 'X', 'pricing': 'ROT2: \nROT1: 1:0.372; 10:0.3'})),
+                         {10: 0.3})
+        self.assertEqual(get_price_tiers(LocalPart({'cat#': 'X'})), {})
+
+if __name__ == '__main__':
+    unittest.main()
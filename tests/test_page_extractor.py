@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_page_extractor
+----------------------------------
+
+Tests for the declarative extraction of the part data from the distributor pages.
+"""
+
+import unittest
+
+from bs4 import BeautifulSoup
+
+from kicost.distributors.page_extractor import PageExtractor, Field, Table, Selector, CLEANERS
+
+PAGE = '''<html><body>
+<div class="part main"><span id="pn"> AB-12 3 </span><span class="stock">1,234 in stock</span></div>
+<table id="prices"><tr><th>Qty</th><th>Price</th></tr>
+<tr><td>1</td><td>$1.50</td></tr><tr><td>10+</td><td>$1.20</td></tr><tr><td>Quote</td><td>-</td></tr></table>
+<dl><dt>Maker</dt><dd>ACME</dd><dt>Size</dt><dd>0603</dd></dl>
+<a href="/ds.pdf" target="_blank">Datasheet</a><span class="other">x</span>
+</body></html>'''
+
+
+class TestPageExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = BeautifulSoup(PAGE, 'lxml')
+
+    def test_selector(self):
+        texts = lambda css: [t.text for t in Selector(css).select(self.tree)]
+        self.assertEqual(texts('table#prices tr td:nth-of-type(2)'), ['$1.50', '$1.20', '-'])
+        self.assertEqual(texts('div.part.main span'), [' AB-12 3 ', '1,234 in stock'])
+        self.assertEqual(texts('span.other, span#pn'), [' AB-12 3 ', 'x']) # Document order.
+        self.assertEqual(texts('a[target=_blank][href]'), ['Datasheet'])
+        self.assertEqual(texts('span:not([id])'), ['1,234 in stock', 'x'])
+        self.assertEqual(texts('div.nopart span'), [])
+        self.assertIsNone(Selector('table#other').select_one(self.tree))
+        self.assertRaises(ValueError, Selector, 'div > span')
+        self.assertRaises(ValueError, Selector, '.x:nth-of-type(1)')
+
+    def test_cleaners(self):
+        self.assertEqual(CLEANERS['int']('1.500 available'), 1500)
+        self.assertEqual(CLEANERS['leading_int'](' 1,234 In Stock, 20 on order'), 1234)
+        self.assertEqual(CLEANERS['first_int']('From 1,000 pcs'), 1000)
+        self.assertEqual(CLEANERS['price']('$1.25'), 1.25)
+        self.assertEqual(CLEANERS['price_comma']('1,25 €'), 1.25)
+        self.assertEqual(CLEANERS['nospace'](' 123 4567 '), '1234567')
+        self.assertRaises(ValueError, CLEANERS['leading_int'], 'Call')
+
+    def test_extractor(self):
+        extractor = PageExtractor(
+            part_num=Field('span#pn', 'nospace'),
+            qty_avail=Field('div.part span.stock', 'leading_int'),
+            bad_qty=Field('span.other', 'int'),
+            datasheet=Field('a[target=_blank]', attr='href'),
+            price_tiers=Table('td:nth-of-type(1)', 'td:nth-of-type(2)', rows='table#prices tr',
+                              key_clean='first_int', value_clean='price'),
+            attributes=Table('dl dt', 'dl dd'))
+        self.assertEqual(extractor.get('part_num', self.tree), 'AB-123')
+        self.assertEqual(extractor.get('qty_avail', self.tree), 1234)
+        self.assertEqual(extractor.get('datasheet', self.tree), '/ds.pdf')
+        self.assertEqual(dict(extractor.get('price_tiers', self.tree)), {1: 1.5, 10: 1.2})
+        self.assertEqual(extractor.get('attributes', self.tree), [('Maker', 'ACME'), ('Size', '0603')])
+        self.assertRaises(ValueError, extractor.extract, 'bad_qty', self.tree)
+        self.assertEqual(extractor.get('bad_qty', self.tree, default=0), 0)
+        empty = BeautifulSoup('<html><body></body></html>', 'lxml')
+        self.assertIsNone(extractor.extract('qty_avail', empty))
+        self.assertEqual(extractor.get('price_tiers', empty), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_profiler
+----------------------------------
+
+Tests for the timing of the phases of a run.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from time import sleep
+from multiprocessing import Pool
+
+from kicost.profiler import Profiler, add_profile_hook, remove_profile_hook
+
+
+def add_fetch(profiler):
+    profiler.add('fetch digikey', 0.5)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_phase(self):
+        profiler = Profiler(['digikey'])
+        with profiler.phase('group_parts'):
+            sleep(0.05)
+        with profiler.phase('group_parts'):
+            pass
+        seconds, calls = profiler.get('group_parts')
+        self.assertGreaterEqual(seconds, 0.05)
+        self.assertEqual(calls, 2)
+        self.assertIn('group_parts', profiler.report())
+        self.assertNotIn('get_part_groups', profiler.report()) # Not run.
+
+    def test_hooks(self):
+        done = []
+        hook = lambda name, seconds: done.append(name)
+        add_profile_hook(hook)
+        try:
+            profiler = Profiler(['digikey'])
+            with profiler.phase('scraping'):
+                profiler.add('parse digikey', 0.1)
+        finally:
+            remove_profile_hook(hook)
+        self.assertEqual(done, ['parse digikey', 'scraping'])
+
+    def test_shared(self):
+        profiler = Profiler(['digikey', 'mouser'], shared=True)
+        pool = Pool(2, initializer=add_fetch, initargs=(profiler,))
+        pool.close()
+        pool.join()
+        self.assertEqual(profiler.get('fetch digikey'), (1.0, 2))
+        folder = tempfile.mkdtemp()
+        try:
+            profiler.save(os.path.join(folder, 'profile.json'))
+            with open(os.path.join(folder, 'profile.json')) as f:
+                data = json.load(f)
+        finally:
+            shutil.rmtree(folder)
+        self.assertEqual(data['distributors']['digikey']['fetch'], {'seconds': 1.0, 'calls': 2})
+        self.assertNotIn('mouser', data['distributors'])
+
+if __name__ == '__main__':
+    unittest.main()
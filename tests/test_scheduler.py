@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_scheduler
+----------------------------------
+
+Tests for the (part, distributor) task scheduler of the thread engine.
+"""
+
+import types
+import threading
+import unittest
+from time import time, sleep
+
+from bs4 import BeautifulSoup
+
+from kicost.eda_tools.eda_tools import IdenticalComponents
+from kicost.distributors import distributor_dict, FakeBrowser
+from kicost.distributors import web_routines
+from kicost.distributors.web_fetch import fetch_page, configure_fetch, fetch_config
+from kicost.distributors.scheduler import scrape_parts_threaded
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+DISTS = ['standin1', 'standin2']
+LATENCY = 0.05 # Seconds of each page request.
+
+
+class StandInServer(object):
+    '''Local web server answering `/<dist>/<part>` with a part page.'''
+
+    def __init__(self, latency=None):
+        self.latency = latency or {} # Seconds of the requests of each distributor.
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+        self.requests = 0
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                dist, pn = self.path.strip('/').split('/')
+                with owner.lock:
+                    owner.requests += 1
+                    owner.active[dist] = owner.active.get(dist, 0) + 1
+                    owner.max_active[dist] = max(owner.max_active.get(dist, 0), owner.active[dist])
+                sleep(owner.latency.get(dist, LATENCY))
+                with owner.lock:
+                    owner.active[dist] -= 1
+                body = '<html><span id="pn">{}-{}</span><span id="qty">{}</span></html>'.format(
+                            dist, pn, len(pn)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                self.do_GET()
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.httpd = Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def standin_module(base_url):
+    '''Distributor module that scrapes the stand-in server.'''
+    module = types.ModuleType('standin')
+
+    def get_part_html_tree(dist, pn, extra_search_terms='', local_part_html=None, scrape_retries=2):
+        url = '{}/{}/{}'.format(base_url, dist, pn)
+        html = fetch_page(dist, FakeBrowser(url), scrape_retries=scrape_retries)
+        return BeautifulSoup(html, 'lxml'), url
+
+    module.get_part_html_tree = get_part_html_tree
+    module.get_part_num = lambda tree: tree.find('span', id='pn').text
+    module.get_qty_avail = lambda tree: int(tree.find('span', id='qty').text)
+    module.get_price_tiers = lambda tree: {1: 0.1}
+    module.get_extra_info = lambda tree: {}
+    return module
+
+
+def make_parts(n):
+    '''Part groups with the manufacturer codes P0, P1...'''
+    parts = []
+    for i in range(n):
+        part = IdenticalComponents()
+        part.refs = ['R{}'.format(i)]
+        part.fields = {'manf#': 'P{}'.format(i)}
+        parts.append(part)
+    return parts
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        # The first distributor is much slower than the other.
+        self.server = StandInServer({DISTS[0]: 0.2, DISTS[1]: 0.01})
+        self.dist_dict = {}
+        for d in DISTS:
+            distributor_dict[d] = {'scrape': 'web', 'label': d, 'module': 'standin'}
+            self.dist_dict[d] = distributor_dict[d]
+        web_routines.dist_modules['standin'] = standin_module(self.server.url)
+        self.last_config = dict(fetch_config)
+        configure_fetch({'page_cache': None, 'quote_cache': None, 'throttle': None})
+
+    def tearDown(self):
+        self.server.close()
+        for d in DISTS:
+            del distributor_dict[d]
+        del web_routines.dist_modules['standin']
+        configure_fetch(self.last_config)
+
+    def test_slow_distributor(self):
+        parts = make_parts(6)
+        done = []
+        start = time()
+        results = scrape_parts_threaded(parts, self.dist_dict, '', 2, 4, 2, done.append)
+        elapsed = time() - start
+        # The slow distributor alone needs 6 * 0.2 / 2 = 0.6s.
+        self.assertLess(elapsed, 0.9)
+        self.assertLessEqual(self.server.max_active[DISTS[0]], 2)
+        self.assertEqual(sorted(r[0] for r in done), list(range(6)))
+        for i, url, part_num, price_tiers, qty_avail, info_dist in results:
+            self.assertEqual(sorted(part_num.keys()), sorted(DISTS))
+            for d in DISTS:
+                self.assertEqual(part_num[d], '{}-P{}'.format(d, i))
+
+    def test_error(self):
+        web_routines.dist_modules['standin'].get_part_num = lambda tree: 1 // 0
+        with self.assertRaises(ZeroDivisionError):
+            scrape_parts_threaded(make_parts(3), self.dist_dict, '', 2, 4, 2)
+
+    def test_callback_error(self):
+        def callback(result):
+            raise IOError('Disk full')
+        with self.assertRaises(IOError):
+            scrape_parts_threaded(make_parts(3), self.dist_dict, '', 2, 4, 2, callback)
+
+
+class TestScrapeEngines(unittest.TestCase):
+
+    def test_available(self):
+        from kicost.kicost import kicost, SCRAPE_ENGINES
+        self.assertEqual(SCRAPE_ENGINES, ['process', 'thread', 'asyncio'])
+        self.assertRaises(ValueError, kicost, in_file=[], eda_tool_name=['kicad'], out_filename='x.xlsx', user_fields=[],
+                          ignore_fields=[], group_fields=[], variant=[' '], scrape_engine='fibers')
+
+if __name__ == '__main__':
+    unittest.main()
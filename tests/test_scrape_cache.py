@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_scrape_cache
+----------------------------------
+
+Tests for the persistent caches of scraped part data.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import logging
+import unittest
+
+from kicost.globals import PartHtmlError
+from kicost.distributors import distributor_dict
+from kicost.distributors.scrape_cache import QuoteCache, MissCache, UrlCache, BloomFilter, RateStore
+from kicost.distributors.web_routines import search_part_html_tree
+
+
+class TestQuoteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = QuoteCache(os.path.join(self.path, 'quotes.sqlite'))
+        self.quote = {'url': 'https://a.com/p', 'part_num': 'P1', 'qty_avail': 10,
+                      'price_tiers': {1: 0.5, 100: 0.25}, 'info_dist': {'manf': 'ACME'}}
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_miss(self):
+        fields, max_age = self.cache.get('digikey', 'P1')
+        self.assertEqual(fields, {})
+        self.assertEqual(max_age, self.cache.ttl['qty_avail'] * 3600)
+
+    def test_hit(self):
+        self.cache.put('digikey', 'P1', self.quote)
+        fields, max_age = self.cache.get('digikey', 'P1')
+        self.assertIsNone(max_age)
+        self.assertEqual(fields, self.quote)
+        self.assertEqual(self.cache.get('mouser', 'P1')[0], {})
+
+    def test_stale_field(self):
+        self.cache.put('digikey', 'P1', self.quote)
+        self.cache.ttl['qty_avail'] = 0
+        self.cache.connection().execute('UPDATE quotes SET updated=updated-1')
+        fields, max_age = self.cache.get('digikey', 'P1')
+        self.assertNotIn('qty_avail', fields)
+        self.assertEqual(fields['price_tiers'], self.quote['price_tiers'])
+        self.assertEqual(max_age, 0)
+        self.cache.offline = True
+        self.assertIsNone(self.cache.get('digikey', 'P1')[1])
+
+    def test_site(self):
+        # The prices in other currency are not used.
+        self.cache.put('digikey', 'P1', self.quote)
+        site = distributor_dict['digikey']['site']
+        currency = site['currency']
+        try:
+            site['currency'] = 'EUR'
+            self.assertEqual(self.cache.get('digikey', 'P1')[0], {})
+        finally:
+            site['currency'] = currency
+        self.assertEqual(self.cache.get('digikey', 'P1')[0], self.quote)
+
+    def test_pickle(self):
+        self.cache.put('digikey', 'P1', self.quote)
+        cache = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(cache.get('digikey', 'P1')[0], self.quote)
+
+class TestMissCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.path, 'quotes.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_miss(self):
+        cache = MissCache(self.file_name)
+        self.assertFalse(cache.is_miss('mouser', 'P1', ''))
+        cache.put('mouser', 'P1', '')
+        self.assertTrue(cache.is_miss('mouser', 'P1', ''))
+        self.assertFalse(cache.is_miss('mouser', 'P1', 'ACME'))
+        self.assertFalse(cache.is_miss('digikey', 'P1', ''))
+        # Other run (or process).
+        self.assertTrue(pickle.loads(pickle.dumps(cache)).is_miss('mouser', 'P1', ''))
+
+    def test_site(self):
+        cache = MissCache(self.file_name)
+        cache.put('mouser', 'P1', '')
+        site = distributor_dict['mouser']['site']
+        locale = site['locale']
+        try:
+            site['locale'] = 'DE'
+            self.assertFalse(cache.is_miss('mouser', 'P1', ''))
+        finally:
+            site['locale'] = locale
+        self.assertTrue(cache.is_miss('mouser', 'P1', ''))
+
+    def test_expired(self):
+        MissCache(self.file_name).put('mouser', 'P1', '')
+        self.assertFalse(MissCache(self.file_name, ttl=0).is_miss('mouser', 'P1', ''))
+        self.assertTrue(MissCache(self.file_name, ttl=0, offline=True).is_miss('mouser', 'P1', ''))
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add('in{}'.format(i))
+        self.assertTrue(all('in{}'.format(i) in bloom for i in range(1000)))
+        false_positives = sum('out{}'.format(i) in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+class TestUrlCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = UrlCache(os.path.join(self.path, 'quotes.sqlite'))
+        self.urls = [] # Starting URLs of the lookups.
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def get_html_tree(self, dist, pn, extra_search_terms='', url=None, local_part_html=None, scrape_retries=2):
+        self.urls.append(url)
+        if url is None:
+            return 'tree', 'https://a.com/product/' + pn
+        if url.endswith('/old'):
+            raise PartHtmlError
+        return 'tree', url
+
+    def search(self, pn):
+        return search_part_html_tree(self.get_html_tree, 'mouser', pn, '', None, 2,
+                                     logging.getLogger('test_scrape_cache'), self.cache)
+
+    def test_put_get(self):
+        self.assertIsNone(self.cache.get('mouser', 'P1', ''))
+        self.cache.put('mouser', 'P1', '', 'https://a.com/p1')
+        self.assertEqual(pickle.loads(pickle.dumps(self.cache)).get('mouser', 'P1', ''), 'https://a.com/p1')
+        self.assertIsNone(self.cache.get('mouser', 'P1', 'ACME'))
+        self.assertIsNone(UrlCache(self.cache.path, ttl=0).get('mouser', 'P1', ''))
+        self.assertEqual(UrlCache(self.cache.path, ttl=0, offline=True).get('mouser', 'P1', ''), 'https://a.com/p1')
+        self.cache.forget('mouser', 'P1', '')
+        self.assertIsNone(self.cache.get('mouser', 'P1', ''))
+
+    def test_site(self):
+        # The product pages of other locale are not used.
+        self.cache.put('mouser', 'P1', '', 'https://a.com/p1')
+        site = distributor_dict['mouser']['site']
+        locale = site['locale']
+        try:
+            site['locale'] = 'DE'
+            self.assertIsNone(self.cache.get('mouser', 'P1', ''))
+        finally:
+            site['locale'] = locale
+        self.assertEqual(self.cache.get('mouser', 'P1', ''), 'https://a.com/p1')
+
+    def test_search(self):
+        self.assertEqual(self.search('P1'), ('tree', 'https://a.com/product/P1'))
+        self.assertEqual(self.search('P1'), ('tree', 'https://a.com/product/P1'))
+        self.assertEqual(self.urls, [None, 'https://a.com/product/P1']) # Searched once.
+        # A product page without the part is forgotten and the part searched again.
+        self.cache.put('mouser', 'P2', '', 'https://a.com/old')
+        self.assertEqual(self.search('P2'), ('tree', 'https://a.com/product/P2'))
+        self.assertEqual(self.urls[2:], ['https://a.com/old', None])
+        self.assertEqual(self.cache.get('mouser', 'P2', ''), 'https://a.com/product/P2')
+
+class TestRateStore(unittest.TestCase):
+
+    def test_save_load(self):
+        path = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(path, 'quotes.sqlite')
+            self.assertEqual(RateStore(file_name).load(), {})
+            RateStore(file_name).save({'digikey': 0.5, 'tme': 2.0})
+            RateStore(file_name).save({'tme': 4.0})
+            self.assertEqual(RateStore(file_name).load(), {'digikey': 0.5, 'tme': 4.0})
+        finally:
+            shutil.rmtree(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_single_flight
+----------------------------------
+
+Tests for the deduplication of the lookups and pages read in a run.
+"""
+
+import pickle
+import threading
+import unittest
+from time import sleep
+
+from kicost.distributors import distributor_dict
+from kicost.distributors import web_routines
+from kicost.distributors.web_fetch import configure_fetch, fetch_config
+from kicost.distributors.single_flight import SingleFlight
+from kicost.distributors.scheduler import scrape_parts_threaded
+
+from tests.test_scheduler import StandInServer, standin_module, make_parts, DISTS
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls(self):
+        flight = SingleFlight()
+        calls = []
+        def slow(x):
+            calls.append(x)
+            sleep(0.1)
+            return x * 2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow, 21)))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(calls, [21])
+        self.assertEqual(sorted(results), [(42, False)] + [(42, True)] * 7)
+
+    def test_errors_not_remembered(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('k', int, 'x')
+        self.assertEqual(flight.do('k', int, '3'), (3, False))
+
+    def test_max_size(self):
+        flight = SingleFlight(2)
+        for k in 'abc':
+            flight.do(k, str.upper, k)
+        self.assertEqual(list(flight.results.keys()), ['b', 'c'])
+        # Only the calls running are shared.
+        flight = SingleFlight(0)
+        self.assertEqual(flight.do('a', str.upper, 'a'), ('A', False))
+        self.assertEqual(flight.do('a', str.upper, 'a'), ('A', False))
+
+    def test_pickle(self):
+        flight = SingleFlight(5)
+        flight.do('a', str.upper, 'a')
+        copied = pickle.loads(pickle.dumps(flight))
+        self.assertEqual(copied.max_size, 5)
+        self.assertEqual(len(copied.results), 0)
+
+
+class TestLookupCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.dist_dict = {}
+        for d in DISTS:
+            distributor_dict[d] = {'scrape': 'web', 'label': d, 'module': 'standin'}
+            self.dist_dict[d] = distributor_dict[d]
+        web_routines.dist_modules['standin'] = standin_module(self.server.url)
+        self.last_config = dict(fetch_config)
+        configure_fetch({'page_cache': None, 'quote_cache': None, 'throttle': None,
+                         'pages': SingleFlight(), 'lookups': SingleFlight()})
+
+    def tearDown(self):
+        self.server.close()
+        for d in DISTS:
+            del distributor_dict[d]
+        del web_routines.dist_modules['standin']
+        configure_fetch(self.last_config)
+
+    def test_same_codes(self):
+        parts = make_parts(3) * 4 # Each code in 4 part groups.
+        results = scrape_parts_threaded(parts, self.dist_dict, '', 2, 8, 4)
+        self.assertEqual(self.server.requests, 3 * len(DISTS))
+        self.assertEqual(len(results), 12)
+        for i, url, part_num, price_tiers, qty_avail, info_dist in results:
+            self.assertEqual(part_num[DISTS[0]], '{}-P{}'.format(DISTS[0], i % 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_throttle
+----------------------------------
+
+Tests for the distributor access throttling.
+"""
+
+import unittest
+from time import time
+
+from kicost.distributors.throttle import Throttle, ADAPTIVE_START_DELAY, ADAPTIVE_MIN_DELAY, ADAPTIVE_RATE_STEP
+
+
+class TestThrottle(unittest.TestCase):
+
+    def test_no_delay(self):
+        throttle = Throttle(['digikey'], 0.0)
+        self.assertEqual([throttle.reserve('digikey') for _ in range(5)], [0.0] * 5)
+
+    def test_delay(self):
+        for shared in (False, True):
+            throttle = Throttle(['digikey', 'mouser'], 10.0, shared=shared)
+            self.assertEqual(throttle.reserve('digikey'), 0.0)
+            self.assertAlmostEqual(throttle.reserve('digikey'), 10.0, places=1)
+            self.assertAlmostEqual(throttle.reserve('digikey'), 20.0, places=1)
+            self.assertEqual(throttle.reserve('mouser'), 0.0) # Independent distributors.
+            self.assertEqual(throttle.reserve('unknown'), 0.0)
+
+    def test_burst(self):
+        throttle = Throttle(['tme'], 10.0, burst=3)
+        self.assertEqual([throttle.reserve('tme') for _ in range(3)], [0.0] * 3)
+        self.assertAlmostEqual(throttle.reserve('tme'), 10.0, places=1)
+
+    def test_next_slot(self):
+        throttle = Throttle(['digikey', 'mouser'], 10.0)
+        throttle.reserve('digikey')
+        self.assertGreater(throttle.next_slot('digikey'), time() + 9)
+        self.assertLess(throttle.next_slot('mouser'), time())
+
+    def test_adaptive(self):
+        for shared in (False, True):
+            throttle = Throttle(['digikey', 'mouser'], 0.0, shared=shared, adaptive=True,
+                                delays={'mouser': 2.0})
+            self.assertAlmostEqual(throttle.delays()['digikey'], ADAPTIVE_START_DELAY)
+            self.assertAlmostEqual(throttle.delays()['mouser'], 2.0) # Learned before.
+            throttle.feedback('mouser', False)
+            self.assertAlmostEqual(throttle.delays()['mouser'], 4.0) # Multiplicative decrease.
+            throttle.feedback('mouser', True)
+            self.assertAlmostEqual(throttle.delays()['mouser'], 1 / (0.25 + ADAPTIVE_RATE_STEP))
+            for _ in range(1000):
+                throttle.feedback('digikey', True)
+            self.assertAlmostEqual(throttle.delays()['digikey'], ADAPTIVE_MIN_DELAY)
+
+    def test_adaptive_min_delay(self):
+        throttle = Throttle(['tme'], 1.0, adaptive=True)
+        throttle.feedback('tme', True)
+        self.assertEqual(throttle.delays(), {'tme': 1.0})
+
+    def test_not_adaptive(self):
+        throttle = Throttle(['tme'], 1.0)
+        throttle.feedback('tme', False)
+        self.assertEqual(throttle.delays(), {'tme': 1.0})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_tme
+----------------------------------
+
+Tests for the TME scraping, with one search and one stock and price request
+for each part (or for each batch of parts).
+"""
+
+import json
+import unittest
+
+try:
+    from urllib.parse import parse_qsl
+except ImportError:
+    from urlparse import parse_qsl
+
+from kicost.globals import PartHtmlError
+from kicost.distributors.tme import tme
+
+SEARCH_PAGE = '''<html><body><table id="products">
+<tr class="product-row"><td class="product"><a href="/en/details/lm358d/amplifiers/st/">LM358D</a></td></tr>
+<tr class="product-row"><td class="product"><a href="/en/details/lm358dt/amplifiers/st/">LM358DT</a></td></tr>
+</table></body></html>'''
+
+PRODUCT_PAGE = '''<html><body><div id="ph"><table><tr>
+<td class="pip-product-symbol">LM358DT</td></tr></table></div></body></html>'''
+
+PRICES = ('<table><tbody id="prices_body"><tr><td>1+</td><td>-</td><td>0.25</td></tr>'
+          '<tr><td>100+</td><td>-</td><td>0.12</td></tr></tbody></table>')
+
+
+class TestTme(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.pages = {}
+        self.with_symbol = True
+        self.fetch_page = tme.fetch_page
+
+        def fetch_page(dist, req, data=None, scrape_retries=2):
+            self.requests.append(req.get_full_url())
+            if data is not None:
+                symbols = [v for k, v in parse_qsl(data.decode('utf-8')) if k.startswith('symbol')]
+                products = [{'InStock': '1200', 'PriceTpl': PRICES} for s in symbols]
+                if self.with_symbol:
+                    for s, p in zip(symbols, products):
+                        p['Symbol'] = s.upper()
+                return json.dumps({'Products': products}).encode('utf-8')
+            return self.pages.get(req.get_full_url().split('?')[0].split('/')[-2])
+
+        tme.fetch_page = fetch_page
+
+    def tearDown(self):
+        tme.fetch_page = self.fetch_page
+
+    def scrape(self, pn):
+        return self.scrape_url(pn, None)
+
+    def scrape_url(self, pn, url):
+        tree, url = tme.get_part_html_tree('tme', pn, url=url)
+        return url, tme.get_part_num(tree), tme.get_qty_avail(tree), tme.get_price_tiers(tree)
+
+    def test_search_page(self):
+        self.pages['katalog'] = SEARCH_PAGE.encode('utf-8')
+        url, part_num, qty, price_tiers = self.scrape('LM358DT')
+        self.assertEqual(url, 'https://www.tme.eu/en/details/lm358dt/amplifiers/st/')
+        self.assertEqual((part_num, qty, price_tiers), ('LM358DT', 1200, {1: 0.25, 100: 0.12}))
+        self.assertEqual(len(self.requests), 2) # Search and AJAX details.
+
+    def test_answer_without_symbol(self):
+        # The symbol is the text of the link, not its lowercase part.
+        self.with_symbol = False
+        self.pages['katalog'] = SEARCH_PAGE.encode('utf-8')
+        url, part_num, qty, price_tiers = self.scrape('LM358DT')
+        self.assertEqual((part_num, qty, price_tiers), ('LM358DT', 1200, {1: 0.25, 100: 0.12}))
+
+    def test_link_without_symbol(self):
+        self.pages['katalog'] = SEARCH_PAGE.replace('/en/details/lm358dt/amplifiers/st/',
+                                                    '/en/product/lm358dt.html').encode('utf-8')
+        self.pages['product'] = PRODUCT_PAGE.encode('utf-8')
+        url, part_num, qty, price_tiers = self.scrape('LM358DT')
+        self.assertEqual(url, 'https://www.tme.eu/en/product/lm358dt.html')
+        self.assertEqual(part_num, 'LM358DT')
+        self.assertEqual(len(self.requests), 3) # Search, product page and AJAX details.
+
+    def test_product_page(self):
+        self.pages['katalog'] = PRODUCT_PAGE.encode('utf-8')
+        url, part_num, qty, price_tiers = self.scrape('LM358DT')
+        self.assertEqual((part_num, qty, price_tiers), ('LM358DT', 1200, {1: 0.25, 100: 0.12}))
+        self.assertEqual(len(self.requests), 2)
+
+    def test_batch(self):
+        self.pages['katalog'] = SEARCH_PAGE.encode('utf-8')
+        # The products answered are matched to the symbols asked by their order.
+        self.with_symbol = False
+        parts = tme.get_parts_batch('tme', [('LM358DT', 'ST'), ('LM358D', ''), ('XYZ', '')])
+        self.assertEqual(sorted(parts), [('LM358D', ''), ('LM358DT', 'ST')])
+        self.assertEqual(tme.get_part_num(parts[('LM358D', '')][0]), 'LM358D')
+        self.assertEqual(tme.get_part_num(parts[('LM358DT', 'ST')][0]), 'LM358DT')
+        self.assertEqual(tme.get_price_tiers(parts[('LM358DT', 'ST')][0]), {1: 0.25, 100: 0.12})
+        self.assertEqual(len(self.requests), 4) # Three searches and one AJAX request.
+        self.assertIn('search=LM358DT+ST', self.requests[0]) # Searched with the manufacturer.
+
+    def test_product_url(self):
+        # The product URL found by a previous search, its symbol is read in the page.
+        self.with_symbol = False
+        self.pages['st'] = PRODUCT_PAGE.encode('utf-8')
+        url, part_num, qty, price_tiers = self.scrape_url('LM358DT', '/en/details/lm358dt/amplifiers/st/')
+        self.assertEqual(url, 'https://www.tme.eu/en/details/lm358dt/amplifiers/st/')
+        self.assertEqual(part_num, 'LM358DT')
+        self.assertEqual(len(self.requests), 2) # Product page and AJAX details.
+
+    def test_not_found(self):
+        self.pages['katalog'] = b'<html><body>No results for LM358DT</body></html>'
+        self.assertRaises(PartHtmlError, tme.get_part_html_tree, 'tme', 'LM358DT')
+        self.assertEqual(tme.get_price_tiers(tme.BeautifulSoup('<html></html>', 'lxml')), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_web_cache
+----------------------------------
+
+Tests for the distributor web page cache.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from kicost.distributors.web_cache import WebCache, normalize_url
+from kicost.distributors.web_fetch import fetch_page, configure_fetch
+from kicost.distributors import FakeBrowser
+
+
+class TestWebCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = WebCache(self.path, ttl=1, max_size=1)
+
+    def tearDown(self):
+        configure_fetch({'page_cache': None})
+        shutil.rmtree(self.path)
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url('HTTPS://WWW.Example.com:443/p?b=2&a=1#top'),
+                         'https://www.example.com/p?a=1&b=2')
+
+    def test_key(self):
+        k = self.cache.key('digikey', 'https://a.com/?x=1&y=2')
+        self.assertEqual(k, self.cache.key('digikey', 'https://A.com/?y=2&x=1'))
+        self.assertNotEqual(k, self.cache.key('mouser', 'https://a.com/?x=1&y=2'))
+        self.assertNotEqual(k, self.cache.key('digikey', 'https://a.com/?x=1&y=2',
+                                              site={'currency': 'EUR'}))
+        self.assertNotEqual(k, self.cache.key('digikey', 'https://a.com/?x=1&y=2', b'q=1'))
+
+    def test_put_get(self):
+        self.assertIsNone(self.cache.get('tme', 'https://a.com/1'))
+        self.cache.put('tme', 'https://a.com/1', None, b'<html>1</html>')
+        self.assertEqual(self.cache.get('tme', 'https://a.com/1'), b'<html>1</html>')
+
+    def test_put_threads(self):
+        # The threads writing the same page don't share their temporary file.
+        pages = [b'<html>' + str(i).encode('ascii') * 20000 + b'</html>' for i in range(8)]
+        threads = [threading.Thread(target=self.cache.put, args=('tme', 'https://a.com/1', None, page))
+                   for page in pages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn(self.cache.get('tme', 'https://a.com/1'), pages)
+        self.assertEqual([f for _, _, files in os.walk(self.path) for f in files if f.endswith('.tmp')], [])
+
+    def test_ttl(self):
+        self.cache.put('tme', 'https://a.com/1', None, b'<html>1</html>')
+        file_name = self.cache.file_name(self.cache.key('tme', 'https://a.com/1'))
+        os.utime(file_name, (0, 0))
+        self.assertIsNone(self.cache.get('tme', 'https://a.com/1'))
+        self.cache.offline = True # Offline mode uses the expired pages.
+        self.assertEqual(self.cache.get('tme', 'https://a.com/1'), b'<html>1</html>')
+
+    def test_trim(self):
+        self.cache.max_size = 0
+        self.cache.put('tme', 'https://a.com/1', None, b'<html>1</html>')
+        self.cache.put('tme', 'https://a.com/2', None, b'<html>2</html>')
+        self.assertEqual(self.cache.trim(), 2)
+        self.assertIsNone(self.cache.get('tme', 'https://a.com/1'))
+
+    def test_fetch_offline(self):
+        self.cache.offline = True
+        configure_fetch({'page_cache': self.cache})
+        url = 'http://127.0.0.1:9/never_accessed'
+        self.assertIsNone(fetch_page('nowhere', FakeBrowser(url)))
+        self.cache.put('nowhere', url, None, b'<html>ok</html>')
+        self.assertEqual(fetch_page('nowhere', FakeBrowser(url)), b'<html>ok</html>')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_web_replay
+----------------------------------
+
+Tests for the recording and replay of the distributor web site answers.
+"""
+
+import shutil
+import tempfile
+import unittest
+from time import time
+from urllib.error import HTTPError
+
+from kicost.distributors import FakeBrowser
+from kicost.distributors.web_fetch import fetch_page, configure_fetch, fetch_config, fetch_local
+from kicost.distributors.web_replay import HttpFixtures, NotRecorded
+from kicost.distributors.circuit_breaker import CircuitBreaker
+
+from tests.test_scheduler import StandInServer
+
+
+class TestHttpFixtures(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.last_config = dict(fetch_config)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        configure_fetch(self.last_config)
+
+    def test_record_replay(self):
+        server = StandInServer()
+        url = server.url + '/nowhere/P1'
+        configure_fetch({'page_cache': None, 'pages': None, 'throttle': None, 'breaker': None,
+                         'fixtures': HttpFixtures(self.path)})
+        try:
+            page = fetch_page('nowhere', FakeBrowser(url))
+            post = fetch_page('nowhere', FakeBrowser(url), b'q=1')
+        finally:
+            server.close()
+        self.assertIn(b'nowhere-P1', page)
+        self.assertIn(b'nowhere-P1', post)
+
+        # Replay without the server.
+        configure_fetch({'fixtures': HttpFixtures(self.path, replay=True, latency=0.1)})
+        start = time()
+        self.assertEqual(fetch_page('nowhere', FakeBrowser(url)), page)
+        self.assertGreaterEqual(time() - start, 0.1)
+        self.assertEqual(fetch_page('nowhere', FakeBrowser(url), b'q=1'), post)
+        # Not recorded: not retried and not a failure of the site.
+        configure_fetch({'breaker': CircuitBreaker(['nowhere'], 1)})
+        with self.assertLogs('kicost', level='WARNING'):
+            self.assertIsNone(fetch_page('nowhere', FakeBrowser(url + 'X'), scrape_retries=5))
+        self.assertTrue(fetch_local.failed)
+        self.assertFalse(fetch_config['breaker'].is_open('nowhere'))
+
+    def test_errors(self):
+        fixtures = HttpFixtures(self.path)
+        fixtures.save('nowhere', 'https://a.com/missing', None, b'', status=404)
+        fixtures = HttpFixtures(self.path, replay=True)
+        with self.assertRaises(HTTPError) as e:
+            fixtures.load('nowhere', 'https://a.com/missing', None)
+        self.assertEqual(e.exception.code, 404)
+        with self.assertRaises(NotRecorded):
+            fixtures.load('nowhere', 'https://a.com/other', None)
+
+if __name__ == '__main__':
+    unittest.main()
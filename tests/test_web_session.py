@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_web_session
+----------------------------------
+
+Tests for the persistent connections and cookies of the page reads.
+"""
+
+import gzip
+import zlib
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from kicost.distributors import FakeBrowser
+from kicost.distributors.web_session import HttpSession, decode_body
+from kicost.distributors.fetch_stats import FetchStats
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive.
+    connections = 0
+
+    def setup(self):
+        Handler.connections += 1
+        BaseHTTPRequestHandler.setup(self)
+
+    def reply(self, body, status=200, headers={}):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/big':
+            page = b'<html>' + b'<td>part</td>' * 1000 + b'</html>'
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                self.reply(gzip.compress(page), headers={'Content-Encoding': 'gzip'})
+            else:
+                self.reply(page)
+        elif self.path == '/login':
+            self.reply(b'', 302, {'Location': '/page', 'Set-Cookie': 'session=42; Path=/'})
+        else:
+            self.reply('{} {}'.format(self.path, self.headers.get('Cookie')).encode('utf-8'))
+
+    def do_POST(self):
+        self.reply(self.rfile.read(int(self.headers['Content-Length'])))
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSession(unittest.TestCase):
+
+    def setUp(self):
+        Handler.connections = 0
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.session = HttpSession(timeout=5)
+
+    def tearDown(self):
+        self.session.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_keep_alive(self):
+        stats = FetchStats()
+        for i in range(5):
+            page = self.session.read(FakeBrowser('{}/p{}'.format(self.url, i)), stats=stats)
+            self.assertEqual(page, '/p{} None'.format(i).encode('utf-8'))
+        self.assertEqual(stats.get('requests'), 5)
+        self.assertEqual(stats.get('connections'), 1)
+
+    def test_compression(self):
+        stats = FetchStats()
+        page = self.session.read(FakeBrowser(self.url + '/big'), stats=stats)
+        self.assertEqual(page, b'<html>' + b'<td>part</td>' * 1000 + b'</html>')
+        self.assertEqual(stats.get('bytes_body'), len(page))
+        self.assertLess(stats.get('bytes_wire'), len(page) / 10)
+
+    def test_decode_body(self):
+        page = b'<html>' * 100
+        self.assertEqual(decode_body(page, None), page)
+        self.assertEqual(decode_body(zlib.compress(page), 'deflate'), page)
+        raw = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.assertEqual(decode_body(raw.compress(page) + raw.flush(), 'deflate'), page)
+
+    def test_cookies_and_redirect(self):
+        self.assertEqual(self.session.read(FakeBrowser(self.url + '/login')), b'/page session=42')
+        self.assertEqual(self.session.read(FakeBrowser(self.url + '/other')), b'/other session=42')
+
+    def test_post(self):
+        self.assertEqual(self.session.read(FakeBrowser(self.url + '/form'), b'a=1&b=2'), b'a=1&b=2')
+
+    def test_reconnect(self):
+        self.session.read(FakeBrowser(self.url + '/a'))
+        for conn in self.session.connections().values():
+            conn.sock.close() # As if the server closed the idle connection.
+        self.assertEqual(self.session.read(FakeBrowser(self.url + '/b')), b'/b None')
+
+if __name__ == '__main__':
+    unittest.main()